@@ -1,13 +1,87 @@
 
 import os
+import logging
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
 
 class Common(object):
+    # Worker processes of a parallel refresh - tables are extracted & processed side by side (see utils/hgd_parallel.py)
     NCPU_MAX = 1
-    SOURCES = ['kegg','ncbi']
+    # Row-local tables (snp_summary, gene_info, gene2go) are processed in shards of TRANSFORM_SHARD_ROWS rows by
+    # NCPU_MAX processes (see utils/hgd_split.py) - shard files go to TRANSFORM_SHARD_DIR (None: system temp dir)
+    TRANSFORM_SHARD_ROWS = 250000
+    TRANSFORM_SHARD_DIR = None
+    # Pipelined refresh (see utils/hgd_scheduler.py) - how many stages may run at once on each resource class
+    PIPELINE_LIMITS = {'network':4, 'cpu':1, 'db':2}
+    # Incremental loads (see utils/hgd_delta.py) - only changed rows are written, against the key & row-hash
+    # snapshots of the last load, in batches of DELTA_BATCH_ROWS
+    INCREMENTAL_LOAD = False
+    DELTA_SNAPSHOT_DIR = 'data/snapshots'
+    DELTA_BATCH_ROWS = 5000
+    # Run manifest (see utils/hgd_manifest.py) - raw files, raw content hashes, processing code versions & processed
+    # files per table. With TRANSFORM_CACHE, processed tables are always saved & a transform of unchanged raw data
+    # with unchanged code reuses them
+    MANIFEST_DIR = 'data/manifest'
+    TRANSFORM_CACHE = True
+
+    # Profiling mode - cProfile & tracemalloc reports per table (see utils/hgd_profiling.py)
+    PROFILE = False
+    PROFILE_TABLES = []
+    PROFILE_DIR = 'data/profiles'
+    PROFILE_TOP_N = 25
+
+    # Source extraction (HTTP) - shared connection pool, see utils/hgd_http.py
+    HTTP_MAX_PER_HOST = 4
+    HTTP_MAX_WORKERS = 16
+    HTTP_TIMEOUT = 120
+    HTTP_RETRIES = 3
+    HTTP_BACKOFF = 1.0
+    # Large downloads - split into HTTP_SEGMENTS parallel ranges above HTTP_SEGMENT_MIN_BYTES, progress printed
+    # every HTTP_PROGRESS_INTERVAL (s)
+    HTTP_SEGMENTS = 4
+    HTTP_SEGMENT_MIN_BYTES = 64*1024**2
+    HTTP_PROGRESS_INTERVAL = 10
+
+    # Raw response cache (see utils/hgd_cache.py) - TTLs (s) per source, past which entries are revalidated
+    HTTP_CACHE = True
+    HTTP_CACHE_DIR = 'data/raw/cache'
+    HTTP_CACHE_TTL = {'kegg':6*24*3600, 'ncbi':0, 'reactome':6*24*3600}
+    HTTP_CACHE_MAX_BYTES = 10*1024**3
+    HTTP_CACHE_VERIFY = True
+
+    # NCBI FTP files - read as a stream of human rows (see ncbi_utils.read_ftp_file), FTP_CHUNK_BYTES at a time
+    FTP_STREAM_INGEST = True
+    FTP_CHUNK_BYTES = 16*1024**2
+
+    # dbSNP bulk loads (see ncbi_pipe/dbsnp_utils.py) - dumps are streamed DBSNP_CHUNK_ROWS rows at a time into
+    # chromosome (or DBSNP_PARTITIONS hash) partitions, loaded by DBSNP_LOAD_WORKERS threads
+    DBSNP_DUMP_URL = 'https://ftp.ncbi.nlm.nih.gov/snp/database/shared_data/{table}.bcp.gz'
+    DBSNP_DIR = 'data/raw/dbsnp'
+    DBSNP_CHUNK_ROWS = 1000000
+    DBSNP_PARTITIONS = 8
+    DBSNP_LOAD_WORKERS = 4
+
+    # Reactome mapping files - read as a stream of human rows (see reactome_utils.read_mapping_file)
+    REACTOME_CHUNK_BYTES = 16*1024**2
+
+    # Checkpointed extracts (see utils/hgd_shards.py) - Entrez summaries are pulled & saved in batches
+    SHARD_DIR = 'data/raw/shards'
+    ENTREZ_BATCH_SIZE = 5000
+    ENTREZ_HISTORY_TTL = 4*3600
+
+    # Entrez request pool (see utils/hgd_entrez.py) - NCBI's rate limit (req/s) is shared by all processes
+    ENTREZ_MAX_WORKERS = 3
+    ENTREZ_RATE = 3
+    ENTREZ_RATE_KEY = 10
+    ENTREZ_RATE_FILE = os.path.join(tempfile.gettempdir(),'hgd_entrez_rate')
+
+    SOURCES = ['kegg','ncbi','reactome']
     LOG_FILE = 'hgd_pipeline'
+    LOG_DIR = 'local'
+    LOG_LEVEL = logging.INFO
+    LOG_CALLER_FRAME = False
     
     AWS_ACCESS_KEY = os.getenv('AWS_ACCESS_KEY')
     AWS_SECRET_KEY = os.getenv('AWS_SECRET_KEY')
@@ -1,16 +1,26 @@
-import os
+import time
 import pandas as pd
-import re
 
-from multiprocessing import Pool
 import pyspark.sql.functions as F
 
-from configs import auto_config as cfg
-import source_pipes.kegg_pipe.kegg_data_pipe  as kegg
-import source_pipes.ncbi_pipe.ncbi_data_pipe as ncbi
-import utils.hgd_utils as hgd
-import utils.hgd_mysql as hgdm
-from utils.hgd_logging import log,get_logger
+from humangenomedatabase.configs import auto_config as cfg
+import humangenomedatabase.source_pipes.kegg_pipe.kegg_data_pipe  as kegg
+import humangenomedatabase.source_pipes.ncbi_pipe.ncbi_data_pipe as ncbi
+import humangenomedatabase.source_pipes.reactome_pipe.reactome_data_pipe as reactome
+import humangenomedatabase.source_pipes.ncbi_pipe.dbsnp_utils as dbsnp
+import humangenomedatabase.utils.hgd_utils as hgd
+import humangenomedatabase.utils.hgd_mysql as hgdm
+import humangenomedatabase.utils.hgd_metrics as hgdmet
+import humangenomedatabase.utils.hgd_ids as hgdids
+import humangenomedatabase.utils.hgd_shards as hgdshards
+import humangenomedatabase.utils.hgd_schema as hgdschema
+import humangenomedatabase.utils.hgd_parallel as hgdpar
+import humangenomedatabase.utils.hgd_split as hgdsplit
+import humangenomedatabase.utils.hgd_scheduler as hgdsched
+import humangenomedatabase.utils.hgd_delta as hgddelta
+import humangenomedatabase.utils.hgd_manifest as hgdmanifest
+import humangenomedatabase.utils.hgd_profiling as hgdprof
+from humangenomedatabase.utils.hgd_logging import log,get_logger
 
 
 class humanGenomeDataPipe:
@@ -27,16 +37,25 @@ class humanGenomeDataPipe:
         Required argument, indicating which data-source pipe to initialize
     auto_extract : bool
         Optional argument, indicating whether to re-extract data from source
-        or check for existing files in /data/source/raw/ directory
+        or reuse the raw files of the last extract (recorded in the run
+        manifest - see utils/hgd_manifest.py)
     data_dict: dict
         Non-argument, created on instantiation to store information or data 
         related to data-pipes being worked on
+    metrics: hgd_metrics.metricsRecorder
+        Non-argument, records a timing/size span for every extract, transform,
+        load & refresh run by the pipeline (written out by hgd_refresh)
+    errors: dict
+        Non-argument, {db_table:error message} of tables that failed in a
+        parallel refresh (see hgd_refresh)
     """
     
     def __init__(self,pipetype="kegg",auto_extract=False):
         self.pipetype = pipetype
         self.data_dict = {"raw":{},"processed":{}}
         self.auto_extract = auto_extract
+        self.metrics = hgdmet.metricsRecorder(run_name=f"{pipetype}_refresh")
+        self.errors = {}
 
         # Logging details
         self.log_file_name = 'hgd_pipe_log'
@@ -73,9 +92,12 @@ class humanGenomeDataPipe:
         elif pipetype == 'ncbi':
             self.datapipe = ncbi.ncbiDataPipe(cfg)
 
+        elif pipetype == 'reactome':
+            self.datapipe = reactome.reactomeDataPipe(cfg)
+
 
     @log
-    def validate_db_type(db_table,source_dbs):
+    def validate_db_type(self,db_table,source_dbs):
         if db_table not in source_dbs:
             raise Exception(f"Invalid Database ({db_table}). Please Try one of: {source_dbs}")
 
@@ -130,6 +152,9 @@ class humanGenomeDataPipe:
         db_table : str [optional]
             The string-name of the data-source dataset to
             be extracted. See README for valid data sources
+        multi_extract : bool [optional]
+            Extract every dataset of the source instead, with
+            all network requests run concurrently (db_table is ignored)
 
         Returns
         -------
@@ -145,12 +170,17 @@ class humanGenomeDataPipe:
 
         if not multi_extract:
             print(f"Extracting data for database: {db_table}")
-            raw_data_dict = self.datapipe.extract_one(db_table)
+            with self.metrics.span('extract',db_table) as span:
+                raw_data_dict = self.datapipe.extract_one(db_table)
+                span.record(rows_out=hgdmet.count_rows(raw_data_dict),
+                            bytes_written=hgdmet.count_file_bytes(raw_data_dict))
         else:
-            pool = Pool(num_processes=self.ncpu_max)
-            raw_data_dict = pool.map(self.datapipe.extract_one,self.datapipe.valid_dbs)
-            pool.join()
-            pool.close()
+            # All source tables, with network requests run concurrently (see utils/hgd_http.py)
+            print(f"Extracting data for all databases: {self.datapipe.valid_dbs}")
+            with self.metrics.span('extract_all') as span:
+                raw_data_dict = self.datapipe.extract_all()
+                span.record(rows_out=hgdmet.count_rows(raw_data_dict),
+                            bytes_written=hgdmet.count_file_bytes(raw_data_dict))
 
         return raw_data_dict
     
@@ -181,36 +211,74 @@ class humanGenomeDataPipe:
             saved to a flat file and the dict-value will be the file-path instead
             {<db_table>:'path/to/processed/file/filename.csv'}.
         """
-        if not cfg.IN_MEM:
-            try:
-                raw_data = hgd.load_data(db_table,'raw',self.pipetype)
-            except:
-                raise Exception(f"Table {db_table} not found - please extract first or update data_dict with location of file")
-
-        proc_func = self.datapipe.db_table_dict[db_table]['proc_func']
-    
-        # All final processing functions return dictionary of {db_table:dataframe}
-        # TODO - Find a better way to handle this!! (link processing needs db_table)
-        print(f"Processing data for db_table: {db_table}")
-        if self.datapipe.db_table_dict[db_table]['proc_func'].__name__ == "process_link":
-            proc_data_dict = proc_func(raw_data,db_table)
-        else:
-            proc_data_dict = proc_func(raw_data)
-
-        if cfg.IN_MEM:
-            # Return dataframe for in memory processing
-            return proc_data_dict
+        with self.metrics.span('transform',db_table) as span:
+            # Row-local tables are processed in row shards by NCPU_MAX processes (see utils/hgd_split.py)
+            split = hgdsplit.use_split(self.datapipe.db_table_dict[db_table])
+            proc_func = self.datapipe.db_table_dict[db_table]['proc_func']
+
+            # Unchanged raw data & processing code - the processed tables of the last transform are reused (see
+            # utils/hgd_manifest.py). Raw files are read from their standard location when not in memory
+            raw_source = raw_data if cfg.IN_MEM or hgdshards.is_manifest(raw_data) else hgd.data_path(db_table,'raw',self.pipetype)
+            raw_digest = hgdmanifest.raw_hash(raw_source)
+            version = hgdmanifest.code_version(proc_func)
+            cached = hgdmanifest.cached_outputs(self.pipetype,db_table,raw_digest,version) if cfg.TRANSFORM_CACHE else None
+            if cached is not None:
+                print(f"Raw data & processing code of {db_table} unchanged - reusing processed tables: {list(cached)}")
+                if cfg.IN_MEM:
+                    return {t:hgd.load_data(t,'processed',self.pipetype) for t in cached}
+                return dict(cached)
+
+            # Checkpointed (sharded) raw data is read by the processing function itself
+            if not cfg.IN_MEM and not hgdshards.is_manifest(raw_data):
+                span.record(bytes_read=hgdmet.count_file_bytes(raw_data))
+                try:
+                    # Read a shard at a time when split
+                    raw_data = hgd.load_data(db_table,'raw',self.pipetype,
+                                             chunksize=cfg.TRANSFORM_SHARD_ROWS if split else None)
+                except:
+                    raise Exception(f"Table {db_table} not found - please extract first or update data_dict with location of file")
+
+            span.record(rows_in=hgdmet.count_rows(raw_data))
         
-        else:
-            # Return filepath metadata for disk-read/write
-            for db_table,proc_data_df in proc_data_dict.items():
-                # Replace dataframe with filepath
-                proc_data_dict[db_table] = hgd.save_data(proc_data_df,db_table,source=self.pipetype,table_type="processed")
-            return proc_data_dict
+            # All final processing functions return dictionary of {db_table:dataframe}
+            # TODO - Find a better way to handle this!! (link processing needs db_table)
+            print(f"Processing data for db_table: {db_table}")
+            if self.datapipe.db_table_dict[db_table]['proc_func'].__name__ == "process_link":
+                proc_data_dict = proc_func(raw_data,db_table)
+            elif split and hgdprof.profiling_enabled(db_table):
+                # Shard workers run the unprofiled function - the split is profiled as a whole, in this process
+                proc_data_dict = hgdprof.profile_call(hgdsplit.split_transform,self.pipetype,db_table,'transform',
+                                                      proc_func,raw_data)
+            elif split:
+                proc_data_dict = hgdsplit.split_transform(proc_func,raw_data)
+            else:
+                proc_data_dict = proc_func(raw_data)
+
+            # Same dtypes in memory as when re-read from a flat file (see utils/hgd_schema.py)
+            proc_data_dict = {t:hgdschema.apply_schema(df,hgdschema.get_schema(self.pipetype,t,'processed'))
+                              for t,df in proc_data_dict.items()}
+
+            span.record(rows_out=hgdmet.count_rows(proc_data_dict))
+
+            # Processed tables are saved when not in memory, or to be reused by later runs
+            proc_paths = {}
+            if not cfg.IN_MEM or cfg.TRANSFORM_CACHE:
+                for proc_table,proc_data_df in proc_data_dict.items():
+                    proc_paths[proc_table] = hgd.save_data(proc_data_df,proc_table,source=self.pipetype,table_type="processed")
+                span.record(bytes_written=hgdmet.count_file_bytes(proc_paths))
+            hgdmanifest.record_transform(self.pipetype,db_table,raw_digest,version,proc_paths)
+
+            if cfg.IN_MEM:
+                # Return dataframe for in memory processing
+                return proc_data_dict
+            
+            else:
+                # Return filepath metadata for disk-read/write
+                return proc_paths
 
 
     @log
-    def load_table(self,db_table,mysqlpipe,proc_data_df=pd.DataFrame(),overwrite=False):
+    def load_table(self,db_table,mysqlpipe,proc_data_df=pd.DataFrame(),overwrite=False,incremental=None):
         """
         Initializes processed-data-loading process for 
         a single table to a database. Data is written to 
@@ -231,29 +299,91 @@ class humanGenomeDataPipe:
             there will be an exception.
         overwrite: bool [optional]
             Whether or not to overwrite existing data in MySQL table
+            (the table itself is kept, as created from the schema
+            sql/models/hgd_database.sql)
+        incremental: bool [optional]
+            Whether to only write the rows that changed since the
+            table's last load - inserts, updates & deletes (see 
+            utils/hgd_delta.py). Tables never loaded incrementally
+            are loaded in full. Default is config param INCREMENTAL_LOAD
 
         Returns
         -------
         None
         """
         
-        if overwrite:
-            mysqlpipe.create_table(db_table)
-
-        if proc_data_df.empty:
-            try:
-                proc_data_df = hgd.load_data(db_table,'processed',self.pipetype)
-            except:
-                raise Exception(f"Table {db_table} not found - please extract first or update data_dict with location of file")
-        
-        
-        mysqlpipe.write_data(db_table,proc_data_df,overwrite)
+        incremental = cfg.INCREMENTAL_LOAD if incremental is None else incremental
+        # Written to its schema name ('<source>_human_<table>'), so sources never share a MySQL table
+        schema_table = hgdsched.schema_table(self.pipetype,db_table)
+        with self.metrics.span('load',db_table) as span:
+            if proc_data_df.empty:
+                try:
+                    proc_data_df = hgd.load_data(db_table,'processed',self.pipetype)
+                except:
+                    raise Exception(f"Table {db_table} not found - please extract first or update data_dict with location of file")
+            
+            span.record(rows_in=len(proc_data_df))
+            delta = hgddelta.table_delta(self.pipetype,db_table,proc_data_df) if incremental else None
+
+            if delta is not None:
+                # Changed rows only, with IDs in their prefixed string form ('G<id>', 'P<id>', ...)
+                print(f"Loading changes to {db_table}: {delta.counts()}")
+                mysqlpipe.apply_delta(schema_table,hgdids.decode_ids(delta.rows),hgdids.decode_ids(delta.removed_keys),
+                                      delta.key_cols)
+                span.record(rows_out=sum(delta.counts().values()))
+                hgddelta.write_snapshot(self.pipetype,db_table,delta.snapshot)
+                return
+
+            # Full load - the rows of the last snapshot are gone, even if this write fails
+            hgddelta.remove_snapshot(self.pipetype,db_table)
+
+            # Tables are kept, so the keys & foreign keys of the schema hold - a missing table is created from the
+            # schema & an existing one has its rows replaced (overwriting, or a first incremental load)
+            if not mysqlpipe.table_exists(schema_table):
+                mysqlpipe.create_table(schema_table)
+            elif overwrite or incremental:
+                mysqlpipe.delete_rows(schema_table)
+
+            # IDs are integers until here - write their prefixed string form ('G<id>', 'P<id>', ...)
+            mysqlpipe.write_data(schema_table,hgdids.decode_ids(proc_data_df),False)
+            span.record(rows_out=len(proc_data_df))
+            if incremental:
+                # Next load is incremental
+                hgddelta.write_snapshot(self.pipetype,db_table,hgddelta.snapshot_of(self.pipetype,db_table,proc_data_df))
     
 
     ########################################################################################################################################
     ### FULL ETL FUNCTIONS
     ######################################################################################################################################## 
-    
+
+    def get_raw_data(self,db_table):
+        """
+        Raw data of a data-source dataset - extracted when 
+        auto_extract is set, else the raw files of its last 
+        extract, as recorded in the run manifest (extracted
+        when there are none - see utils/hgd_manifest.py)
+
+        Parameters
+        ----------
+        db_table : str [required]
+            The string-name of the data-source dataset
+
+        Returns
+        -------
+        raw_data_dict: dict
+            {<db_table>:raw data} as returned by extract_table
+        """
+
+        if not self.auto_extract:
+            raw_files = hgdmanifest.raw_files(self.pipetype,db_table)
+            if raw_files:
+                return raw_files
+
+        raw_data_dict = self.extract_table(db_table)
+        hgdmanifest.record_raw(self.pipetype,db_table,raw_data_dict)
+        return raw_data_dict
+
+
     @log
     def single_table_refresh(self,db_table,load_db=False,overwrite=False):
         """
@@ -281,47 +411,34 @@ class humanGenomeDataPipe:
         None
         """
 
-        # Validate table first
-        self.validate_db_type(db_table,self.datapipe.db_table_dict)
+        with self.metrics.span('refresh',db_table):
+            # Validate table first
+            self.validate_db_type(db_table,self.datapipe.db_table_dict)
 
-        # Extract dataset (optionally)
-        if self.auto_extract:
-            self.data_dict["raw"] = self.extract_table(db_table)
-        else:
-            # If not re_extract, use what is in raw folder
-            raw_path = f'data/raw/{self.pipetype}/'
-            onlyfiles = [f for f in os.listdir(raw_path) if os.path.isfile(os.path.join(raw_path, f))]
-            file_tpye = '.gz' if db_table in ['gene_info','gene2go','gene_orthologs'] else '.csv'
-            pattern = re.compile(fr"{self.pipetype}_human_{re.escape(db_table)}(?:_[a-zA-Z0-9_]+)?\{file_tpye}")
-            filtered_filenames = [fn for fn in onlyfiles if pattern.search(fn)]
-
-            if not filtered_filenames:
-                self.auto_extract = True
-                self.single_table_refresh(db_table,load_db=load_db,overwrite=overwrite)
-
-            self.data_dict["raw"] = {fn.replace(f'{self.pipetype}_human_','').replace(file_tpye,''):raw_path+fn for fn in filtered_filenames}
+            # Extract dataset (optionally)
+            self.data_dict["raw"] = self.get_raw_data(db_table)
         
-        # Process data
-        for db_table,raw_data in self.data_dict["raw"].items():
-            # Some "single" tables have multiple outputs
-            self.data_dict["processed"] = self.transform_table(db_table,raw_data)
+            # Process data
+            for db_table,raw_data in self.data_dict["raw"].items():
+                # Some "single" tables have multiple outputs
+                self.data_dict["processed"].update(self.transform_table(db_table,raw_data))
 
 
-        if load_db:
-            # Load processed data to MySQL, sharing connection for all tables
-            mysqlpipe = hgdm.mysqlDataPipe()
+            if load_db:
+                # Load processed data to MySQL, sharing connection for all tables
+                mysqlpipe = hgdm.mysqlDataPipe()
 
-            for db_table,proc_data in self.data_dict["processed"].items():
-                if cfg.IN_MEM:
-                    self.load_table(db_table,mysqlpipe,proc_data,overwrite)
-                else:
-                    # Will load data from disk using filepath ("data" will be string)
-                    self.load_table(db_table,mysqlpipe,overwrite)
+                for db_table,proc_data in self.data_dict["processed"].items():
+                    if cfg.IN_MEM:
+                        self.load_table(db_table,mysqlpipe,proc_data,overwrite)
+                    else:
+                        # Will load data from disk using filepath ("data" will be string)
+                        self.load_table(db_table,mysqlpipe,overwrite=overwrite)
 
-            mysqlpipe.close()
+                mysqlpipe.close()
         
 
-    def hgd_refresh(self,db_table_list=[]):
+    def hgd_refresh(self,db_table_list=[],load_db=False):
         """
         Initializes full extract-process(-load) "refresh" for a given
         list of data-source datasets. Will call single_table_refresh
@@ -330,11 +447,21 @@ class humanGenomeDataPipe:
         This is similar to a full "main" or "execute" function for 
         a database refresh.
 
+        Tables are refreshed as a pipeline of stages (see
+        pipelined_refresh) - one table is extracted while another is
+        processed & another loaded. Without loading & with NCPU_MAX > 1
+        (config.py), tables are instead refreshed side by side in a pool
+        of NCPU_MAX worker processes & their raw & processed data is
+        merged into data_dict. A table that fails is recorded in errors
+        (& the run report) without stopping the others.
+
         Parameters
         ----------
         db_table_list : list [optional]
             The string-names of data-source dataset to
             be extracted, processed & loaded. 
+        load_db : bool [optional]
+            Whether to load processed tables to MySQL (overwriting)
 
         Note: This is intended to be run for one pipetype at
         a time and will not execute for multiple without 
@@ -348,9 +475,13 @@ class humanGenomeDataPipe:
         if not db_table_list:
             db_table_list = list(self.datapipe.db_table_dict.keys())
 
-        for db_table in db_table_list:
-            self.data_dict = {"raw":{},"processed":{}}
-            self.single_table_refresh(db_table,overwrite=True)
+        if cfg.NCPU_MAX > 1 and len(db_table_list) > 1 and not load_db:
+            self.parallel_refresh(db_table_list)
+        else:
+            self.pipelined_refresh(db_table_list,load_db=load_db)
+
+        # Per-table run report (extract/transform/load spans)
+        self.metrics.write_report()
 
 
         
@@ -361,3 +492,293 @@ class humanGenomeDataPipe:
             
 
 
+    def parallel_refresh(self,db_table_list):
+        """
+        Extracts & processes tables concurrently, one table per
+        worker process (NCPU_MAX at a time - see utils/hgd_parallel.py),
+        merging each table's raw & processed data into data_dict &
+        its metric spans into metrics. Failed tables are recorded in
+        errors.
+
+        Parameters
+        ----------
+        db_table_list : list [required]
+            The string-names of data-source datasets to be extracted
+            & processed
+
+        Returns
+        -------
+        None
+        """
+
+        print(f"Refreshing {len(db_table_list)} tables with {hgdpar.pool_size(len(db_table_list))} processes")
+        results, self.errors = hgdpar.run_tables(refresh_table_worker,db_table_list,self.pipetype,self.auto_extract)
+
+        self.data_dict = {"raw":{},"processed":{}}
+        # Merged in the requested table order, whatever order the workers finished in
+        for db_table in db_table_list:
+            if db_table in self.errors:
+                self.metrics.record_error('refresh',db_table,self.errors[db_table])
+                continue
+            data_dict, spans = results[db_table]
+            self.data_dict["raw"].update(data_dict["raw"])
+            self.data_dict["processed"].update(data_dict["processed"])
+            self.metrics.add_spans(spans)
+
+
+    def pipelined_refresh(self,db_table_list,load_db=False):
+        """
+        Extracts, processes (& loads) tables as a graph of stages
+        (see utils/hgd_scheduler.py): each stage starts as soon as
+        the stages it needs are done, with PIPELINE_LIMITS stages
+        at a time on the network, CPU & database. Processed tables
+        are loaded after the tables they reference (foreign keys of
+        sql/models/hgd_database.sql). Raw & processed data of all
+        tables is kept in data_dict & failed stages in errors.
+
+        Parameters
+        ----------
+        db_table_list : list [required]
+            The string-names of data-source datasets to be extracted
+            & processed
+        load_db : bool [optional]
+            Whether to load processed tables to MySQL (overwriting),
+            sharing one connection pool
+
+        Returns
+        -------
+        None
+        """
+
+        scheduler = hgdsched.stageScheduler()
+        mysqlpipe = hgdm.mysqlDataPipe() if load_db else None
+        self.add_refresh_stages(scheduler,db_table_list,mysqlpipe)
+
+        print(f"Refreshing {len(db_table_list)} tables as a pipeline ({scheduler.limits})")
+        _, errors = scheduler.run()
+        if mysqlpipe is not None:
+            mysqlpipe.close()
+
+        self.record_stage_errors(errors)
+
+
+    def add_refresh_stages(self,scheduler,db_table_list,mysqlpipe=None):
+        """
+        Adds the extract, transform (& load) stages of tables to a
+        stage scheduler - which may hold the stages of other sources
+        too (see refresh_sources). Stages are named
+        <stage>:<pipetype>:<db_table>.
+
+        Parameters
+        ----------
+        scheduler : hgd_scheduler.stageScheduler [required]
+            Scheduler the stages are run by
+        db_table_list : list [required]
+            The string-names of data-source datasets to be extracted
+            & processed
+        mysqlpipe : HGD-MySQL object [optional]
+            Shared MySQL pipe processed tables are loaded with
+            (overwriting) - tables aren't loaded without one
+
+        Returns
+        -------
+        None
+        """
+
+        references = hgdsched.foreign_keys()
+        self.data_dict = {"raw":{},"processed":{}}
+
+        def transform(db_table):
+            raw_data_dict = scheduler.results[f'extract:{self.pipetype}:{db_table}']
+            self.data_dict["raw"].update(raw_data_dict)
+
+            # Some "single" tables have multiple outputs
+            proc_data_dict = {}
+            for raw_table,raw_data in raw_data_dict.items():
+                proc_data_dict.update(self.transform_table(raw_table,raw_data))
+            self.data_dict["processed"].update(proc_data_dict)
+
+            if mysqlpipe is not None:
+                for proc_table,proc_data in proc_data_dict.items():
+                    deps = [f'transform:{self.pipetype}:{db_table}'] + \
+                           [f'load:{self.pipetype}:{t}' for t in hgdsched.load_dependencies(self.pipetype,proc_table,references)]
+                    # Will load data from disk using filepath when not in memory
+                    proc_data_df = proc_data if cfg.IN_MEM else pd.DataFrame()
+                    scheduler.add(f'load:{self.pipetype}:{proc_table}',self.load_table,proc_table,mysqlpipe,proc_data_df,True,
+                                  resource='db',deps=deps)
+
+        for db_table in db_table_list:
+            self.validate_db_type(db_table,self.datapipe.db_table_dict)
+            scheduler.add(f'extract:{self.pipetype}:{db_table}',self.get_raw_data,db_table,resource='network')
+            scheduler.add(f'transform:{self.pipetype}:{db_table}',transform,db_table,resource='cpu',
+                          deps=[f'extract:{self.pipetype}:{db_table}'],expands=mysqlpipe is not None)
+
+
+    def record_stage_errors(self,errors):
+        """
+        Keeps the failed stages of this source (from a stage
+        scheduler's {stage:error message}) in errors, keyed by
+        table, & records stages that never ran in metrics
+
+        Parameters
+        ----------
+        errors : dict [required]
+            {<stage>:<pipetype>:<db_table>:error message}
+
+        Returns
+        -------
+        None
+        """
+
+        self.errors = {}
+        for name,error in errors.items():
+            stage, pipetype, db_table = name.split(':',2)
+            if pipetype != self.pipetype:
+                continue
+            self.errors[db_table] = error
+            if error.startswith('Skipped'):
+                # Never ran, so has no span of its own
+                self.metrics.record_error(stage,db_table,error)
+
+
+    @log
+    def dbsnp_bulk_load(self,tables=None):
+        """
+        Loads dbSNP's bulk table dumps into MySQL, for SNP data
+        at a scale the Entrez (snp_summary) pull can't reach. 
+        Dumps are streamed, partitioned by chromosome & loaded
+        in parallel, then indexes & constraints are built
+        (see source_pipes/ncbi_pipe/dbsnp_utils.py)
+
+        Parameters
+        ----------
+        tables : list [optional]
+            dbSNP tables to load (as named in the bundled dbSNP
+            schema scripts) - default is every table
+
+        Returns
+        -------
+        None
+        """
+
+        mysqlpipe = hgdm.mysqlDataPipe()
+        with self.metrics.span('load','dbsnp') as span:
+            n_rows = dbsnp.bulk_load(mysqlpipe,tables)
+            span.record(rows_in=sum(n_rows.values()),rows_out=sum(n_rows.values()))
+        mysqlpipe.close()
+        self.metrics.write_report()
+
+
+def refresh_sources(pipetypes,db_table_list=None,load_db=False,auto_extract=False):
+    """
+    Refreshes several sources in one run: the stages of every
+    source's tables go into one stage scheduler, so sources are
+    extracted, processed & loaded side by side sharing one worker
+    pool (PIPELINE_LIMITS), the process-wide HTTP pool (see
+    utils/hgd_http.py) & one MySQL connection pool. A run takes
+    about as long as its slowest source. Writes one run report
+    of all sources (see utils/hgd_metrics.py).
+
+    Parameters
+    ----------
+    pipetypes : list [required]
+        Data sources to refresh (see README)
+    db_table_list : list [optional]
+        Tables to refresh - each source refreshes the ones it
+        has. A table of several sources is named
+        '<pipetype>:<db_table>' (see select_tables). Default is
+        every table of every source
+    load_db : bool [optional]
+        Whether to load processed tables to MySQL (overwriting)
+    auto_extract : bool [optional]
+        Whether to re-extract data from source (see 
+        humanGenomeDataPipe)
+
+    Returns
+    -------
+    pipelines: dict
+        {<pipetype>:humanGenomeDataPipe} of the refreshed sources,
+        with their data_dict & errors
+    """
+
+    run_start = time.time()
+    hgd_pipelines = {pipetype:humanGenomeDataPipe(pipetype=pipetype,auto_extract=auto_extract) for pipetype in pipetypes}
+    selected = select_tables({pipetype:list(p.datapipe.db_table_dict) for pipetype,p in hgd_pipelines.items()},
+                             db_table_list)
+
+    scheduler = hgdsched.stageScheduler()
+    mysqlpipe = hgdm.mysqlDataPipe() if load_db else None
+
+    pipelines = {}
+    for pipetype,source_tables in selected.items():
+        if source_tables:
+            hgd_pipelines[pipetype].add_refresh_stages(scheduler,source_tables,mysqlpipe)
+            pipelines[pipetype] = hgd_pipelines[pipetype]
+
+    print(f"Refreshing sources {list(pipelines)} as one pipeline ({scheduler.limits})")
+    _, errors = scheduler.run()
+    if mysqlpipe is not None:
+        mysqlpipe.close()
+
+    for hgd_pipeline in pipelines.values():
+        hgd_pipeline.record_stage_errors(errors)
+
+    # One report for the run, with each source's tables & spans
+    hgdmet.write_combined_report({pipetype:p.metrics for pipetype,p in pipelines.items()},run_start=run_start,
+                                 errors={pipetype:p.errors for pipetype,p in pipelines.items()})
+    return pipelines
+
+
+def select_tables(source_tables,db_table_list=None):
+    """
+    Tables of each source a refresh runs - every table when
+    no db_table_list is given. Tables are named '<pipetype>:<db_table>'
+    (e.g. 'reactome:pathway'), or by their bare name when only
+    one of the sources has a table of that name
+
+    Parameters
+    ----------
+    source_tables : dict [required]
+        {<pipetype>:[db_table]} of the sources refreshed
+    db_table_list : list [optional]
+        Tables to refresh
+
+    Returns
+    -------
+    selected: dict
+        {<pipetype>:[db_table]}, in the order tables were named
+    """
+
+    if db_table_list is None:
+        return {pipetype:list(tables) for pipetype,tables in source_tables.items()}
+
+    selected = {pipetype:[] for pipetype in source_tables}
+    unknown, ambiguous = [], []
+    for name in db_table_list:
+        pipetype, _, db_table = name.rpartition(':')
+        if pipetype:
+            matches = [pipetype] if db_table in source_tables.get(pipetype,[]) else []
+        else:
+            matches = [p for p,tables in source_tables.items() if db_table in tables]
+
+        if not matches:
+            unknown.append(name)
+        elif len(matches) > 1:
+            ambiguous.append(name)
+        elif db_table not in selected[matches[0]]:
+            selected[matches[0]].append(db_table)
+
+    if unknown:
+        raise Exception(f"Invalid Database(s) ({unknown}) for sources: {list(source_tables)}")
+    if ambiguous:
+        raise Exception(f"Database(s) {ambiguous} exist in several sources - name them as '<source>:<table>' "
+                        f"(e.g. '{list(source_tables)[0]}:{ambiguous[0]}')")
+    return selected
+
+
+def refresh_table_worker(db_table,pipetype,auto_extract):
+    """Worker-process task of a parallel refresh - extracts & processes one table with a pipeline of its own,
+    returning its data_dict & metric spans"""
+    hgd_pipeline = humanGenomeDataPipe(pipetype=pipetype,auto_extract=auto_extract)
+    hgd_pipeline.single_table_refresh(db_table,overwrite=True)
+    return hgd_pipeline.data_dict, hgd_pipeline.metrics.spans
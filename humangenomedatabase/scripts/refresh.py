@@ -1,29 +1,35 @@
 import argparse
 import humangenomedatabase.hgd_pipe as hgdp
+from humangenomedatabase.configs import auto_config as cfg
 
 
 # Run full pipeline
 parser = argparse.ArgumentParser(description='Human Genome Database Refresher Pipeline')
 
-parser.add_argument('-s','--sources',required=False,nargs='*',default=[],choices=['kegg','ncbi','database'],\
-                    help="Data source Kegg:('kegg') or NCBI ('ncbi'))")
+parser.add_argument('-s','--sources',required=False,nargs='*',default=[],choices=['kegg','ncbi','reactome','database'],\
+                    help="Data source Kegg:('kegg'), NCBI ('ncbi') or Reactome ('reactome')")
 
 parser.add_argument('-dbt','--db_tables',required=False,nargs='*',default=None,\
-                    help='Kegg or NCBI Database(s) - see README for supported data')
+                    help="Kegg, NCBI or Reactome Database(s) - see README for supported data. Tables several sources "\
+                         "have are named '<source>:<table>' (e.g. 'reactome:pathway')")
 
 parser.add_argument('-cdb','--create_database',required=False,action='store_true',\
                     help='This flag will instruct creation of Human Genome Database & Schemas for all tables')
 
+parser.add_argument('-l','--load_db',required=False,action='store_true',\
+                    help='Load processed tables to MySQL (overwriting existing data)')
+
+parser.add_argument('-x','--auto_extract',required=False,action='store_true',\
+                    help='Re-extract data from source, rather than reusing raw files')
+
 args = vars(parser.parse_args())
 
 
 create_database = args['create_database']
-pipetypes = args['sources']
+pipetypes = [s for s in args['sources'] if s != 'database']
 db_tables = args['db_tables']
 
 
-# If no source or db_table are given, then it will run a FULL refresh of all sources
-for pipetype in pipetypes:
-    hgd_pipeline = hgdp.humanGenomeDataPipe(pipetype=pipetype)
-    hgd_pipeline.hgd_table_refresh()
-
+# If no source or db_table are given, then it will run a FULL refresh of all sources - all sources are refreshed
+# together, in one run (see hgd_pipe.refresh_sources)
+hgdp.refresh_sources(pipetypes or cfg.SOURCES,db_tables,load_db=args['load_db'],auto_extract=args['auto_extract'])
@@ -1,7 +1,8 @@
-import requests
-
 import humangenomedatabase.source_pipes.kegg_pipe.kegg_utils as kegg
 import humangenomedatabase.utils.hgd_utils as hgd
+import humangenomedatabase.utils.hgd_http as hgdhttp
+import humangenomedatabase.utils.hgd_cache as hgdcache
+import humangenomedatabase.utils.hgd_profiling as hgdprof
 from humangenomedatabase.utils.hgd_logging import log
 
 class keggDataPipe:
@@ -11,6 +12,11 @@ class keggDataPipe:
         self.db_table_dict = kegg.db_table_dict
         self.valid_dbs = list(self.db_table_dict.keys())
 
+        # Profiling mode: wrap extract & processing functions (nothing is wrapped when off)
+        if self.config.PROFILE:
+            self.db_table_dict = hgdprof.profile_table_dict(self.db_table_dict,source="kegg")
+            self.extract_one = hgdprof.profile_extract(self.extract_one,source="kegg")
+
     @log
     def extract_one(self,db_table):
         valid_dbs = list(self.db_table_dict.keys())
@@ -18,11 +24,45 @@ class keggDataPipe:
 
         # Get params from dict
         api_url = kegg.db_table_dict[db_table].get('url')
-        response = requests.get(api_url)
-        data = response.content.decode()
+        cache_ttl = hgdcache.source_ttl('kegg')
+
+        if cache_ttl is not None:
+            # Parse from the (re-validated) cached response file
+            cache_path = hgdhttp.get_pool().cached_download(api_url,cache_ttl=cache_ttl)
+            with open(cache_path,'rb') as response_body:
+                return self.format_raw(db_table,response_body)
+
+        # Parse while streaming - the response body is never held in memory as a whole
+        with hgdhttp.get_pool().stream(api_url) as response_body:
+            return self.format_raw(db_table,response_body)
+
+
+    @log
+    def extract_all(self,db_tables=None):
+        """Fetches all (or the given) KEGG endpoints concurrently - returns {db_table:raw_df or filepath}"""
+        db_tables = db_tables or self.valid_dbs
+        for db_table in db_tables:
+            hgd.validate_db_type(db_table,self.valid_dbs)
+
+        url_dict = {db_table:kegg.db_table_dict[db_table].get('url') for db_table in db_tables}
+        cache_ttl = hgdcache.source_ttl('kegg')
+        content_dict = hgdhttp.get_pool().fetch_all(url_dict,cache_ttl=cache_ttl)
+
+        raw_data_dict = {}
+        for db_table,content in content_dict.items():
+            if cache_ttl is not None:
+                # Content is the cached response's file path
+                with open(content,'rb') as response_body:
+                    raw_data_dict.update(self.format_raw(db_table,response_body))
+            else:
+                raw_data_dict.update(self.format_raw(db_table,content))
+
+        return raw_data_dict
 
+
+    def format_raw(self,db_table,response_data):
         new_cols = kegg.db_table_dict[db_table].get('columns')
-        raw_df = kegg.api_download_to_df(data,new_cols)
+        raw_df = kegg.api_download_to_df(response_data,new_cols)
         raw_df.columns = [c.upper() for c in raw_df.columns]
 
         # Return a dictionary of either the data itself (for debugging) or filepath of saved location
@@ -33,15 +73,3 @@ class keggDataPipe:
             # Exchange data for saved filepath
             fp = hgd.save_data(raw_df,db_table,source="kegg",table_type="raw")
             return {db_table:fp}
-
-
-        
-
-
-
-
-    
-
-
-
-    
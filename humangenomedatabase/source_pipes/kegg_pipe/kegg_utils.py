@@ -1,18 +1,45 @@
+import io
+import csv
 import pandas as pd
 import numpy as np
 
+import humangenomedatabase.utils.hgd_ids as hgdids
+import humangenomedatabase.utils.hgd_normalize as hgdnorm
+
 ################################################################################################################
 ################################################################################################################
 # 1 - KEGG DATA EXTRACTION FUNCTIONS
 ################################################################################################################
 ################################################################################################################
 
-def api_download_to_df(response_data,columns):
-        df = pd.DataFrame([x.split('\t') for x in response_data.split('\n')])
-        df = df.iloc[:-1,:]
-        df.columns = columns
+"""
+KEGG REST responses are headerless, tab-separated text. They are parsed straight from the response bytes
+(or a binary stream, e.g. an HTTP response body) by pandas' C reader with declared (string) dtypes, so the
+data never exists as a decoded str or a Python list of split lines. Quoting & NA-detection are turned off so
+every field is kept exactly as sent (e.g. the gene symbol "NA" is not turned into a missing value).
+"""
+
+def api_download_to_df(response_data,columns,chunksize=None):
+    """Parses a KEGG TSV response into a DataFrame with <columns>.
 
-        return df
+    response_data may be bytes, str or a binary file-like object (read incrementally). With <chunksize>
+    an iterator of DataFrames of up to <chunksize> rows is returned instead of one DataFrame."""
+
+    if isinstance(response_data,str):
+        response_data = response_data.encode()
+    if isinstance(response_data,(bytes,bytearray,memoryview)):
+        response_data = io.BytesIO(response_data)
+
+    return pd.read_csv(response_data,
+                       sep='\t',
+                       header=None,
+                       names=columns,
+                       dtype={c:str for c in columns},
+                       engine='c',
+                       quoting=csv.QUOTE_NONE,
+                       na_filter=False,
+                       skip_blank_lines=True,
+                       chunksize=chunksize)
 
 ################################################################################################################
 ################################################################################################################
@@ -21,6 +48,13 @@ def api_download_to_df(response_data,columns):
 ################################################################################################################
 
 
+"""
+Processing functions work on whole columns (pandas str methods) rather than applying a Python function per
+row. Row-level rules are only applied to the few values that don't fit the common format, or once per
+distinct value (e.g. chromosomes).
+"""
+
+
 ################################################################################################################
 ## 2.1 - Pathways
 ################################################################################################################
@@ -43,11 +77,11 @@ def map_pathway_start(pn_row):
 
 
 def process_pathway(df):
-    # Add "path:" to pathway_id to match linking -id pattern
-    df['PATHWAY_ID'] = df['PATHWAY_ID'].apply(lambda x: x.replace('hsa','P'))
+    # Integer pathway number (decoded to "P<number>" on load - see utils/hgd_ids.py)
+    df['PATHWAY_ID'] = hgdids.encode_ids(df['PATHWAY_ID'],strip=('hsa',))
 
     # Drop "Human" description repeated after every name
-    df['PATHWAY_NAME'] = df['PATHWAY_NAME'].apply(lambda x: x.split(' - ')[0])
+    df['PATHWAY_NAME'] = df['PATHWAY_NAME'].str.split(' - ',n=1).str[0]
 
     return {'pathway':df}
     
@@ -55,22 +89,18 @@ def process_pathway(df):
 ################################################################################################################
 ## 2.2 - Genes
 ################################################################################################################
-def gene_name_split(gene_cf_row):
-    try:
-        x = gene_cf_row.split(';')[1]
-    except:
-        x = gene_cf_row.split(';')[0]
-    return x
 
+def gene_symbol_and_name_split(gene_cf_col):
+    """(symbols, names) from "<symbols>; <name>" values - the name is the 2nd ';'-field when there is one
+    (else the whole value), & symbols the 1st field ('None' when there is no ';')"""
+    fields = gene_cf_col.str.split(';',n=2)
+    has_name = fields.str.len() > 1
+    return fields.str[0].where(has_name,'None'), fields.str[1].where(has_name,fields.str[0])
 
-def gene_symbol_split(gene_cf_row):
-    col_split = gene_cf_row.split(';')
 
-    if len(col_split)==1:
-        x = ['None']
-    else:
-        x = col_split[0].split(', ')
-    return x
+# <chr>:<stop>..<start> or <chr>:complement(<stop>..<start>) - chromosome names have no 'c', so a line
+# matching this can't have 'complement' outside the brackets
+CHR_POSITION_PATTERN = r'^(?:([^:(c]*):(complement\()?(\d+)\.\.(\d+)(?(2)\))|.*)$'
 
 
 def extract_chr_positions(kgene_row,pos_type="start"):
@@ -105,28 +135,49 @@ def extract_chr(kgene_row):
         return kgene_row.split(':')[0]
 
 
+def chr_positions(kgene_col):
+    """CHRSTOP, CHRSTART, CHR_COMPLEMENT & CHROMOSOME columns from the chromosomal-position column, in one
+    regex pass. Values in another format (unplaced, 'X; Y', bands, ...) fall back to the row-level rules above."""
+    raw_col, kgene_col = kgene_col, kgene_col.astype(str)
+    fields = kgene_col.str.extract(CHR_POSITION_PATTERN).fillna('')
+    prefix, complement, stop, start = (fields[i].to_numpy(dtype=object) for i in range(4))
+    regular = stop != ''
+
+    chr_complement = (complement != '').astype('int64')
+    chr_complement[~regular] = np.where(raw_col[~regular].str.contains('complement'),1,0)
+
+    chr_stop = np.zeros(len(kgene_col),dtype='int64')
+    chr_start = np.zeros(len(kgene_col),dtype='int64')
+    chr_stop[regular] = stop[regular].astype('int64')
+    chr_start[regular] = start[regular].astype('int64')
+    lines = kgene_col.to_numpy(dtype=object)
+    for i in np.flatnonzero(~regular):
+        chr_stop[i] = extract_chr_positions(lines[i],pos_type="stop")
+        chr_start[i] = extract_chr_positions(lines[i],pos_type="start")
+
+    # Chromosome only depends on the part before ':' (& whether it's a complement) - resolve each distinct key once
+    keys = pd.Series(np.where(regular,prefix+np.where(complement != '',':complement',':'),lines),
+                     index=kgene_col.index,dtype=object)
+    chromosome = keys.map({k:extract_chr(k) for k in keys.unique()})
+
+    return (pd.Series(chr_stop,index=kgene_col.index),pd.Series(chr_start,index=kgene_col.index),
+            pd.Series(chr_complement,index=kgene_col.index),chromosome)
+
+
 def process_gene(df):
-    df['GENE_NAME'] = df['GENE_SYMBOL_AND_NAME'].apply(lambda x: gene_name_split(x))
-    df['GENE_SYMBOL'] = df['GENE_SYMBOL_AND_NAME'].apply(lambda x: gene_symbol_split(x))
-    df['GENE_ID'] = df['GENE_ID'].apply(lambda x: x.replace('hsa:','G'))
+    symbols, df['GENE_NAME'] = gene_symbol_and_name_split(df['GENE_SYMBOL_AND_NAME'])
+    df['GENE_ID'] = hgdids.encode_ids(df['GENE_ID'],strip=('hsa:',))
 
     # Normalize gene-symbol into another look-up table
-    gene_symbols = df.explode('GENE_SYMBOL')
-    gene_symbols = gene_symbols[['GENE_SYMBOL','GENE_ID']]
+    gene_symbols = hgdnorm.normalize_column(df,'GENE_ID','GENE_SYMBOL',', ',values=symbols,keep_index=True)
     # Create a primary key for repeating symbols (where gene_id has > 1 symbol)
-    gene_symbols['gene_alias_no'] = gene_symbols.groupby(['GENE_ID'],as_index=False).cumcount()+1
-    gene_symbols.columns = [c.upper() for c in gene_symbols.columns]
-    gene_symbols = gene_symbols[['GENE_ID','GENE_SYMBOL','GENE_ALIAS_NO']]
+    gene_symbols['GENE_ALIAS_NO'] = gene_symbols.groupby(['GENE_ID'],as_index=False).cumcount()+1
     gene_symbols['LOOKUP_SOURCE'] = 'gene'
 
-    df['CHRSTOP'] = df['CHROMOSOMAL_POSITION'].apply(lambda x: extract_chr_positions(x,pos_type="stop"))
-    df['CHRSTART'] = df['CHROMOSOMAL_POSITION'].apply(lambda x: extract_chr_positions(x,pos_type="start"))
-    df['CHR_COMPLEMENT'] = np.where(df['CHROMOSOMAL_POSITION'].str.contains('complement'),1,0)
-    df['CHROMOSOMAL_POSITION'] = df['CHROMOSOMAL_POSITION'].astype(str)
-    df['CHROMOSOME'] = df['CHROMOSOMAL_POSITION'].apply(lambda x: extract_chr(x))
+    df['CHRSTOP'], df['CHRSTART'], df['CHR_COMPLEMENT'], df['CHROMOSOME'] = chr_positions(df['CHROMOSOMAL_POSITION'])
 
     # Clean up
-    df = df.drop(columns=['GENE_SYMBOL','GENE_SYMBOL_AND_NAME','CHROMOSOMAL_POSITION'])
+    df = df.drop(columns=['GENE_SYMBOL_AND_NAME','CHROMOSOMAL_POSITION'])
 
     # Note: returns gene table & gene-symbol look up table
     return {'gene':df,'gene_symbol_lookup':gene_symbols}
@@ -136,27 +187,15 @@ def process_gene(df):
 ## 2.3 - Diseases
 ################################################################################################################
 
-def list_disease_names(disease_row):
-    return disease_row.split('; ')
-
-def count_names(disease_row):
-    return len(disease_row)
-
 def process_disease(df):
-    # Add "DS" to disease_id to match linking-id pattern
-    df['DISEASE_ID'] = df['DISEASE_ID'].apply(lambda x: x.replace('H','DS'))
-
-    # Fix formatting of disease names to match string-list pattern
-    df['DISEASE_NAME'] = df['DISEASE_NAME'].apply(lambda x: list_disease_names(x))
+    # Integer disease number (decoded to "DS<number>" on load)
+    df['DISEASE_ID'] = hgdids.encode_ids(df['DISEASE_ID'],strip=('H',))
 
     # Normalize disease-names into another look-up table
-    disease_names = df.explode('DISEASE_NAME')
-    disease_names = disease_names[['DISEASE_ID','DISEASE_NAME']]
-    disease_names.columns = [c.upper() for c in disease_names.columns]
-    disease_names['LOOKUP_SOURCE'] = 'disease'
-
-    #df = df.groupby(['disease_id'],as_index=False)['disease_name'].count().rename(columns={'disease_name':'disease_name_count'})
-    df['DISEASE_NAME_COUNT'] = df['DISEASE_NAME'].apply(lambda x: count_names(x))
+    # Split once - the lookup rows per disease are also its name count
+    disease_names, df['DISEASE_NAME_COUNT'] = hgdnorm.normalize_column(df,'DISEASE_ID','DISEASE_NAME','; ',
+                                                                       source='disease',keep_index=True,
+                                                                       return_counts=True)
 
     df = df.drop(columns=['DISEASE_NAME'])
     df.columns = [c.upper() for c in df.columns]
@@ -169,11 +208,12 @@ def process_disease(df):
 ################################################################################################################
 
 def process_variant(df):
+    # Split "<id>v<version>" on the last "v"
+    variant_id = df['VARIANT_ID'].str.rsplit('v',n=1)
+    df['VARIANT_VERSION'] = variant_id.str[1]
+    df['VARIANT_ID'] = 'V'+variant_id.str[0]
     # Gene variant is related to
-    df['VARIANT_VERSION'] = df['VARIANT_ID'].apply(lambda x: x.rsplit("v",1)[1])
-    df['VARIANT_ID'] = df['VARIANT_ID'].apply(lambda x: 'V'+x.rsplit("v",1)[0])
-    # Gene variant is related to
-    df['GENE_SYMBOL'] = df['VARIANT_NAME'].apply(lambda x: x.split(' ')[0])
+    df['GENE_SYMBOL'] = df['VARIANT_NAME'].str.split(' ',n=1).str[0]
     df.columns = [c.upper() for c in df.columns]
 
     return {'variant':df}
@@ -183,25 +223,16 @@ def process_variant(df):
 ## 2.5 - Modules
 ################################################################################################################
 
-def clean_mod_name(mod_row):
-    try:
-        x = mod_row.rsplit(',',1)[0]
-        x = x.replace(' (',',').replace(')','')
-        x = x.split(',')
-        return x
-    
-    except:
-        return [np.NaN]
-    
+def clean_mod_name(mod_col):
+    # Drop the trailing ", <class>" & turn "<name> (<alt names>)" into ','-separated names
+    mod_names = mod_col.str.rsplit(',',n=1).str[0]
+    return mod_names.str.replace(' (',',',regex=False).str.replace(')','',regex=False)
 
-def process_module(df):
-    df['MODULE_NAME'] = df['MODULE_NAME'].apply(lambda x: clean_mod_name(x))
 
-    mod_names = df.explode('MODULE_NAME')
-    mod_names.columns = [c.upper() for c in mod_names.columns]
-    mod_names['LOOKUP_SOURCE'] = 'module'
+def process_module(df):
+    mod_names = hgdnorm.normalize_column(df,'MODULE_ID','MODULE_NAME',',',values=clean_mod_name(df['MODULE_NAME']),
+                                         source='module',keep_index=True)
 
-    df['MODULE_NAME'] = df['MODULE_NAME'].apply(lambda x: count_names(x)) # from disease functions
     df = df.drop(columns=['MODULE_NAME'])
 
     df.columns = [c.upper() for c in df.columns]
@@ -221,23 +252,22 @@ The tables are named <source>_<target>_lookup. The <source> is used as the priam
 
 def process_link(df,db_table):
 
+    # Linked IDs as integers, like the object tables (see utils/hgd_ids.py)
     if 'PATHWAY_ID' in df.columns:
-        df['PATHWAY_ID'] = df['PATHWAY_ID'].apply(lambda x: x.replace('path:hsa','P'))
-        df['PATHWAY_ID'] = df['PATHWAY_ID'].apply(lambda x: x.replace('path:map','P'))
+        df['PATHWAY_ID'] = hgdids.encode_ids(df['PATHWAY_ID'],strip=('path:hsa','path:map'))
 
     if 'GENE_ID' in df.columns:
-        df['GENE_ID'] = df['GENE_ID'].apply(lambda x: x.replace('hsa:','G'))
+        df['GENE_ID'] = hgdids.encode_ids(df['GENE_ID'],strip=('hsa:',))
 
     if 'DISEASE_ID' in df.columns:
-        df['DISEASE_ID'] = df['DISEASE_ID'].apply(lambda x: x.replace('ds:H','DS'))
+        df['DISEASE_ID'] = hgdids.encode_ids(df['DISEASE_ID'],strip=('ds:H',))
 
     if 'MODULE_ID' in df.columns:
-        df['MODULE_ID'] = df['MODULE_ID'].apply(lambda x: x.replace('md:',''))
+        df['MODULE_ID'] = df['MODULE_ID'].str.replace('md:','',regex=False)
 
 
     if db_table == 'gene_ncbi':
-        df['NCBI_GENE_ID'] = df['NCBI_GENE_ID'].apply(lambda x: x.replace('ncbi-geneid:','G'))
-        df['GENE_ID'] = df['GENE_ID'].apply(lambda x: x.replace('hsa:','G'))
+        df['NCBI_GENE_ID'] = df['NCBI_GENE_ID'].str.replace('ncbi-geneid:','G',regex=False)
 
     df.columns = [c.upper() for c in df.columns]
 
@@ -303,3 +333,54 @@ db_table_dict = {
     }
 }
 
+
+
+# Typed schemas of raw & processed tables (see utils/hgd_schema.py). Raw tables are the API's text fields, as
+# parsed by api_download_to_df
+table_schemas = {
+    'raw':{db_table:{'columns':[c.upper() for c in params['columns']],
+                     'dtypes':{c.upper():str for c in params['columns']}}
+           for db_table,params in db_table_dict.items()},
+    'processed':{
+        'pathway':{
+            'dtypes':{'PATHWAY_ID':'int64','PATHWAY_NAME':str}
+        },
+        'gene':{
+            'dtypes':{'GENE_ID':'int64','GENE_TYPE':'category','GENE_NAME':str,'CHRSTOP':'Int64','CHRSTART':'Int64',
+                      'CHR_COMPLEMENT':'int64','CHROMOSOME':'category'}
+        },
+        'gene_symbol_lookup':{
+            'dtypes':{'GENE_ID':'int64','GENE_SYMBOL':str,'GENE_ALIAS_NO':'int64','LOOKUP_SOURCE':'category'}
+        },
+        'disease':{
+            'dtypes':{'DISEASE_ID':'int64','DISEASE_NAME_COUNT':'int64'}
+        },
+        'disease_name_lookup':{
+            'dtypes':{'DISEASE_ID':'int64','DISEASE_NAME':str,'LOOKUP_SOURCE':'category'}
+        },
+        'variant':{
+            'dtypes':{'VARIANT_ID':str,'VARIANT_NAME':str,'VARIANT_VERSION':str,'GENE_SYMBOL':str}
+        },
+        'module':{
+            'dtypes':{'MODULE_ID':str}
+        },
+        'module_name_lookup':{
+            'dtypes':{'MODULE_ID':str,'MODULE_NAME':str,'LOOKUP_SOURCE':'category'}
+        },
+        'pathway_gene_lookup':{
+            'dtypes':{'PATHWAY_ID':'int64','GENE_ID':'int64'}
+        },
+        'pathway_module_lookup':{
+            'dtypes':{'PATHWAY_ID':'int64','MODULE_ID':str}
+        },
+        'pathway_disease_lookup':{
+            'dtypes':{'PATHWAY_ID':'int64','DISEASE_ID':'int64'}
+        },
+        'gene_disease_lookup':{
+            'dtypes':{'DISEASE_ID':'int64','GENE_ID':'int64'}
+        },
+        'ncbi_gene_lookup':{
+            'dtypes':{'NCBI_GENE_ID':str,'GENE_ID':'int64'}
+        }
+    }
+}
@@ -0,0 +1,283 @@
+import os
+import re
+import csv
+import shutil
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import humangenomedatabase.utils.hgd_http as hgdhttp
+import humangenomedatabase.utils.hgd_cache as hgdcache
+from humangenomedatabase.configs import auto_config as cfg
+
+################################################################################################################
+################################################################################################################
+# dbSNP BULK LOADER
+################################################################################################################
+################################################################################################################
+
+"""
+Entrez ESummary pulls (ncbi_utils, snp_summary) are rate-limited to a few requests per second, which caps SNP
+coverage far below dbSNP's size. The bulk path loads dbSNP's own table dumps instead - one headerless,
+tab-separated <Table>.bcp.gz file per table of the dbSNP schema bundled in scripts/:
+
+    dbSNP_main_table.sql        CREATE TABLE statements - the column layout of every dump file
+    dbSNP_main_index.sql        CREATE INDEX statements
+    dbSNP_main_constraint.sql   primary keys, foreign keys & column defaults
+
+The scripts are written for SQL Server (bracketed names, CLUSTERED keys, 'go' batches) & are translated to
+MySQL statements here. A load runs in three steps:
+
+    1. tables are created without any key or index
+    2. each dump is read as a stream (DBSNP_CHUNK_ROWS rows at a time) & its rows are appended to partition
+       files - one per chromosome for tables with a chromosome column, else one per hash bucket of the
+       table's first (ID) column (DBSNP_PARTITIONS) - then the partitions of all tables are bulk-loaded
+       (LOAD DATA) in parallel by DBSNP_LOAD_WORKERS threads
+    3. indexes, then primary keys & defaults, then foreign keys are built once on the loaded tables (tables
+       in parallel)
+
+Building keys once after the load, rather than maintaining them row by row during it, is what keeps a load of
+hundreds of millions of rows fast. Memory is bounded by one chunk per table being partitioned.
+"""
+
+DBSNP_SCRIPT_DIR = os.path.join(os.path.dirname(__file__),'scripts')
+DBSNP_SCRIPTS = {'table':'dbSNP_main_table.sql',
+                 'index':'dbSNP_main_index.sql',
+                 'constraint':'dbSNP_main_constraint.sql'}
+
+# Columns that hold a chromosome - tables with one are partitioned by it
+CHR_COLUMNS = ('chr','chromosome')
+
+# SQL Server column types without a MySQL equivalent of the same name
+MYSQL_TYPES = {'smalldatetime':'datetime','bit':'tinyint(1)','real':'float','binary':'binary(16)',
+               'decimal':'decimal(10,1)'}
+# Longest indexable varchar prefix (InnoDB keys are at most 3072 bytes - 768 utf8mb4 characters)
+MAX_KEY_CHARS = 255
+
+
+################################################################################################################
+## 1 - Schema Scripts
+################################################################################################################
+
+def script_path(script):
+    return os.path.join(DBSNP_SCRIPT_DIR,DBSNP_SCRIPTS[script])
+
+
+def script_statements(script):
+    """Statements of a bundled script - CREATE TABLE statements span a 'go' batch, the ALTER TABLE & CREATE
+    INDEX statements of a batch are one per line"""
+    with open(script_path(script)) as f:
+        batches = re.split(r'^go\s*$',f.read(),flags=re.M)
+
+    statements = []
+    for batch in batches:
+        batch = batch.strip()
+        if batch.startswith('CREATE TABLE'):
+            statements.append(batch)
+        else:
+            statements += [line.strip() for line in batch.split('\n') if line.strip()]
+    return statements
+
+
+COLUMN_PATTERN = re.compile(r'^\[(\w+)\] \[(\w+)\](\([\d,]+\))? (NOT NULL|NULL)',re.M)
+
+
+def table_definitions():
+    """{table:[(column,mysql type,nullable), ...]} from dbSNP_main_table.sql"""
+    definitions = {}
+    for statement in script_statements('table'):
+        table = re.match(r'CREATE TABLE \[(\w+)\]',statement).group(1)
+        definitions[table] = [(column,MYSQL_TYPES.get(sql_type,sql_type+(length or '')),null == 'NULL')
+                              for column,sql_type,length,null in COLUMN_PATTERN.findall(statement)]
+    return definitions
+
+
+def create_table_statement(table,columns):
+    column_defs = ',\n'.join(f"  `{column}` {mysql_type}{'' if nullable else ' NOT NULL'}"
+                             for column,mysql_type,nullable in columns)
+    return f"CREATE TABLE IF NOT EXISTS `{table}` (\n{column_defs}\n)"
+
+
+def key_columns(table,column_list,definitions):
+    """MySQL key-column list from a SQL Server one ('[a] ASC,[b] ASC') - long varchars are indexed by prefix"""
+    types = {column:mysql_type for column,mysql_type,_ in definitions.get(table,[])}
+    keys = []
+    for column in re.findall(r'\[?(\w+)\]?(?: ASC| DESC)?',column_list):
+        length = re.match(r'varchar\((\d+)\)',types.get(column,''))
+        prefix = f'({MAX_KEY_CHARS})' if length and int(length.group(1)) > MAX_KEY_CHARS else ''
+        keys.append(f'`{column}`{prefix}')
+    return ','.join(keys)
+
+
+def mysql_statement(statement,definitions):
+    """(table, MySQL statement) for an index or constraint statement of the bundled scripts - None for a
+    statement with no MySQL equivalent"""
+    index = re.match(r'CREATE (?:UNIQUE )?(?:NON)?CLUSTERED INDEX \[(\w+)\] ON \[(\w+)\] \((.*)\)$',statement)
+    if index:
+        name, table, column_list = index.groups()
+        return table, f"CREATE INDEX `{name}` ON `{table}` ({key_columns(table,column_list,definitions)})"
+
+    primary_key = re.match(r'ALTER TABLE \[(\w+)\] ADD CONSTRAINT \[\w+\]\s+PRIMARY KEY\s+(?:NON)?CLUSTERED\s+'
+                           r'\((.*)\)$',statement)
+    if primary_key:
+        table, column_list = primary_key.groups()
+        return table, f"ALTER TABLE `{table}` ADD PRIMARY KEY ({key_columns(table,column_list,definitions)})"
+
+    foreign_key = re.match(r'ALTER TABLE \[(\w+)\] ADD CONSTRAINT \[(\w+)\] FOREIGN KEY \((\w+)\) '
+                           r'REFERENCES \[(\w+)\]\((\w+)\)$',statement)
+    if foreign_key:
+        table, name, column, ref_table, ref_column = foreign_key.groups()
+        return table, (f"ALTER TABLE `{table}` ADD CONSTRAINT `{name}` FOREIGN KEY (`{column}`) "
+                       f"REFERENCES `{ref_table}` (`{ref_column}`)")
+
+    default = re.match(r'ALTER TABLE \[(\w+)\] ADD CONSTRAINT \[\w+\] DEFAULT \((.*)\) FOR \[(\w+)\]$',statement)
+    if default:
+        table, value, column = default.groups()
+        # Column defaults are set with the column's full definition
+        mysql_type, nullable = {c:(t,n) for c,t,n in definitions.get(table,[])}[column]
+        value = 'CURRENT_TIMESTAMP' if value == 'GETDATE()' else value
+        return table, (f"ALTER TABLE `{table}` MODIFY `{column}` {mysql_type}{'' if nullable else ' NOT NULL'} "
+                       f"DEFAULT {value}")
+
+    return None
+
+
+def post_load_statements(script,definitions,tables=None):
+    """{table:[MySQL statements]} of the index or constraint script, for <tables> (default all). Foreign keys
+    to tables that are not loaded are left out."""
+    statements = {}
+    for statement in script_statements(script):
+        translated = mysql_statement(statement,definitions)
+        if translated is None:
+            continue
+        table, mysql_stmt = translated
+        ref_table = re.search(r'REFERENCES `(\w+)`',mysql_stmt)
+        if tables is None or (table in tables and (ref_table is None or ref_table.group(1) in tables)):
+            statements.setdefault(table,[]).append(mysql_stmt)
+    return statements
+
+
+def split_foreign_keys(statements):
+    """({table:[statements]} without foreign keys, {table:[foreign keys]}) - foreign keys need the primary
+    key of the table they reference, so they are added last"""
+    keys, foreign_keys = {}, {}
+    for table,table_statements in statements.items():
+        for statement in table_statements:
+            target = foreign_keys if 'FOREIGN KEY' in statement else keys
+            target.setdefault(table,[]).append(statement)
+    return keys, foreign_keys
+
+
+################################################################################################################
+## 2 - Streaming Parse & Partitioning
+################################################################################################################
+
+def dump_url(table):
+    return cfg.DBSNP_DUMP_URL.format(table=table)
+
+
+def dump_file_path(table):
+    return os.path.join(cfg.DBSNP_DIR,f'{table}.bcp.gz')
+
+
+def iter_dump_chunks(file_path,columns,chunk_rows=None):
+    """Rows of a (gzipped) dump file, DBSNP_CHUNK_ROWS at a time - fields are kept as published text ('' is
+    NULL)"""
+    return pd.read_csv(file_path,
+                       sep='\t',
+                       header=None,
+                       names=columns,
+                       dtype=str,
+                       quoting=csv.QUOTE_NONE,
+                       keep_default_na=False,
+                       chunksize=chunk_rows or cfg.DBSNP_CHUNK_ROWS)
+
+
+def partition_column(columns):
+    """The chromosome column of a table, or None"""
+    return next((column for column in columns if column.lower() in CHR_COLUMNS),None)
+
+
+def partition_keys(chunk,chr_column,n_buckets):
+    """Partition of each row - its chromosome, or a hash bucket of its first column"""
+    if chr_column is not None:
+        return chunk[chr_column].replace('','unknown').to_numpy()
+    return pd.util.hash_array(chunk.iloc[:,0].to_numpy()) % n_buckets
+
+
+def partition_dump(table,file_path,columns,partition_dir,n_buckets=None,chunk_rows=None):
+    """Streams a dump file into one tab-separated file per partition - returns ({partition:file_path}, number
+    of rows)"""
+    n_buckets = n_buckets or cfg.DBSNP_PARTITIONS
+    table_dir = Path(partition_dir) / table
+    shutil.rmtree(table_dir,ignore_errors=True)
+    table_dir.mkdir(parents=True)
+
+    chr_column = partition_column(columns)
+    partitions, n_rows = {}, 0
+    for chunk in iter_dump_chunks(file_path,columns,chunk_rows):
+        n_rows += len(chunk)
+        for key,rows in chunk.groupby(partition_keys(chunk,chr_column,n_buckets),sort=False):
+            key = re.sub(r'\W','_',str(key))
+            partitions[key] = str(table_dir / f'{key}.tsv')
+            with open(partitions[key],'a') as f:
+                rows.to_csv(f,sep='\t',header=False,index=False,quoting=csv.QUOTE_NONE,escapechar='\\')
+
+    return partitions, n_rows
+
+
+################################################################################################################
+## 3 - Parallel Load
+################################################################################################################
+
+def load_data_statement(table,file_path,columns):
+    """LOAD DATA statement of a partition file - empty fields are loaded as NULL"""
+    variables = ','.join(f'@v{i}' for i in range(len(columns)))
+    assignments = ','.join(f"`{column}`=NULLIF(@v{i},'')" for i,column in enumerate(columns))
+    return (f"LOAD DATA LOCAL INFILE '{os.path.abspath(file_path)}' INTO TABLE `{table}` "
+            f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({variables}) "
+            f"SET {assignments}")
+
+
+def run_parallel(mysqlpipe,statement_lists,workers):
+    """Runs each list of statements (in order) on its own connection, <workers> lists at a time"""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in executor.map(mysqlpipe.execute_statements,statement_lists):
+            pass
+
+
+def download_dumps(tables):
+    """Downloads the dump files of all <tables> concurrently - returns {table:file_path}"""
+    file_dict = {table:dump_file_path(table) for table in tables}
+    hgdhttp.get_pool().fetch_all({table:dump_url(table) for table in tables},file_dict,
+                                 cache_ttl=hgdcache.source_ttl('ncbi'))
+    return file_dict
+
+
+def bulk_load(mysqlpipe,tables=None,file_dict=None,workers=None):
+    """Loads dbSNP dumps of <tables> (default every table of the schema) into MySQL: creates the tables,
+    loads chromosome/hash partitions in parallel, then builds indexes & constraints. Dump files are
+    downloaded unless given in <file_dict> ({table:file_path}). Returns {table:number of rows loaded}."""
+    workers = workers or cfg.DBSNP_LOAD_WORKERS
+    definitions = table_definitions()
+    tables = tables or list(definitions.keys())
+    file_dict = file_dict or download_dumps(tables)
+
+    mysqlpipe.execute_statements([create_table_statement(table,definitions[table]) for table in tables])
+
+    load_statements, n_rows = [], {}
+    partition_dir = os.path.join(cfg.DBSNP_DIR,'partitions')
+    for table in tables:
+        columns = [column for column,_,_ in definitions[table]]
+        partitions, n_rows[table] = partition_dump(table,file_dict[table],columns,partition_dir)
+        load_statements += [[load_data_statement(table,path,columns)] for path in partitions.values()]
+    run_parallel(mysqlpipe,load_statements,workers)
+
+    # Keys are built once, over the loaded rows - indexes, then primary keys & defaults, then foreign keys
+    keys, foreign_keys = split_foreign_keys(post_load_statements('constraint',definitions,tables))
+    for statements in [post_load_statements('index',definitions,tables),keys,foreign_keys]:
+        run_parallel(mysqlpipe,list(statements.values()),workers)
+
+    shutil.rmtree(partition_dir,ignore_errors=True)
+    return n_rows
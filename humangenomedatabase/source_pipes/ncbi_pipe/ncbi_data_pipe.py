@@ -1,5 +1,6 @@
 import humangenomedatabase.source_pipes.ncbi_pipe.ncbi_utils as ncbi
 import humangenomedatabase.utils.hgd_utils as hgd
+import humangenomedatabase.utils.hgd_profiling as hgdprof
 from humangenomedatabase.utils.hgd_logging import log
 
 
@@ -10,19 +11,49 @@ class ncbiDataPipe:
         self.db_table_dict = ncbi.db_table_dict
         self.valid_dbs = list(self.db_table_dict.keys())
 
+        # Profiling mode: wrap extract & processing functions (nothing is wrapped when off)
+        if self.config.PROFILE:
+            self.db_table_dict = hgdprof.profile_table_dict(self.db_table_dict,source="ncbi")
+            self.extract_one = hgdprof.profile_extract(self.extract_one,source="ncbi")
+
     
     @log
     def extract_one(self,db_table):
         hgd.validate_db_type(db_table,self.valid_dbs)
 
         if db_table in ['gene_summary','snp_summary']:
+            # Checkpointed pull - resumes a failed one. The raw data is the shard manifest (read lazily by the
+            # processing functions), in & out of memory mode alike
             db_search_term = self.db_table_dict[db_table]['search_term']
-            ncbi_db = db_table.replace('_summary','')
-            webenv,querykey,count = ncbi.get_accession_ids(db_table=ncbi_db,search_term=db_search_term)
-            raw_df = ncbi.batch_fetch_summary_data(db_table=ncbi_db,webenv=webenv,querykey=querykey,record_count=count)
+            manifest_path = ncbi.extract_summary_data(db_table,db_search_term)
+            return {db_table:manifest_path}
         else:
-            raw_df = ncbi.ftp_script_download(db_table)
+            raw_df = ncbi.ftp_download(db_table)
+
+        return self.format_raw(db_table,raw_df)
+
+
+    @log
+    def extract_all(self,db_tables=None):
+        """Extracts all (or the given) NCBI tables - FTP files are downloaded concurrently,
+        Entrez summaries are pulled one after another. Returns {db_table:raw_df or filepath}"""
+        db_tables = db_tables or self.valid_dbs
+        for db_table in db_tables:
+            hgd.validate_db_type(db_table,self.valid_dbs)
+
+        ftp_tables = [t for t in db_tables if 'url' in self.db_table_dict[t]]
+        raw_data_dict = {}
+        for db_table,raw_df in ncbi.ftp_download_all(ftp_tables).items():
+            raw_data_dict.update(self.format_raw(db_table,raw_df))
+
+        for db_table in db_tables:
+            if db_table not in ftp_tables:
+                raw_data_dict.update(self.extract_one(db_table))
+
+        return raw_data_dict
+
 
+    def format_raw(self,db_table,raw_df):
         raw_df.columns = [c.upper() for c in raw_df.columns]
 
         if self.config.IN_MEM:
@@ -1,12 +1,29 @@
+import io
 import os
+import re
+import gzip
+import time
+import json
+import xml.etree.ElementTree as ET
 import pandas as pd
 import numpy as np
-import ast
 
 from Bio import Entrez
 
+import humangenomedatabase.utils.hgd_http as hgdhttp
+import humangenomedatabase.utils.hgd_cache as hgdcache
+import humangenomedatabase.utils.hgd_ids as hgdids
+import humangenomedatabase.utils.hgd_shards as hgdshards
+import humangenomedatabase.utils.hgd_entrez as hgdentrez
+import humangenomedatabase.utils.hgd_schema as hgdschema
+import humangenomedatabase.utils.hgd_normalize as hgdnorm
+import humangenomedatabase.utils.hgd_split as hgdsplit
+from humangenomedatabase.configs import auto_config as cfg
+
 Entrez.email = os.getenv("ENTREZ_EMAIL")
 Entrez.api_key = os.getenv("ENTREZ_API_KEY")
+# Failed requests are retried by the Entrez pool (utils/hgd_entrez.py), with jittered backoff
+Entrez.max_tries = 1
 
 ################################################################################################################
 ################################################################################################################
@@ -19,29 +36,115 @@ Entrez.api_key = os.getenv("ENTREZ_API_KEY")
 ################################################################################################################
 
 """
-blah blah blah
+The gene_info, gene_orthologs & gene2go files are pulled directly from the NCBI FTP site (over https) with the
+shared HTTP pool (utils/hgd_http.py), streamed to data/raw/ncbi/ncbi_human_<db_table>.gz. ftp_download_all
+pulls several files concurrently. Files go through the raw response cache (utils/hgd_cache.py), so a file
+is only transferred again when NCBI reports it changed.
+
+An interrupted download is resumed (HTTP Range) from the bytes already on disk - also by the next run - & large
+files (gene2go, gene_orthologs) are fetched in parallel segments. Each file is checked against the md5 NCBI
+publishes next to it (<file>.md5), where there is one.
+
+gene2go & gene_orthologs cover every species, so they are read in streaming mode (FTP_STREAM_INGEST): the file
+is decompressed block by block (FTP_CHUNK_BYTES) & only the header & human rows (tax_id 9606) of each block are
+kept, then parsed once. Memory scales with the human subset, not with the all-species file. Files are parsed
+with the table's raw schema (table_schemas, section 3): columns no processing function uses are never parsed &
+the rest are read straight into their dtypes.
 """
 
-def ftp_script_download(db_table):
-    cmd = f'humangenomedatabase/source_pipes/ncbi_pipe/scripts/pull_ncbi_ftp.sh {db_table}'
-    os.system(cmd)
+HUMAN_TAX_ID = 9606
+
+def md5_url(db_table):
+    return db_table_dict[db_table].get('md5_url')
+
+
+def ftp_file_path(db_table):
+    return f'data/raw/ncbi/ncbi_human_{db_table}.gz'
+
+
+def iter_human_lines(file_path,chunk_bytes=None):
+    """Decompresses a gzipped NCBI tab file block by block - yields its header line, then the human rows of
+    each block (as bytes)"""
+    chunk_bytes = chunk_bytes or cfg.FTP_CHUNK_BYTES
+    human_rows = re.compile(rb'^%d\t[^\n]*\n' % HUMAN_TAX_ID,re.M)
+
+    with gzip.open(file_path,'rb') as f:
+        yield f.readline()
+
+        rest = b''
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            # Whole lines only - a line cut by the block end is carried over to the next block
+            block = rest + block
+            cut = block.rfind(b'\n') + 1
+            block, rest = block[:cut], block[cut:]
+            yield b''.join(human_rows.findall(block))
+
+        if rest:
+            yield b''.join(human_rows.findall(rest + b'\n'))
+
 
-    df = pd.read_csv(f'data/raw/ncbi/ncbi_human_{db_table}.gz',sep='\t')
+def read_ftp_file(db_table):
+    """Human rows of a downloaded FTP file, read with the table's raw schema"""
+    file_path = ftp_file_path(db_table)
+    schema = table_schemas['raw'][db_table]
+
+    if not cfg.FTP_STREAM_INGEST:
+        return hgdschema.read_csv(file_path,schema,raw=True,sep='\t')
+
+    human_data = io.BytesIO()
+    for lines in iter_human_lines(file_path):
+        human_data.write(lines)
+    human_data.seek(0)
+
+    return hgdschema.read_csv(human_data,schema,raw=True,sep='\t')
+
+
+def ftp_download(db_table):
+    hgdhttp.get_pool().download(db_table_dict[db_table]['url'],ftp_file_path(db_table),
+                                cache_ttl=hgdcache.source_ttl('ncbi'),md5_url=md5_url(db_table))
+    df = read_ftp_file(db_table)
     
     return df
 
 
+def ftp_download_all(db_tables):
+    """Downloads FTP files for all <db_tables> concurrently - returns {db_table:raw_df}"""
+    url_dict = {db_table:db_table_dict[db_table]['url'] for db_table in db_tables}
+    file_dict = {db_table:ftp_file_path(db_table) for db_table in db_tables}
+    md5_dict = {db_table:md5_url(db_table) for db_table in db_tables if md5_url(db_table)}
+    hgdhttp.get_pool().fetch_all(url_dict,file_dict,cache_ttl=hgdcache.source_ttl('ncbi'),md5_dict=md5_dict)
+
+    return {db_table:read_ftp_file(db_table) for db_table in db_tables}
+
+
 ################################################################################################################
 ## 1.2 NCBI Entrez
 ################################################################################################################
 
 """
-blah blah blah
+Every Entrez request is opened & parsed through the shared Entrez pool (utils/hgd_entrez.py), which holds
+NCBI's rate limit (3 requests/s, 10/s with ENTREZ_API_KEY) across threads & processes & retries 429/5xx
+responses. Summary batches are fetched concurrently by the pool's workers.
 """
 
+def entrez_read(request_func,parse=Entrez.read,**params):
+    """Opens & parses one Entrez request (e.g. Entrez.esearch with its <params>), rate-limited & retried.
+    <parse> reads the response handle (default: Entrez.read)"""
+    def read():
+        handle = request_func(**params)
+        try:
+            return parse(handle)
+        finally:
+            handle.close()
+
+    return hgdentrez.get_entrez_pool().call(read)
+
+
 def get_db_fields(db_table="gene",verbose=False):
-    handle = Entrez.einfo(db=db_table)
-    record = Entrez.read(handle)
+    record = entrez_read(Entrez.einfo,db=db_table)
     data = list(record["DbInfo"]["FieldList"])
     data = pd.DataFrame(data)
 
@@ -54,9 +157,7 @@ def get_db_fields(db_table="gene",verbose=False):
 def get_accession_ids(db_table,search_term,retmax=None,usehistory='y'):
     """Use ESearch to get list of AccessionIds for search
     """
-    esearch_handle = Entrez.esearch(db=db_table,retmax=retmax,term=search_term,usehistory=usehistory,idtype="acc")
-    records = Entrez.read(esearch_handle)
-    esearch_handle.close()
+    records = entrez_read(Entrez.esearch,db=db_table,retmax=retmax,term=search_term,usehistory=usehistory,idtype="acc")
 
     if usehistory == 'y':
         return records['WebEnv'],records['QueryKey'],int(records["Count"])
@@ -64,51 +165,236 @@ def get_accession_ids(db_table,search_term,retmax=None,usehistory='y'):
         return records['IdList']
 
 
-def extract_record_uid(entrez_dictelement):
-    raw_data = entrez_dictelement
-    record = dict(raw_data.items())
-    uid = raw_data.attributes
-    record.update(uid)
-    return record
+"""
+ESummary responses (DocSum 2.0) are parsed straight into flat column arrays, one record at a time - XML with
+iterparse (each DocumentSummary is dropped once read), JSON (retmode='json') from its result dict - so no
+nested Biopython objects or per-record dicts are built. Nested fields are flattened while parsing:
+
+    Organism (struct)              -> Organism_ScientificName, Organism_TaxID, ...
+    GenomicInfo (list of structs)  -> GenomicInfo_ChrStart, GenomicInfo_ChrStop, ... (first placement only)
+    GENES, LocationHist, ...       -> GENES_GENE_ID, GENES_NAME, ... (item values joined with ',')
+    Mim (list of values)           -> Mim (values joined with ',')
+    DOCSUM ('HGVS=..|SEQ=..|..')   -> DOCSUM_HGVS, DOCSUM_SEQ, DOCSUM_LEN, ...
+
+All values are kept as strings (as in the XML), & a field missing from a record is NaN.
+"""
+
+# List fields of which only the first item is kept (a gene's primary placement - later ones are alternate loci)
+FIRST_ITEM_FIELDS = {'GENOMICINFO'}
+# Item tags of lists of plain values (e.g. <Mim><int>..</int></Mim>)
+VALUE_ITEM_TAGS = {'int','string'}
+LIST_SEP = ','
+# Layout of parsed summaries - stored with checkpointed pulls, so shards of an older layout are not resumed
+SUMMARY_FORMAT = 'flat-columns'
+
+
+class summaryColumns:
+    """Column arrays of parsed summaries - filled one record (row) at a time"""
+    def __init__(self):
+        self.columns = {}
+        self.n_rows = 0
+
+
+    def set(self,column,value):
+        values = self.columns.get(column)
+        if values is None:
+            values = self.columns[column] = [np.NaN] * self.n_rows
+        values.append(value)
+
+
+    def end_row(self):
+        self.n_rows += 1
+        for values in self.columns.values():
+            if len(values) < self.n_rows:
+                values.append(np.NaN)
+
+
+def flatten_docsum(row,field,docsum):
+    # 'HGVS=...|SEQ=[G/A]|LEN=1|GENE=...' - values are read as doc_sum_to_dict did (text up to a second '=')
+    for item in docsum.split('|') if docsum else []:
+        key_value = item.split('=')
+        if len(key_value) > 1:
+            row.set(f"{field}_{key_value[0]}",key_value[1])
+
+
+def flatten_items(row,field,items):
+    """Flattens a list of structs - {field}_{key} columns of item values joined with LIST_SEP"""
+    if field.upper() in FIRST_ITEM_FIELDS:
+        items = items[:1]
+
+    values = {}
+    for item in items:
+        for key,value in item:
+            values.setdefault(key,[]).append(value)
+    for key,key_values in values.items():
+        row.set(f"{field}_{key}",LIST_SEP.join(key_values))
+
+
+def text(elem):
+    # Empty elements (incl. empty lists, which hold only whitespace) are ''
+    value = elem.text or ''
+    return '' if value.isspace() else value
+
+
+def flatten_summary_xml(row,doc_summary):
+    row.set('uid',doc_summary.get('uid'))
+    for field in doc_summary:
+        items = list(field)
+        if not items:
+            if field.tag.upper() == 'DOCSUM':
+                flatten_docsum(row,field.tag,field.text)
+            else:
+                row.set(field.tag,text(field))
+        elif len(items[0]):
+            flatten_items(row,field.tag,[[(f.tag,text(f)) for f in item] for item in items])
+        elif items[0].tag in VALUE_ITEM_TAGS:
+            row.set(field.tag,LIST_SEP.join(text(item) for item in items))
+        else:
+            for sub_field in items:
+                row.set(f"{field.tag}_{sub_field.tag}",text(sub_field))
+    row.end_row()
+
+
+def parse_esummary_xml(handle):
+    """Streams an ESummary XML response into flat column arrays - returns {column:values}"""
+    row = summaryColumns()
+    parent = None
+    for event,elem in ET.iterparse(handle,events=('start','end')):
+        if event == 'start':
+            if elem.tag == 'DocumentSummarySet':
+                parent = elem
+            continue
+
+        if elem.tag == 'DocumentSummary':
+            # Records NCBI could not return hold only an <error>
+            if elem.find('error') is None:
+                flatten_summary_xml(row,elem)
+            if parent is not None:
+                parent.remove(elem)
+        elif elem.tag == 'ERROR':
+            raise RuntimeError(text(elem))
+
+    return row.columns
+
+
+def json_text(value):
+    return '' if value is None else str(value)
+
+
+def flatten_summary_json(row,record):
+    for field,value in record.items():
+        if isinstance(value,dict):
+            for sub_field,sub_value in value.items():
+                row.set(f"{field}_{sub_field}",json_text(sub_value))
+        elif isinstance(value,list):
+            if value and isinstance(value[0],dict):
+                flatten_items(row,field,[[(k,json_text(v)) for k,v in item.items()] for item in value])
+            else:
+                row.set(field,LIST_SEP.join(json_text(v) for v in value))
+        elif field.upper() == 'DOCSUM':
+            flatten_docsum(row,field,value)
+        else:
+            row.set(field,json_text(value))
+    row.end_row()
+
+
+def parse_esummary_json(handle):
+    """Reads an ESummary JSON response (retmode='json') into flat column arrays - returns {column:values}"""
+    response = json.load(handle)
+    if 'error' in response:
+        raise RuntimeError(response['error'])
+
+    result = response.get('result',{})
+    row = summaryColumns()
+    for uid in result.get('uids',[]):
+        record = result[uid]
+        if 'error' not in record:
+            flatten_summary_json(row,record)
+
+    return row.columns
 
 
 def fetch_data(db_table,webenv,querykey,
                batch_size=10,retstart=0,rettype=None,retmode="xml"):
-    """Fetch Entrez Gene records using Bio.Entrez, in particular epost
-    (to submit the data to NCBI) and efetch to retrieve the
-    information, then use Entrez.read to parse the data.
+    """Fetch Entrez summary records (ESummary) for a search on the
+    history server (<webenv>, <querykey>), starting at <retstart>.
+    The response (<retmode> 'xml' or 'json') is parsed into flat
+    columns as it is read.
 
-    Returns a list of parsed gene records.
+    Returns a DataFrame of the batch's records.
     """
+    parse = parse_esummary_json if retmode == 'json' else parse_esummary_xml
+    columns = entrez_read(Entrez.esummary,parse=parse,db=db_table,
+                          webenv=webenv,
+                          retstart=retstart,
+                          retmax=batch_size,
+                          query_key=querykey,
+                          rettype=rettype,
+                          retmode=retmode)
 
-    efetch_result = Entrez.esummary(db=db_table,
-                                    webenv=webenv,
-                                    retstart=retstart,
-                                    retmax=batch_size,
-                                    query_key=querykey,
-                                    rettype=rettype,
-                                    retmode=retmode)
-    records = Entrez.read(efetch_result)
-    efetch_result.close()
+    return pd.DataFrame(columns)
 
-    raw_records = records['DocumentSummarySet']['DocumentSummary']
-    final_data = [extract_record_uid(d) for d in raw_records]
-    records = pd.DataFrame(final_data)
 
-    return records
+def batch_fetch_summary_data(db_table,webenv,querykey,record_count,batch_size=5000,shards=None):
+    """Fetches <record_count> summaries in batches of <batch_size>, concurrently on the Entrez pool, & joins
+    them once (in order). With a shard store (<shards>), each batch is saved as a shard as soon as it arrives
+    & already-completed batches are skipped - the store is returned instead of a DataFrame"""
+    def fetch_batch(start):
+        return fetch_data(db_table,webenv,querykey,retstart=start,batch_size=batch_size)
 
+    pool = hgdentrez.get_entrez_pool()
+    if shards is not None:
+        pool.run_all(fetch_batch,[(start,) for start in shards.missing_offsets()],
+                     on_result=lambda args,fetched_data: shards.write_shard(args[0],fetched_data))
+        return shards
 
-def batch_fetch_summary_data(db_table,webenv,querykey,record_count,batch_size=5000):
-    final_data = pd.DataFrame()
-    for start in range(0, record_count, batch_size):
+    batches = pool.run_all(fetch_batch,[(start,) for start in range(0,record_count,batch_size)])
+    if not batches:
+        return pd.DataFrame()
+    return pd.concat(batches,ignore_index=True)
 
-        end = min(record_count, start + batch_size)
-        fetched_data = fetch_data(db_table,webenv,querykey,retstart=start,batch_size=batch_size)
-        final_data = pd.concat([final_data,fetched_data],ignore_index=True)
-    
-    return final_data
 
+"""
+Summary pulls (gene_summary, snp_summary) are checkpointed: every batch is written as a shard under
+SHARD_DIR/<db_table>/ with a manifest of the search (WebEnv, QueryKey, count, batch size) & completed offsets
+(see utils/hgd_shards.py). If a pull fails, the next extract re-uses the manifest & only fetches the missing
+batches. NCBI keeps search results on its history server for a limited time, so a manifest older than
+ENTREZ_HISTORY_TTL starts the pull over on a new search - shards are keyed by offset, & a new WebEnv doesn't
+promise the same result order, so the old shards could hold some records twice & miss others.
+
+Batches go straight to their shard files & aren't kept, & the transforms read the shards back one at a time
+(utils/hgd_split.py) - a pull is never held in memory whole.
+"""
+
+def extract_summary_data(db_table,search_term,batch_size=None,resume=True):
+    """Checkpointed ESummary pull of <db_table> ('gene_summary' or 'snp_summary') - returns the path of
+    the shard manifest"""
+    ncbi_db = db_table.replace('_summary','')
+    batch_size = batch_size or cfg.ENTREZ_BATCH_SIZE
+    shards = hgdshards.shardStore(db_table)
+    manifest = shards.manifest
+
+    resumable = (resume and manifest is not None and not shards.complete
+                 and manifest['batch_size'] == batch_size
+                 and manifest['params'].get('search_term') == search_term
+                 and manifest['params'].get('format') == SUMMARY_FORMAT)
+
+    if resumable and time.time() - manifest['params']['searched_at'] > cfg.ENTREZ_HISTORY_TTL:
+        print(f"{db_table} search expired on the NCBI history server, restarting extract")
+        resumable = False
+
+    if resumable:
+        print(f"Resuming {db_table} extract: {len(shards.missing_offsets())} of {len(shards.offsets())} batches left")
+    else:
+        webenv,querykey,count = get_accession_ids(db_table=ncbi_db,search_term=search_term)
+        shards.start(count,batch_size,search_term=search_term,webenv=webenv,querykey=querykey,
+                     searched_at=time.time(),format=SUMMARY_FORMAT)
 
+    params = shards.manifest['params']
+    batch_fetch_summary_data(ncbi_db,params['webenv'],params['querykey'],shards.manifest['count'],
+                             batch_size=batch_size,shards=shards)
+
+    return str(shards.manifest_path)
 
 
 ################################################################################################################
@@ -130,10 +416,9 @@ the compressed format into pandas dataframes for processing.
 
 # 2.1.0 General Gene-Related ###################################################################################
 def process_ftp_gene(db_table,gene_df,mod_cols={}):
-    gene_df.columns = [c.upper() for c in gene_df.columns]
-
     if gene_df.empty:
-        gene_df = pd.read_csv(f"data/raw/tmp/{db_table}.gz",sep="\t")
+        gene_df = hgdschema.read_csv(f"data/raw/tmp/{db_table}.gz",table_schemas['raw'].get(db_table),raw=True,sep="\t")
+    gene_df.columns = [c.upper() for c in gene_df.columns]
     
     if db_table in ['snp','gene']:
         new_col_names = {'NAME':'TAX_ID','UID':'GENE_ID'}
@@ -145,7 +430,8 @@ def process_ftp_gene(db_table,gene_df,mod_cols={}):
 
         gene_df = gene_df.rename(columns=new_col_names)
 
-        gene_df['GENE_ID'] = 'G'+gene_df['GENE_ID'].astype(str)
+        # Integer gene ID (decoded to "G<id>" on load - see utils/hgd_ids.py)
+        gene_df['GENE_ID'] = hgdids.encode_ids(gene_df['GENE_ID'])
 
         # Cut down to human - homo sapien - only
         gene_df = gene_df[gene_df['TAX_ID']==9606].reset_index(drop=True)
@@ -156,34 +442,6 @@ def process_ftp_gene(db_table,gene_df,mod_cols={}):
 
 
 # 2.1.1 Gene Info ##############################################################################################
-def split_bar_lists(gi_row):
-    return gi_row.split('|')
-
-def normalize_column(df,columns,explode_column):
-    df_explode = df.copy(deep=True)
-    df_explode = df_explode[columns]
-    df_explode = df_explode.explode(explode_column)
-
-    df_explode = df_explode[df_explode[explode_column]!='NaN'].reset_index(drop=True)
-
-    if explode_column == 'SYNONYMS':
-        df_explode = df_explode.rename(columns={'SYNONYMS':"GENE_SYMBOL"})
-
-    elif explode_column == 'DBXREFS':
-        df_explode['REF_ID'] = df_explode['DBXREFS'].apply(lambda x: x.split(':')[-1])
-        df_explode['REF'] = df_explode['DBXREFS'].apply(lambda x: x.split(':')[0].replace(':','_'))
-        df_explode = df_explode.drop(columns=[explode_column])
-
-    elif explode_column == 'FEATURE_TYPE':
-        df_explode['FEATURE_CAT'] = df_explode['FEATURE_TYPE'].apply(lambda x: x.split(':')[0])
-        df_explode['FEATURE'] = df_explode['FEATURE_TYPE'].apply(lambda x: x.split(':')[1])
-        df_explode = df_explode.drop(columns=["FEATURE_TYPE"])
-
-    df_explode['LOOKUP_SOURCE'] = 'gene_info'
-
-    return df_explode 
-
-
 def process_ml_chr(gi_row):
     if gi_row in ['-','Un']:
         return 'Unknown'
@@ -207,16 +465,17 @@ def std_gene_type(gi_row):
 def process_gene_info(gene_df=pd.DataFrame()):
     mod_cols = {'FULL_NAME_FROM_NOMENCLATURE_AUTHORITY':'NAME','TYPE_OF_GENE':'GENE_TYPE'}
     df = process_ftp_gene("gene_info",gene_df,mod_cols=mod_cols)
-    df = df.drop(columns=['LOCUSTAG','MODIFICATION_DATE'])
-
-    explode_dict = {}
-    exp_cols = ['SYNONYMS','DBXREFS','OTHER_DESIGNATIONS','FEATURE_TYPE']
-    for column in exp_cols:
-        df[column] = df[column].replace('-','NaN')
-        df[column] = df[column].apply(lambda x: split_bar_lists(x))
-        exp_cols = ['GENE_ID',column]
-        explode_dict[column] = normalize_column(df,exp_cols,column)
-    
+    # Already pruned when read in streaming mode
+    df = df.drop(columns=['LOCUSTAG','MODIFICATION_DATE'],errors='ignore')
+
+    # '|'-separated lists ('-' when empty) into lookup tables - DBXREFS items are '<db>:<id>' & FEATURE_TYPE
+    # items '<category>:<feature>'
+    exp_params = {'SYNONYMS':{'name':'GENE_SYMBOL'},
+                  'DBXREFS':{'fields':{'REF_ID':-1,'REF':0}},
+                  'OTHER_DESIGNATIONS':{},
+                  'FEATURE_TYPE':{'fields':{'FEATURE_CAT':0,'FEATURE':1}}}
+    explode_dict = {column:hgdnorm.normalize_column(df,'GENE_ID',column,'|',missing=('-',),source='gene_info',**params)
+                    for column,params in exp_params.items()}
 
     df = df.drop(columns=['SYNONYMS','DBXREFS','OTHER_DESIGNATIONS','FEATURE_TYPE'])
 
@@ -247,7 +506,7 @@ def process_gene_info(gene_df=pd.DataFrame()):
 def process_gene_orthologs(gene_df=pd.DataFrame()):
     mod_cols = {'OTHER_GENEID':'OTHER_GENE_ID'}
     df = process_ftp_gene("gene_orthologs",gene_df,mod_cols)
-    df = df.drop(columns=['RELATIONSHIP'])
+    df = df.drop(columns=['RELATIONSHIP'],errors='ignore')
 
     return {'gene_orthologs':df}
 
@@ -257,8 +516,8 @@ def process_gene2go(gene_df=pd.DataFrame()):
     mod_cols = {'PUBMED':'PUBMED_ID'}
     df = process_ftp_gene("gene2go",gene_df,mod_cols)
     #df['PUBMED_ID'] = np.where(df['PUBMED_ID']=='-',np.NaN,df['PUBMED_ID'])
-    df = df.drop(columns=['PUBMED_ID'])
-    df['GO_ID'] = df['GO_ID'].apply(lambda x: x.replace(':',''))
+    df = df.drop(columns=['PUBMED_ID'],errors='ignore')
+    df['GO_ID'] = df['GO_ID'].str.replace(':','',regex=False)
 
     return {'gene2go':df}
 
@@ -277,18 +536,19 @@ The functions below are used on data is that is extracted from NCBI through the
 REST api service for querying & extracting all data hosted on the NCBI database servers.
 """
 
-# 2.2.1 Gene Summaries #########################################################################################
-def access_org_tax(gene_row):
-    return gene_row['TaxID']
-
-def access_chrom_attr(gene_row,attr='ChrStop'):
-    try:
-        val = gene_row[0][attr]
-    except:
-        val = np.NaN
-    
-    return val
+# 2.2.0 Nested Fields ##########################################################################################
+def nested_columns(df,field,attributes):
+    """<attributes> of a nested field (GenomicInfo, Organism, DocSum, ...) as columns, all at once - nested
+    fields are flattened to <field>_<attribute> columns while parsing. Attributes no record has are missing."""
+    return df.reindex(columns=[f'{field}_{attr}' for attr in attributes]).set_axis(attributes,axis=1)
+
+
+def map_distinct(col,func):
+    """func applied once per distinct value of <col> (e.g. chromosomes), rather than once per row"""
+    return col.map({value:func(value) for value in col.unique()})
+
 
+# 2.2.1 Gene Summaries #########################################################################################
 def process_chr(gene_row):
     if gene_row == '':
         return 'Unknown'
@@ -303,15 +563,23 @@ def process_chr(gene_row):
     
 
 def process_gene_summary(df):
+    if hgdshards.is_manifest(df):
+        # A checkpointed pull is processed a shard at a time (every row on its own), then genes are sorted once
+        proc_data = hgdsplit.serial_transform(process_gene_summary,df)
+        proc_data['gene_summary'] = proc_data['gene_summary'].sort_values(by=['GENE_ID']).reset_index(drop=True)
+        return proc_data
+
     df = df.rename(columns={'UID':'GENE_ID','MIM':'MIM_ID',
                             'NOMENCLATURENAME':'GENE_NAME',
                             'NAME':'GENE_SYMB_ALT',
                             'GENEWEIGHT':'GENE_WEIGHT',
                             'MAPLOCATION':'MAP_LOCATION'})
-    df['GENE_ID'] = 'G'+df['GENE_ID'].astype(str)
+    df['GENE_ID'] = hgdids.encode_ids(df['GENE_ID'])
 
-    for gi_attr in ['CHRSTART', 'CHRSTOP', 'EXONCOUNT', 'CHRACCVER']:
-        df[gi_attr] = df['GENOMICINFO'].apply(lambda x: access_chrom_attr(x,gi_attr))
+    # Gene placement (first GenomicInfo item)
+    placement = nested_columns(df,'GENOMICINFO',['CHRSTART','CHRSTOP','EXONCOUNT'])
+    for gi_attr in placement.columns:
+        df[gi_attr] = pd.to_numeric(placement[gi_attr]).astype('Int64')
     
     df['GENE_SYMBOL'] = np.where(df['NOMENCLATURESYMBOL']!='',df['NOMENCLATURESYMBOL'],'')
     df['NOMENCLATURESTATUS'] = np.where(df['NOMENCLATURESTATUS']=='Official',1,0)
@@ -321,23 +589,19 @@ def process_gene_summary(df):
     df['MAP_LOCATION'] = df['MAP_LOCATION'].replace('',np.NaN)
     df['CHRSTOP'] = df['CHRSTOP'].fillna(0)
     df['CHRSTART'] = df['CHRSTART'].fillna(0)
-    df['CHRSTART'] = np.where(df['CHRSTART']==999999999,0,df['CHRSTART'])
-    df['CHROMOSOME'] = df['CHROMOSOME'].apply(lambda x: process_chr(str(x)))
+    df['CHRSTART'] = df['CHRSTART'].mask(df['CHRSTART']==999999999,0)
+    df['CHROMOSOME'] = map_distinct(df['CHROMOSOME'].astype(str),process_chr)
 
 
     ## Normalize Gene Symbol Aliases
-    gene_summary_symbols = df[['GENE_ID','OTHERALIASES']]
-    gene_summary_symbols = gene_summary_symbols[gene_summary_symbols['OTHERALIASES']!='']
-    gene_summary_symbols = gene_summary_symbols[gene_summary_symbols['OTHERALIASES'].notnull()].reset_index(drop=True)
-    gene_summary_symbols['OTHERALIASES'] = gene_summary_symbols['OTHERALIASES'].apply(lambda x: x.split(', '))
-    gene_summary_symbols = gene_summary_symbols.explode("OTHERALIASES")
-    gene_summary_symbols = gene_summary_symbols.rename(columns={'OTHERALIASES':'GENE_SYMBOL'})
+    gene_summary_symbols = hgdnorm.normalize_column(df,'GENE_ID','OTHERALIASES',', ',name='GENE_SYMBOL',missing=('',))
 
     gene_symb_alt = df[['GENE_ID','GENE_SYMBOL','GENE_SYMB_ALT']]
     gene_symb_alt = gene_symb_alt[gene_symb_alt['GENE_SYMBOL'].notnull()]
-    gene_symb_alt['GENE_SYMBOL2'] = gene_symb_alt['GENE_SYMBOL'].apply(lambda x: x.replace('MT-',''))
-    gene_symb_alt = gene_symb_alt[gene_symb_alt['GENE_SYMB_ALT']!=gene_symb_alt['GENE_SYMBOL2']].reset_index(drop=True)
-    gene_symb_alt = gene_symb_alt.drop(columns=['GENE_SYMBOL','GENE_SYMBOL2'])
+    # Alternate name, unless it's the symbol without its 'MT-' (mitochondrial) prefix
+    symbols = gene_symb_alt['GENE_SYMBOL'].str.replace('MT-','',regex=False)
+    gene_symb_alt = gene_symb_alt[gene_symb_alt['GENE_SYMB_ALT'] != symbols]
+    gene_symb_alt = gene_symb_alt.reset_index(drop=True).drop(columns=['GENE_SYMBOL'])
     gene_symb_alt = gene_symb_alt.rename(columns={'GENE_SYMB_ALT':'GENE_SYMBOL'})
 
     gene_summary_symbols = pd.concat([gene_summary_symbols,gene_symb_alt],ignore_index=True)
@@ -346,14 +610,14 @@ def process_gene_summary(df):
     df['GENE_SYMBOL'] = df['GENE_SYMBOL'].replace('',np.NaN)
 
     # Normalize Gene-Mim ID Links
-    gene_summary_omim = gene_summary_omim.rename(columns={'MIM_ID':'OMIM_ID'})
-    gene_summary_omim = gene_summary_omim.explode("OMIM_ID")
-    gene_summary_omim = gene_summary_omim[gene_summary_omim['OMIM_ID'].notnull()].reset_index(drop=True)
-    gene_summary_omim['LOOKUP_SOURCE'] = 'gene_summary'
+    gene_summary_omim = hgdnorm.normalize_column(df,'GENE_ID','MIM_ID',LIST_SEP,name='OMIM_ID',drop_empty=True,
+                                                 source='gene_summary')
 
-    df = df.drop(columns=['LOCATIONHIST','ORGANISM','CHRSORT','OTHERDESIGNATIONS','GENOMICINFO',\
-                        'OTHERALIASES','MIM_ID','CHRACCVER','STATUS','CURRENTID','NOMENCLATURESTATUS',
-                        'NOMENCLATURESYMBOL','GENE_SYMB_ALT','GENETICSOURCE'])
+    # Flattened nested fields (& empty ones, left unflattened) are dropped by prefix
+    nested_cols = [c for c in df.columns if c.split('_')[0] in ['LOCATIONHIST','ORGANISM','GENOMICINFO']]
+    df = df.drop(columns=['CHRSORT','OTHERDESIGNATIONS',\
+                        'OTHERALIASES','MIM_ID','STATUS','CURRENTID','NOMENCLATURESTATUS',
+                        'NOMENCLATURESYMBOL','GENE_SYMB_ALT','GENETICSOURCE'] + nested_cols)
 
     gene_data_cols = ['GENE_ID','GENE_SYMBOL'] + [c for c in df.columns if c not in ['GENE_ID','GENE_SYMBOL']]
     df = df[gene_data_cols]
@@ -370,74 +634,38 @@ def process_gene_summary(df):
 
 
 # 2.2.2 SNP Summaries ##########################################################################################
-def extract_snp_genes(snp_row):
-    snp_row = ast.literal_eval(snp_row)
-    return [d['GENE_ID'] for d in snp_row]
-
-def list_attribute(snp_row):
-    if pd.isnull(snp_row):
-        return np.NaN
-    else:
-        return snp_row.split(',')
-
-def normalize_snp_column(df,columns,explode_column):
-    df_explode = df.copy(deep=True)
-    df_explode = df_explode[columns]
-    df_explode = df_explode.explode(explode_column)
-
-    df_explode = df_explode[df_explode[explode_column]!='']
-    df_explode = df_explode[df_explode[explode_column].notnull()].reset_index(drop=True)
-    df_explode['LOOKUP_SOURCE'] = 'snp_summary'
-
-    return df_explode 
-
-def doc_sum_to_dict(snp_row):
-    d = {}
-    x = snp_row.split('|')
-
-    for i in x:
-        isplit = i.split('=')
-        d[isplit[0]] = isplit[1]
-
-    return d
-
-
 def process_snp_summary(df):
+    if hgdshards.is_manifest(df):
+        # A checkpointed pull is processed a shard at a time, when it isn't split across processes
+        return hgdsplit.serial_transform(process_snp_summary,df)
 
-    df = df.rename(columns={"GENES":"GENE_ID"})
 
-    df['SNP_ID'] = df['SNP_ID'].apply(lambda x: 'rs'+str(x))
-    
-    explode_dict = {}
-    for column in ['GENE_ID','FXN_CLASS','SS']:
-        if column == "GENE_ID":
-            df["GENE_ID"] = df["GENE_ID"].apply(lambda x: extract_snp_genes(x))
-        else:
-            df[column] = df[column].apply(lambda x: list_attribute(x))
+    # Gene IDs of the SNP, flattened from GENES while parsing
+    df = df.rename(columns={"GENES_GENE_ID":"GENE_ID"})
+    if 'GENE_ID' not in df.columns:
+        df['GENE_ID'] = np.NaN
 
-        exp_cols = ['SNP_ID',column]
-        explode_dict[column] = normalize_snp_column(df,exp_cols,column)
+    df['SNP_ID'] = hgdids.encode_ids(df['SNP_ID'])
+    
+    explode_dict = {column:hgdnorm.normalize_column(df,'SNP_ID',column,LIST_SEP,drop_empty=True,source='snp_summary')
+                    for column in ['GENE_ID','FXN_CLASS','SS']}
+    explode_dict['GENE_ID']['GENE_ID'] = hgdids.encode_ids(explode_dict['GENE_ID']['GENE_ID'])
 
 
-    df['DOCSUM'] = df['DOCSUM'].apply(lambda x: doc_sum_to_dict(x))
-    df['SEQ'] = df['DOCSUM'].apply(lambda x: x.get('SEQ'))
-    df['LEN'] = df['DOCSUM'].apply(lambda x: x.get('LEN'))
-    df['HGVS'] = df['DOCSUM'].apply(lambda x: x.get('HGVS'))
+    # DocSum fields
+    docsum = nested_columns(df,'DOCSUM',['SEQ','LEN','HGVS'])
+    df[docsum.columns] = docsum
 
     df['CLINICAL_SIGNIFICANCE'] = df['CLINICAL_SIGNIFICANCE'].replace('',np.NaN)
 
     drop_cols = ['GLOBAL_SAMPLESIZE','GLOBAL_POPULATION','SUSPECTED',\
                  'ALLELE_ORIGIN','ACC','GLOBAL_MAFS','GENE_LIST','n_genes',\
-                 'TAX_ID','CREATEDATE','UPDATEDATE','HANDLE','ORIG_BUILD','CHRPOS_PREV_ASSM','TEXT','uid']
+                 'TAX_ID','CREATEDATE','UPDATEDATE','HANDLE','ORIG_BUILD','CHRPOS_PREV_ASSM','TEXT','uid','UID']
     
     drop_cols = drop_cols + [c for c in df.columns if '_SORT' in c]
-    drop_cols += ['GENE_ID','FXN_CLASS','SS','DOCSUM']
-    
-    for col in drop_cols:
-        try:    
-            df.drop(columns=[col],inplace=True)
-        except:
-            pass
+    drop_cols += [c for c in df.columns if c.startswith(('GENES_','GLOBAL_MAFS_','DOCSUM_'))]
+    drop_cols += ['GENE_ID','GENES','FXN_CLASS','SS','DOCSUM']
+    df = df.drop(columns=drop_cols,errors='ignore')
 
 
     final_data = {'snp_summary':df,
@@ -454,16 +682,25 @@ def process_snp_summary(df):
 # 3 - NCBI DATA PARAMS
 ################################################################################################################
 ################################################################################################################
+# 'row_local': tables processed row by row - their transform can be split into row shards (utils/hgd_split.py)
 db_table_dict = {
     'gene_info':{
+        'url':'https://ftp.ncbi.nlm.nih.gov/gene/DATA/GENE_INFO/Mammalia/Homo_sapiens.gene_info.gz',
+        'md5_url':'https://ftp.ncbi.nlm.nih.gov/gene/DATA/GENE_INFO/Mammalia/Homo_sapiens.gene_info.gz.md5',
         'proc_func': process_gene_info,
+        'row_local': True,
         'schema_file':'sql/gene_info_schema.sql'
     },
     'gene_orthologs':{
+        'url':'https://ftp.ncbi.nlm.nih.gov/gene/DATA/gene_orthologs.gz',
+        'md5_url':'https://ftp.ncbi.nlm.nih.gov/gene/DATA/gene_orthologs.gz.md5',
         'proc_func': process_gene_orthologs
     },
     'gene2go':{
-        'proc_func': process_gene2go
+        'url':'https://ftp.ncbi.nlm.nih.gov/gene/DATA/gene2go.gz',
+        'md5_url':'https://ftp.ncbi.nlm.nih.gov/gene/DATA/gene2go.gz.md5',
+        'proc_func': process_gene2go,
+        'row_local': True
     },
     'gene_summary':{
         'proc_func': process_gene_summary,
@@ -471,10 +708,80 @@ db_table_dict = {
     },
     'snp_summary':{
         'proc_func': process_snp_summary,
+        'row_local': True,
         'search_term':'homo sapien[ORGN] AND common variant[Filter] AND snp gene[Filter]'
     }
     #'omim':{
     #    'proc_func': process_omim_summary,
     #    'search_term':'gene[ALL]'
     #}
-}
\ No newline at end of file
+}
+
+# Typed schemas of raw & processed tables (see utils/hgd_schema.py). Raw FTP files keep only the columns the
+# processing functions use
+table_schemas = {
+    'raw':{
+        'gene_info':{
+            'columns':['#TAX_ID','GENEID','SYMBOL','SYNONYMS','DBXREFS','CHROMOSOME','MAP_LOCATION','DESCRIPTION',
+                       'TYPE_OF_GENE','SYMBOL_FROM_NOMENCLATURE_AUTHORITY','FULL_NAME_FROM_NOMENCLATURE_AUTHORITY',
+                       'NOMENCLATURE_STATUS','OTHER_DESIGNATIONS','FEATURE_TYPE'],
+            'dtypes':{'#TAX_ID':'int64','GENEID':'int64','CHROMOSOME':'category','TYPE_OF_GENE':'category'}
+        },
+        'gene_orthologs':{
+            'columns':['#TAX_ID','GENEID','OTHER_TAX_ID','OTHER_GENEID'],
+            'dtypes':{'#TAX_ID':'int64','GENEID':'int64','OTHER_TAX_ID':'int64','OTHER_GENEID':'int64'}
+        },
+        'gene2go':{
+            'columns':['#TAX_ID','GENEID','GO_ID','EVIDENCE','QUALIFIER','GO_TERM','CATEGORY'],
+            'dtypes':{'#TAX_ID':'int64','GENEID':'int64','EVIDENCE':'category','CATEGORY':'category'}
+        }
+    },
+    'processed':{
+        'gene_info':{
+            'dtypes':{'GENE_ID':'int64','CHROMOSOME':'category','MAP_LOCATION':str,'DESCRIPTION':str,
+                      'GENE_TYPE':'category','GENE_SYMBOL':str,'GENE_NAME':str,'NOMENCLATURE_STATUS':'int64'}
+        },
+        'gene_info_symbol_lookup':{
+            'dtypes':{'GENE_ID':'int64','GENE_SYMBOL':str,'LOOKUP_SOURCE':'category'}
+        },
+        'gene_info_dbxref_lookup':{
+            'dtypes':{'GENE_ID':'int64','REF_ID':str,'REF':str,'LOOKUP_SOURCE':'category'}
+        },
+        'gene_info_otherdesig_lookup':{
+            'dtypes':{'GENE_ID':'int64','OTHER_DESIGNATIONS':str,'LOOKUP_SOURCE':'category'}
+        },
+        'gene_info_feature_lookup':{
+            'dtypes':{'GENE_ID':'int64','FEATURE_CAT':str,'FEATURE':str,'LOOKUP_SOURCE':'category'}
+        },
+        'gene_orthologs':{
+            'dtypes':{'GENE_ID':'int64','OTHER_TAX_ID':'int64','OTHER_GENE_ID':'int64'}
+        },
+        'gene2go':{
+            'dtypes':{'GENE_ID':'int64','GO_ID':str,'EVIDENCE':'category','QUALIFIER':str,'GO_TERM':str,
+                      'CATEGORY':'category'}
+        },
+        'gene_summary':{
+            'dtypes':{'GENE_ID':'int64','GENE_SYMBOL':str,'DESCRIPTION':str,'CHROMOSOME':'category',
+                      'MAP_LOCATION':str,'GENE_NAME':str,'SUMMARY':str,
+                      'CHRSTART':'Int64','CHRSTOP':'Int64','EXONCOUNT':'Int64'}
+        },
+        'gene_summary_symbol_lookup':{
+            'dtypes':{'GENE_ID':'int64','GENE_SYMBOL':str,'LOOKUP_SOURCE':'category'}
+        },
+        'gene_summary_omim_lookup':{
+            'dtypes':{'GENE_ID':'int64','OMIM_ID':str,'LOOKUP_SOURCE':'category'}
+        },
+        'snp_summary':{
+            'dtypes':{'SNP_ID':'int64','CLINICAL_SIGNIFICANCE':str,'SEQ':str,'HGVS':str}
+        },
+        'snp_summary_gene_lookup':{
+            'dtypes':{'SNP_ID':'int64','GENE_ID':'int64','LOOKUP_SOURCE':'category'}
+        },
+        'snp_summary_fxn_lookup':{
+            'dtypes':{'SNP_ID':'int64','FXN_CLASS':str,'LOOKUP_SOURCE':'category'}
+        },
+        'snp_summary_ss_lookup':{
+            'dtypes':{'SNP_ID':'int64','SS':str,'LOOKUP_SOURCE':'category'}
+        }
+    }
+}
@@ -0,0 +1,49 @@
+import humangenomedatabase.source_pipes.reactome_pipe.reactome_utils as reactome
+import humangenomedatabase.utils.hgd_utils as hgd
+import humangenomedatabase.utils.hgd_profiling as hgdprof
+from humangenomedatabase.utils.hgd_logging import log
+
+
+class reactomeDataPipe:
+    def __init__(self,config):
+        self.config = config
+        self.log_file_name = 'hgd_pipe_log'
+        self.db_table_dict = reactome.db_table_dict
+        self.valid_dbs = list(self.db_table_dict.keys())
+
+        # Profiling mode: wrap extract & processing functions (nothing is wrapped when off)
+        if self.config.PROFILE:
+            self.db_table_dict = hgdprof.profile_table_dict(self.db_table_dict,source="reactome")
+            self.extract_one = hgdprof.profile_extract(self.extract_one,source="reactome")
+
+
+    @log
+    def extract_one(self,db_table):
+        hgd.validate_db_type(db_table,self.valid_dbs)
+
+        # Human rows only, read from the downloaded (all-species) mapping file as a stream
+        raw_df = reactome.reactome_download(db_table)
+
+        return self.format_raw(db_table,raw_df)
+
+
+    @log
+    def extract_all(self,db_tables=None):
+        """Downloads all (or the given) Reactome mapping files concurrently - returns {db_table:raw_df or filepath}"""
+        db_tables = db_tables or self.valid_dbs
+        for db_table in db_tables:
+            hgd.validate_db_type(db_table,self.valid_dbs)
+
+        raw_data_dict = {}
+        for db_table,raw_df in reactome.reactome_download_all(db_tables).items():
+            raw_data_dict.update(self.format_raw(db_table,raw_df))
+
+        return raw_data_dict
+
+
+    def format_raw(self,db_table,raw_df):
+        if self.config.IN_MEM:
+            return {db_table:raw_df}
+        else:
+            fp = hgd.save_data(raw_df,db_table,source="reactome",table_type="raw")
+            return {db_table:fp}
@@ -0,0 +1,215 @@
+import io
+import csv
+import pandas as pd
+
+import humangenomedatabase.utils.hgd_http as hgdhttp
+import humangenomedatabase.utils.hgd_cache as hgdcache
+import humangenomedatabase.utils.hgd_ids as hgdids
+import humangenomedatabase.utils.hgd_schema as hgdschema
+from humangenomedatabase.configs import auto_config as cfg
+
+################################################################################################################
+################################################################################################################
+# 1 - REACTOME DATA EXTRACTION FUNCTIONS
+################################################################################################################
+################################################################################################################
+
+"""
+Reactome publishes its mappings as headerless, tab-separated files (https://reactome.org/download/current/),
+pulled with the shared HTTP pool (utils/hgd_http.py) to data/raw/reactome/<file name> - the same files as
+pull_reactome.sh. Files go through the raw response cache, so an unchanged file is not transferred again.
+
+The NCBI2Reactome files map NCBI gene IDs to the physical entities (PEs) & events - pathways or reactions - they
+take part in, for every species:
+
+    <gene id>  <PE id>  <PE name [compartment]>  <event id>  <url>  <event name>  <evidence>  <species>
+
+& Reactome2OMIM maps OMIM IDs to pathways, laid out the same way from the event id on. The species is the last
+field, so files are read as a stream (like the NCBI FTP files): a block of REACTOME_CHUNK_BYTES at a time,
+keeping only the 'Homo sapiens' rows of each block, then parsed once. Memory scales with the human subset, not
+with the all-species file (NCBI2Reactome_PE_All_Levels is hundreds of MB). Rows are parsed with the table's
+raw schema (table_schemas, section 3) - the URL & species fields are never parsed.
+"""
+
+HUMAN_SPECIES = b'Homo sapiens'
+
+def reactome_file_path(db_table):
+    return f"data/raw/reactome/{db_table_dict[db_table]['url'].split('/')[-1]}"
+
+
+def iter_species_lines(file_path,species=HUMAN_SPECIES,chunk_bytes=None):
+    """Reads a Reactome mapping file block by block - yields the rows (as bytes) of each block whose last field
+    is <species>"""
+    chunk_bytes = chunk_bytes or cfg.REACTOME_CHUNK_BYTES
+    species_field = b'\t' + species
+
+    def species_rows(block):
+        # A suffix test per line (the species is the last field) - several times faster than a line regex
+        return b''.join(line + b'\n' for line in block.split(b'\n') if line.endswith(species_field))
+
+    with open(file_path,'rb') as f:
+        rest = b''
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            # Whole lines only - a line cut by the block end is carried over to the next block
+            block = rest + block
+            cut = block.rfind(b'\n') + 1
+            block, rest = block[:cut], block[cut:]
+            yield species_rows(block)
+
+        if rest:
+            yield species_rows(rest)
+
+
+def read_mapping_file(db_table,file_path=None):
+    """Human rows of a downloaded mapping file, read with the table's raw schema"""
+    file_path = file_path or reactome_file_path(db_table)
+    columns = [c.upper() for c in db_table_dict[db_table]['columns']]
+
+    human_data = io.BytesIO()
+    for lines in iter_species_lines(file_path):
+        human_data.write(lines)
+    human_data.seek(0)
+
+    # Fields are kept exactly as published (no quoting, no NA detection)
+    return pd.read_csv(human_data,
+                       sep='\t',
+                       header=None,
+                       names=columns,
+                       **hgdschema.read_kwargs(table_schemas['raw'][db_table],columns,raw=True),
+                       quoting=csv.QUOTE_NONE)
+
+
+def reactome_download(db_table):
+    hgdhttp.get_pool().download(db_table_dict[db_table]['url'],reactome_file_path(db_table),
+                                cache_ttl=hgdcache.source_ttl('reactome'))
+    return read_mapping_file(db_table)
+
+
+def reactome_download_all(db_tables):
+    """Downloads mapping files for all <db_tables> concurrently - returns {db_table:raw_df}"""
+    url_dict = {db_table:db_table_dict[db_table]['url'] for db_table in db_tables}
+    file_dict = {db_table:reactome_file_path(db_table) for db_table in db_tables}
+    hgdhttp.get_pool().fetch_all(url_dict,file_dict,cache_ttl=hgdcache.source_ttl('reactome'))
+
+    return {db_table:read_mapping_file(db_table) for db_table in db_tables}
+
+
+################################################################################################################
+################################################################################################################
+# 2 - REACTOME DATA PROCESSING FUNCTIONS
+################################################################################################################
+################################################################################################################
+
+"""
+The mapping files repeat every event's & PE's name on each of its rows. They are normalized into event tables
+(one row per pathway or reaction), a physical-entity table & gene-event lookups holding IDs only. Reactome's
+stable IDs ('R-HSA-<number>') are kept as published; gene IDs are integers, like the NCBI gene tables
+(see utils/hgd_ids.py).
+"""
+
+# '<PE name> [<compartment>]'
+PE_NAME_PATTERN = r'^(.*?)(?: \[([^\]]*)\])?$'
+
+
+def events(df,event_type):
+    """One row per event (<event_type>_ID & <event_type>_NAME)"""
+    event_cols = [f'{event_type}_ID',f'{event_type}_NAME']
+    return df[event_cols].drop_duplicates(event_cols[0]).reset_index(drop=True)
+
+
+def physical_entities(df):
+    """One row per physical entity, with its name split from its compartment - each distinct PE is split once"""
+    pe_df = df[['PE_ID','PE_NAME']].drop_duplicates('PE_ID').reset_index(drop=True)
+    pe_df[['PE_NAME','COMPARTMENT']] = pe_df['PE_NAME'].str.extract(PE_NAME_PATTERN)
+    return pe_df
+
+
+def gene_event_lookup(df,event_type):
+    df['GENE_ID'] = hgdids.encode_ids(df['GENE_ID'])
+    return df[['GENE_ID','PE_ID',f'{event_type}_ID','EVIDENCE']].drop_duplicates().reset_index(drop=True)
+
+
+################################################################################################################
+## 2.1 - Pathways
+################################################################################################################
+
+def process_pathway(df):
+    # Note: returns pathway & physical-entity tables & gene-pathway look up table
+    return {'pathway':events(df,'PATHWAY'),
+            'physical_entity':physical_entities(df),
+            'gene_pathway_lookup':gene_event_lookup(df,'PATHWAY')}
+
+
+################################################################################################################
+## 2.2 - Reactions
+################################################################################################################
+
+def process_reaction(df):
+    return {'reaction':events(df,'REACTION'),
+            'gene_reaction_lookup':gene_event_lookup(df,'REACTION')}
+
+
+################################################################################################################
+## 2.3 - OMIM
+################################################################################################################
+
+def process_omim(df):
+    omim_df = df[['OMIM_ID','PATHWAY_ID','EVIDENCE']].drop_duplicates().reset_index(drop=True)
+    return {'pathway_omim_lookup':omim_df}
+
+
+################################################################################################################
+################################################################################################################
+# 3 - REACTOME DATA PARAMS
+################################################################################################################
+################################################################################################################
+
+db_table_dict = {
+    'pathway':{
+        'url':'https://reactome.org/download/current/NCBI2Reactome_PE_All_Levels.txt',
+        'columns':['gene_id','pe_id','pe_name','pathway_id','url','pathway_name','evidence','species'],
+        'proc_func': process_pathway
+    },
+    'reaction':{
+        'url':'https://reactome.org/download/current/NCBI2Reactome_PE_Reactions.txt',
+        'columns':['gene_id','pe_id','pe_name','reaction_id','url','reaction_name','evidence','species'],
+        'proc_func': process_reaction
+    },
+    'omim':{
+        'url':'https://reactome.org/download/current/Reactome2OMIM.txt',
+        'columns':['omim_id','pathway_id','url','pathway_name','evidence','species'],
+        'proc_func': process_omim
+    }
+}
+
+
+# Typed schemas of raw & processed tables (see utils/hgd_schema.py). Raw files keep every field but the URL &
+# species
+table_schemas = {
+    'raw':{db_table:{'columns':[c.upper() for c in params['columns'] if c not in ('url','species')],
+                     'dtypes':{'GENE_ID':'int64','OMIM_ID':'int64','EVIDENCE':'category'}}
+           for db_table,params in db_table_dict.items()},
+    'processed':{
+        'pathway':{
+            'dtypes':{'PATHWAY_ID':str,'PATHWAY_NAME':str}
+        },
+        'physical_entity':{
+            'dtypes':{'PE_ID':str,'PE_NAME':str,'COMPARTMENT':'category'}
+        },
+        'gene_pathway_lookup':{
+            'dtypes':{'GENE_ID':'int64','PE_ID':str,'PATHWAY_ID':str,'EVIDENCE':'category'}
+        },
+        'reaction':{
+            'dtypes':{'REACTION_ID':str,'REACTION_NAME':str}
+        },
+        'gene_reaction_lookup':{
+            'dtypes':{'GENE_ID':'int64','PE_ID':str,'REACTION_ID':str,'EVIDENCE':'category'}
+        },
+        'pathway_omim_lookup':{
+            'dtypes':{'OMIM_ID':'int64','PATHWAY_ID':str,'EVIDENCE':'category'}
+        }
+    }
+}
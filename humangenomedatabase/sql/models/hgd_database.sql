@@ -420,6 +420,101 @@ CREATE TABLE `ncbi_human_snp_summary_ss_lookup` (
   `LOOKUP_SOURCE` char(11) NOT NULL
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `reactome_human_gene_pathway_lookup`
+--
+
+DROP TABLE IF EXISTS `reactome_human_gene_pathway_lookup`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `reactome_human_gene_pathway_lookup` (
+  `GENE_ID` varchar(10) NOT NULL,
+  `PE_ID` varchar(20) NOT NULL,
+  `PATHWAY_ID` varchar(20) NOT NULL,
+  `EVIDENCE` char(3) NOT NULL,
+  KEY `PATHWAY_ID_idx` (`PATHWAY_ID`),
+  KEY `PE_ID_idx` (`PE_ID`),
+  CONSTRAINT `REACTOME_GENE_PATHWAY_ID` FOREIGN KEY (`PATHWAY_ID`) REFERENCES `reactome_human_pathway` (`PATHWAY_ID`),
+  CONSTRAINT `REACTOME_GENE_PATHWAY_PE_ID` FOREIGN KEY (`PE_ID`) REFERENCES `reactome_human_physical_entity` (`PE_ID`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `reactome_human_gene_reaction_lookup`
+--
+
+DROP TABLE IF EXISTS `reactome_human_gene_reaction_lookup`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `reactome_human_gene_reaction_lookup` (
+  `GENE_ID` varchar(10) NOT NULL,
+  `PE_ID` varchar(20) NOT NULL,
+  `REACTION_ID` varchar(20) NOT NULL,
+  `EVIDENCE` char(3) NOT NULL,
+  KEY `REACTION_ID_idx` (`REACTION_ID`),
+  CONSTRAINT `REACTOME_GENE_REACTION_ID` FOREIGN KEY (`REACTION_ID`) REFERENCES `reactome_human_reaction` (`REACTION_ID`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `reactome_human_pathway`
+--
+
+DROP TABLE IF EXISTS `reactome_human_pathway`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `reactome_human_pathway` (
+  `PATHWAY_ID` varchar(20) NOT NULL,
+  `PATHWAY_NAME` varchar(255) NOT NULL,
+  PRIMARY KEY (`PATHWAY_ID`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `reactome_human_pathway_omim_lookup`
+--
+
+DROP TABLE IF EXISTS `reactome_human_pathway_omim_lookup`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `reactome_human_pathway_omim_lookup` (
+  `OMIM_ID` int NOT NULL,
+  `PATHWAY_ID` varchar(20) NOT NULL,
+  `EVIDENCE` char(3) NOT NULL,
+  KEY `PATHWAY_ID_idx` (`PATHWAY_ID`),
+  CONSTRAINT `REACTOME_OMIM_PATHWAY_ID` FOREIGN KEY (`PATHWAY_ID`) REFERENCES `reactome_human_pathway` (`PATHWAY_ID`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `reactome_human_physical_entity`
+--
+
+DROP TABLE IF EXISTS `reactome_human_physical_entity`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `reactome_human_physical_entity` (
+  `PE_ID` varchar(20) NOT NULL,
+  `PE_NAME` text NOT NULL,
+  `COMPARTMENT` varchar(100) DEFAULT NULL,
+  PRIMARY KEY (`PE_ID`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `reactome_human_reaction`
+--
+
+DROP TABLE IF EXISTS `reactome_human_reaction`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `reactome_human_reaction` (
+  `REACTION_ID` varchar(20) NOT NULL,
+  `REACTION_NAME` text NOT NULL,
+  PRIMARY KEY (`REACTION_ID`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
 /*!40103 SET TIME_ZONE=@OLD_TIME_ZONE */;
 
 /*!40101 SET SQL_MODE=@OLD_SQL_MODE */;
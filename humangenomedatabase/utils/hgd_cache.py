@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import hashlib
+import shutil
+import threading
+from pathlib import Path
+
+from humangenomedatabase.configs import auto_config as cfg
+
+
+################################################################################################################
+# Raw Response Cache
+################################################################################################################
+
+"""
+On-disk cache of source responses, keyed by URL, under HTTP_CACHE_DIR (data/raw/cache). Each URL is stored
+as two files named by the URL's hash:
+
+    <key>.data    - the response body, exactly as downloaded
+    <key>.json    - metadata: url, ETag, Last-Modified, sha256 & size of the body, fetched/used timestamps
+
+Keeping one metadata file per entry (rather than one shared index) lets several processes use the cache at
+once. How an entry is used (see hgd_http.asyncHttpPool.cached_download):
+
+    - younger than the source's TTL (HTTP_CACHE_TTL)  -> used without any network request
+    - older                                           -> revalidated with a conditional GET (If-None-Match /
+                                                          If-Modified-Since); a 304 reuses the cached body
+    - body fails its integrity check (size/sha256)    -> treated as missing & re-downloaded
+
+The cache is bounded to HTTP_CACHE_MAX_BYTES by evicting the least-recently-used entries.
+"""
+
+
+def source_ttl(source):
+    """Cache TTL (s) for a source - None when the cache is turned off"""
+    if not cfg.HTTP_CACHE:
+        return None
+    return cfg.HTTP_CACHE_TTL.get(source,0)
+
+
+def file_sha256(file_path,chunk_size=1024*1024):
+    sha = hashlib.sha256()
+    with open(file_path,'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size),b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def link_or_copy(src_path,dest_path):
+    """Places a cached body at dest_path - hard link when possible (no extra disk/IO), copy otherwise"""
+    Path(dest_path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{dest_path}.link"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(src_path,tmp_path)
+    except OSError:
+        shutil.copyfile(src_path,tmp_path)
+    os.replace(tmp_path,dest_path)
+    return dest_path
+
+
+class httpCache:
+    def __init__(self,cache_dir=None,max_bytes=None,verify=None):
+        self.cache_dir = Path(cache_dir or cfg.HTTP_CACHE_DIR)
+        self.max_bytes = cfg.HTTP_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.verify = cfg.HTTP_CACHE_VERIFY if verify is None else verify
+        self._lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+
+    def _key(self,url):
+        return hashlib.sha1(url.encode()).hexdigest()
+
+    def data_path(self,url):
+        return self.cache_dir / f"{self._key(url)}.data"
+
+    def meta_path(self,url):
+        return self.cache_dir / f"{self._key(url)}.json"
+
+
+    def _write_meta(self,url,meta):
+        meta_path = self.meta_path(url)
+        tmp_path = f"{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path,'w') as f:
+            json.dump(meta,f)
+        os.replace(tmp_path,meta_path)
+
+
+    def lookup(self,url):
+        """Returns the metadata of a valid (present & intact) entry, or None"""
+        meta_path, data_path = self.meta_path(url), self.data_path(url)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            size = os.path.getsize(data_path)
+        except (OSError,ValueError):
+            return None
+
+        if size != meta.get('size'):
+            return None
+        if self.verify and file_sha256(data_path) != meta.get('sha256'):
+            print(f"Cached file failed integrity check, discarding: {url}")
+            self.remove(url)
+            return None
+
+        return meta
+
+
+    def is_fresh(self,meta,ttl):
+        return (time.time() - meta['fetched_at']) < ttl
+
+
+    def conditional_headers(self,meta):
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+
+    def touch(self,url,meta,revalidated=False):
+        """Marks an entry as used (LRU) - & as re-fetched, when upstream confirmed it unchanged"""
+        now = time.time()
+        meta['last_used'] = now
+        if revalidated:
+            meta['fetched_at'] = now
+        self._write_meta(url,meta)
+        return meta
+
+
+    def store(self,url,body_path,response_headers):
+        """Moves a downloaded body into the cache & records its metadata - returns the cached data path"""
+        data_path = self.data_path(url)
+        size = os.path.getsize(body_path)
+        sha = file_sha256(body_path)
+        os.replace(body_path,data_path)
+
+        now = time.time()
+        self._write_meta(url,{'url':url,
+                              'etag':response_headers.get('ETag'),
+                              'last_modified':response_headers.get('Last-Modified'),
+                              'sha256':sha,
+                              'size':size,
+                              'fetched_at':now,
+                              'last_used':now})
+        self.evict(keep=url)
+        return data_path
+
+
+    def remove(self,url):
+        for path in [self.meta_path(url),self.data_path(url)]:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+    def evict(self,keep=None):
+        """Drops least-recently-used entries (other than <keep>) until the cache is within max_bytes"""
+        with self._lock:
+            entries = []
+            for meta_path in self.cache_dir.glob('*.json'):
+                try:
+                    with open(meta_path) as f:
+                        meta = json.load(f)
+                except (OSError,ValueError):
+                    continue
+                entries.append(meta)
+
+            total = sum(m.get('size',0) for m in entries)
+            for meta in sorted(entries,key=lambda m: m.get('last_used',0)):
+                if total <= self.max_bytes:
+                    break
+                if meta['url'] == keep:
+                    continue
+                print(f"Evicting cached file: {meta['url']}")
+                self.remove(meta['url'])
+                total -= meta.get('size',0)
+
+
+_CACHE = None
+
+
+def get_cache():
+    """Process-wide response cache (created on first use)"""
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = httpCache()
+    return _CACHE
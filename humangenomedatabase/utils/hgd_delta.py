@@ -0,0 +1,208 @@
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import humangenomedatabase.utils.hgd_scheduler as hgdsched
+from humangenomedatabase.configs import auto_config as cfg
+
+
+################################################################################################################
+# Incremental (Delta) Loads
+################################################################################################################
+
+"""
+Most rows of a source don't change from one weekly refresh to the next, so an incremental load only writes the
+rows that did. Every processed table is keyed by its primary key in sql/models/hgd_database.sql (GENE_ID,
+SNP_ID, PATHWAY_ID, ...) - a lookup table, which has none, by all of its columns (e.g. GENE_ID, GENE_SYMBOL,
+LOOKUP_SOURCE). Each row gets a stable hash of its other columns & the keys & hashes of the last load are kept
+as the table's snapshot:
+
+    data/snapshots/<source>/<db_table>.pkl      key columns & ROW_HASH
+
+A load compares the processed table with the snapshot:
+
+    inserts: keys not in the snapshot
+    updates: keys in both, with a different row hash
+    deletes: keys of the snapshot that are gone
+
+& only those rows are written, in one transaction (see hgd_mysql.apply_delta): the keys of deleted & updated
+rows are bulk-inserted into a temporary keys table & their rows deleted with one join, then inserted & updated
+rows inserted, DELTA_BATCH_ROWS rows per statement execution. The join looks rows up by the key & foreign-key
+indexes the tables are created with (see hgd_mysql.create_table), rather than scanning the table once per key.
+Lookup tables have no primary key to upsert on, so an update is a delete & an insert. A table without a snapshot is loaded in full (its rows replaced - a missing table is created).
+The snapshot is replaced once the load succeeded, so a failed load is retried against the same snapshot. A full
+load drops the snapshot before it writes (& an incremental one writes a new snapshot after), so a snapshot
+never outlives the rows it describes.
+
+Hashes (pd.util.hash_pandas_object, with its fixed hash key) depend on values & dtypes only, which the
+processed schemas (utils/hgd_schema.py) keep the same from run to run.
+"""
+
+HASH_COLUMN = 'ROW_HASH'
+
+PRIMARY_KEY_PATTERN = re.compile(r'PRIMARY KEY \(([^)]*)\)')
+
+
+def primary_keys(schema_file=hgdsched.SCHEMA_FILE):
+    """{table:[primary key columns]} of the database schema - only tables with a primary key"""
+    with open(schema_file) as f:
+        sql = f.read()
+
+    keys = {}
+    for table,body in hgdsched.CREATE_TABLE_PATTERN.findall(sql):
+        primary_key = PRIMARY_KEY_PATTERN.search(body)
+        if primary_key:
+            keys[table] = [c.strip(' `') for c in primary_key.group(1).split(',')]
+    return keys
+
+
+def key_columns(source,db_table,df,keys=None):
+    """Key columns of a processed table - its primary key, or all of its columns (lookup tables)"""
+    keys = primary_keys() if keys is None else keys
+    primary_key = keys.get(hgdsched.schema_table(source,db_table))
+    if primary_key and all(c in df.columns for c in primary_key):
+        return primary_key
+    return list(df.columns)
+
+
+def row_hashes(df,key_cols):
+    """Key columns of <df> & the hash of each row's other columns (0 when every column is a key) - one row per
+    key (the last, as a load would leave it)"""
+    hashes = df[key_cols].copy()
+    value_cols = [c for c in df.columns if c not in key_cols]
+    if value_cols:
+        hashes[HASH_COLUMN] = pd.util.hash_pandas_object(df[value_cols],index=False).to_numpy()
+    else:
+        hashes[HASH_COLUMN] = np.uint64(0)
+    return hashes.drop_duplicates(key_cols,keep='last').reset_index(drop=True)
+
+
+################################################################################################################
+## Snapshots
+################################################################################################################
+
+def snapshot_path(source,db_table):
+    return Path(cfg.DELTA_SNAPSHOT_DIR) / source / f'{db_table}.pkl'
+
+
+def read_snapshot(source,db_table):
+    """Keys & row hashes of the last load (None if the table was never loaded incrementally)"""
+    path = snapshot_path(source,db_table)
+    return pd.read_pickle(path) if path.exists() else None
+
+
+def remove_snapshot(source,db_table):
+    """Drops a table's snapshot - a full load rewrites the table, so its next incremental load is a full one"""
+    snapshot_path(source,db_table).unlink(missing_ok=True)
+
+
+def write_snapshot(source,db_table,snapshot):
+    path = snapshot_path(source,db_table)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    snapshot.to_pickle(tmp_path)
+    os.replace(tmp_path,path)
+
+
+################################################################################################################
+## Diff
+################################################################################################################
+
+class tableDelta:
+    def __init__(self,key_cols,snapshot,inserts,updates,deletes):
+        self.key_cols = key_cols
+        self.snapshot = snapshot
+        self.inserts = inserts
+        self.updates = updates
+        self.deletes = deletes
+
+
+    @property
+    def rows(self):
+        """Inserted & updated rows, written with one insert statement"""
+        return pd.concat([self.inserts,self.updates],ignore_index=True)
+
+
+    @property
+    def removed_keys(self):
+        """Keys of deleted & updated rows - deleted before the rows are inserted"""
+        return pd.concat([self.deletes,self.updates[self.key_cols]],ignore_index=True)
+
+
+    def counts(self):
+        return {'inserts':len(self.inserts),'updates':len(self.updates),'deletes':len(self.deletes)}
+
+
+def diff(df,key_cols,previous):
+    """tableDelta of processed table <df> against the <previous> snapshot"""
+    current = row_hashes(df,key_cols)
+    rows = df.drop_duplicates(key_cols,keep='last').reset_index(drop=True)
+
+    # Keys only in the outer join - hashes are compared on an inner join, where they stay uint64
+    keys = current[key_cols].merge(previous[key_cols],on=key_cols,how='outer',indicator=True)
+    both = current.merge(previous,on=key_cols,suffixes=('','_PREVIOUS'))
+
+    def rows_of(keys):
+        # Full rows of the current table for <keys>, in table order
+        return rows.merge(keys[key_cols],on=key_cols,how='inner')
+
+    inserts = rows_of(keys[keys['_merge'] == 'left_only'])
+    updates = rows_of(both[both[HASH_COLUMN] != both[f'{HASH_COLUMN}_PREVIOUS']])
+    deletes = keys.loc[keys['_merge'] == 'right_only',key_cols].reset_index(drop=True)
+    return tableDelta(key_cols,current,inserts,updates,deletes)
+
+
+def table_delta(source,db_table,df):
+    """tableDelta of a processed table against its snapshot - None if it has no snapshot (load it in full)"""
+    key_cols = key_columns(source,db_table,df)
+    previous = read_snapshot(source,db_table)
+    if previous is None or list(previous.columns) != key_cols + [HASH_COLUMN]:
+        return None
+    return diff(df,key_cols,previous)
+
+
+def snapshot_of(source,db_table,df):
+    """Snapshot of a processed table loaded in full"""
+    return row_hashes(df,key_columns(source,db_table,df))
+
+
+################################################################################################################
+## Statements
+################################################################################################################
+
+def records(df):
+    """Rows of <df> as statement parameters (p0, p1, ...) - missing values as NULL"""
+    values = df.astype(object).where(df.notnull(),None).to_numpy()
+    return [{f'p{i}':v for i,v in enumerate(row)} for row in values]
+
+
+def insert_statement(db_table,columns):
+    """INSERT of a row"""
+    column_list = ','.join(f'`{c}`' for c in columns)
+    params = ','.join(f':p{i}' for i in range(len(columns)))
+    return f"INSERT INTO `{db_table}` ({column_list}) VALUES ({params})"
+
+
+def keys_table(db_table):
+    """Temporary table the removed keys of a load are written to"""
+    return f'{db_table}_delta_keys'
+
+
+def create_keys_statement(db_table,key_cols):
+    """CREATE of the (empty) temporary keys table - its key columns typed like the table's"""
+    column_list = ','.join(f'`{c}`' for c in key_cols)
+    return f"CREATE TEMPORARY TABLE `{keys_table(db_table)}` SELECT {column_list} FROM `{db_table}` LIMIT 0"
+
+
+def delete_statement(db_table,key_cols):
+    """DELETE of the rows whose key is in the keys table, as one join - NULL-safe (<=>), as lookup keys may hold
+    NULLs"""
+    conditions = ' AND '.join(f'd.`{c}` <=> k.`{c}`' for c in key_cols)
+    return f"DELETE d FROM `{db_table}` d JOIN `{keys_table(db_table)}` k ON {conditions}"
+
+
+def drop_keys_statement(db_table):
+    return f"DROP TEMPORARY TABLE IF EXISTS `{keys_table(db_table)}`"
@@ -0,0 +1,179 @@
+import time
+import random
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from urllib.error import HTTPError, URLError
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process file locks (Windows) - the limiter is shared between threads only
+    fcntl = None
+
+from Bio import Entrez
+
+from humangenomedatabase.configs import auto_config as cfg
+from humangenomedatabase.utils.hgd_http import RETRY_STATUS
+
+
+################################################################################################################
+# Rate-Limited Entrez Pool
+################################################################################################################
+
+"""
+NCBI allows 3 E-utility requests per second per host (10 with an API key), across every program running on
+it. Entrez requests (esearch, esummary, einfo) go through one shared pool:
+
+    pool = hgd_entrez.get_entrez_pool()
+    record = pool.call(read_request,...)          # blocking, rate-limited & retried
+    results = pool.run_all(fetch_data,arg_list)   # concurrently, on the pool's workers
+
+A token bucket holds the request rate. Its state (tokens, last refill) lives in a small file under a file
+lock, so every thread & every process of the pipeline - e.g. parallel extracts - draws from the same
+bucket. Requests failing with HTTP 429/5xx or a connection error are retried with jittered exponential
+backoff (Biopython's own retries are turned off, see ncbi_utils).
+"""
+
+
+def entrez_rate():
+    """Allowed requests per second - depends on whether an NCBI API key is set"""
+    return cfg.ENTREZ_RATE_KEY if Entrez.api_key else cfg.ENTREZ_RATE
+
+
+class tokenBucket:
+    def __init__(self,rate=None,capacity=1,state_path=None):
+        self._rate = rate
+        self.capacity = capacity
+        self.state_path = state_path or cfg.ENTREZ_RATE_FILE
+        self._lock = threading.Lock()
+
+
+    @property
+    def rate(self):
+        # Read on every request, so an API key set after start-up takes effect
+        return self._rate or entrez_rate()
+
+
+    def _take(self):
+        """Takes a token if one is available - returns 0, or the seconds until the next token"""
+        with open(self.state_path,'a+') as f:
+            if fcntl is not None:
+                fcntl.flock(f,fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                state = f.read().split()
+                now = time.time()
+                try:
+                    tokens,updated_at = float(state[0]),float(state[1])
+                except (IndexError,ValueError):
+                    tokens,updated_at = self.capacity,now
+
+                tokens = min(self.capacity,tokens + (now - updated_at) * self.rate)
+                wait_s = 0 if tokens >= 1 else (1 - tokens) / self.rate
+                if not wait_s:
+                    tokens -= 1
+
+                f.seek(0)
+                f.truncate()
+                f.write(f"{tokens} {now}")
+                f.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f,fcntl.LOCK_UN)
+        return wait_s
+
+
+    def acquire(self):
+        """Blocks until a request may be sent"""
+        while True:
+            with self._lock:
+                wait_s = self._take()
+            if not wait_s:
+                return
+            time.sleep(wait_s)
+
+
+def is_retryable(error):
+    if isinstance(error,HTTPError):
+        return error.code in RETRY_STATUS
+    return isinstance(error,(URLError,http.client.IncompleteRead,ConnectionError,TimeoutError))
+
+
+class entrezPool:
+    def __init__(self,max_workers=None,retries=None,backoff=None,limiter=None):
+        self.max_workers = max_workers or cfg.ENTREZ_MAX_WORKERS
+        self.retries = cfg.HTTP_RETRIES if retries is None else retries
+        self.backoff = cfg.HTTP_BACKOFF if backoff is None else backoff
+        self.limiter = limiter or tokenBucket()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,thread_name_prefix='hgd_entrez')
+
+
+    def call(self,func,*args,**kwargs):
+        """Runs one Entrez request (<func> opens & reads it) in the calling thread, once the rate limit
+        allows, retrying transient failures"""
+        for attempt in range(self.retries+1):
+            self.limiter.acquire()
+            try:
+                return func(*args,**kwargs)
+            except Exception as e:
+                if attempt == self.retries or not is_retryable(e):
+                    raise
+                # Exponential backoff with jitter (at least as long as a 429's Retry-After)
+                delay = self.backoff * (2**attempt) * (0.5 + random.random())
+                retry_after = getattr(e,'headers',None) and e.headers.get('Retry-After')
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay,int(retry_after))
+                print(f"Entrez request failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+
+    def submit(self,func,*args,**kwargs):
+        """Runs <func> on a pool worker - returns its future"""
+        return self._executor.submit(func,*args,**kwargs)
+
+
+    def run_all(self,func,arg_list,on_result=None):
+        """Runs func(*args) for every args tuple of <arg_list> on the pool - returns the results in order.
+        <on_result>(args,result) is called (in the worker) as each one finishes & takes the result over: it is
+        not kept, so results don't pile up in memory until the last call, & the args tuples are returned instead.
+        On the first failure the pending calls are cancelled, running ones are finished & the error is raised."""
+        def run(args):
+            result = func(*args)
+            if on_result is None:
+                return result
+            on_result(args,result)
+            return args
+
+        futures = [self.submit(run,args) for args in arg_list]
+        done,pending = wait(futures,return_when=FIRST_EXCEPTION)
+        if pending:
+            for future in pending:
+                future.cancel()
+            wait(pending)
+
+        for future in futures:
+            if not future.cancelled() and future.exception() is not None:
+                raise future.exception()
+        return [future.result() for future in futures]
+
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+################################################################################################################
+# Shared Pool
+################################################################################################################
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_entrez_pool():
+    """Process-wide Entrez pool (created on first use)"""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = entrezPool()
+    return _POOL
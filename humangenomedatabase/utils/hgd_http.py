@@ -0,0 +1,524 @@
+import os
+import json
+import asyncio
+import hashlib
+import functools
+import random
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from humangenomedatabase.configs import auto_config as cfg
+import humangenomedatabase.utils.hgd_metrics as hgdmet
+import humangenomedatabase.utils.hgd_cache as hgdcache
+
+
+################################################################################################################
+# Async Extraction Engine
+################################################################################################################
+
+"""
+Source pulls (KEGG REST lists/links, NCBI FTP files) are network-bound & independent, so they are fetched
+concurrently: an asyncio event loop schedules every request, & each request runs on a worker thread using
+one shared, keep-alive requests.Session (connection-pooled per host). A per-host semaphore bounds how
+many requests hit the same server at once, & failed requests (connection errors, timeouts, 429/5xx) are
+retried with exponential backoff.
+
+    pool = hgd_http.get_pool()
+    results = pool.fetch_all({'pathway':'https://rest.kegg.jp/list/pathway/hsa', ...})
+
+Extract time becomes ~ the slowest single request, rather than the sum of all requests.
+"""
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# Errors while reading a response body - the download is resumed from the bytes already on disk
+RESUME_ERRORS = (requests.ConnectionError,requests.Timeout,requests.exceptions.ChunkedEncodingError)
+
+
+class httpFetchError(Exception):
+    pass
+
+
+class sourceChangedError(httpFetchError):
+    """The source file changed while a download of it was in progress (its partial body is discarded)"""
+    pass
+
+
+class asyncHttpPool:
+    def __init__(self,max_per_host=None,timeout=None,retries=None,backoff=None,max_workers=None):
+        self.max_per_host = max_per_host or cfg.HTTP_MAX_PER_HOST
+        self.timeout = timeout or cfg.HTTP_TIMEOUT
+        self.retries = cfg.HTTP_RETRIES if retries is None else retries
+        self.backoff = cfg.HTTP_BACKOFF if backoff is None else backoff
+        self.max_workers = max_workers or cfg.HTTP_MAX_WORKERS
+
+        # One pooled, keep-alive session shared by every request (& thread)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_workers,pool_maxsize=self.max_workers)
+        self.session.mount('http://',adapter)
+        self.session.mount('https://',adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,thread_name_prefix='hgd_http')
+        self._host_limits = {}
+        self._url_locks = {}
+        self._url_locks_lock = threading.Lock()
+
+
+    ############################################################################################################
+    # Blocking (thread-level) requests
+    ############################################################################################################
+
+    def _host_limit(self,url):
+        # Thread-level limit, so synchronous callers (get/download) share the same per-host bound
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits.setdefault(host,threading.BoundedSemaphore(self.max_per_host))
+        return self._host_limits[host]
+
+
+    def _request(self,method,url,stream=False,headers=None):
+        """Runs one request with retry/backoff - returns the (open) response for a 2xx/304 status"""
+        last_error = None
+        for attempt in range(self.retries+1):
+            if attempt:
+                # Exponential backoff with jitter
+                time.sleep(self.backoff * (2**(attempt-1)) * (0.5 + random.random()))
+            try:
+                response = self.session.request(method,url,stream=stream,headers=headers,timeout=self.timeout)
+            except (requests.ConnectionError,requests.Timeout) as e:
+                last_error = e
+                continue
+
+            if response.status_code in RETRY_STATUS:
+                last_error = httpFetchError(f"{response.status_code} for url: {url}")
+                response.close()
+                continue
+
+            response.raise_for_status()
+            return response
+
+        raise httpFetchError(f"Request failed after {self.retries+1} attempts: {url} ({last_error})")
+
+
+    def get(self,url,headers=None,span=None):
+        """Blocking GET of a full response - returns the requests.Response.
+        Bytes are added to <span> (default: the calling thread's open metrics span)"""
+        span = span or hgdmet.current_span()
+        with self._host_limit(url):
+            response = self._request('GET',url,headers=headers)
+        if span is not None:
+            span.record(bytes_read=len(response.content))
+        return response
+
+
+    def _url_lock(self,url):
+        # One download of a URL at a time (per process), as downloads of it share a partial file
+        with self._url_locks_lock:
+            return self._url_locks.setdefault(url,threading.Lock())
+
+
+    def download(self,url,file_path,headers=None,span=None,cache_ttl=None,md5_url=None):
+        """Blocking, streamed GET of <url> to <file_path> (written via a .part file, resumed if an earlier
+        attempt left one) - returns file_path. With a <cache_ttl> the response cache is consulted first (see
+        cached_download). With an <md5_url> the file is checked against the published md5."""
+        if cache_ttl is not None:
+            return self.cached_download(url,file_path,cache_ttl,span=span,md5_url=md5_url)
+
+        Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+        part_path = f"{file_path}.part"
+
+        with self._url_lock(url), self._host_limit(url):
+            self._download_verified(url,part_path,headers=headers,span=span,md5_url=md5_url)
+
+        Path(part_path).replace(file_path)
+        return file_path
+
+
+    def cached_download(self,url,file_path=None,cache_ttl=0,span=None,md5_url=None):
+        """GET of <url> through the on-disk response cache (utils/hgd_cache.py). A cached copy younger
+        than <cache_ttl> seconds is used as-is, an older one is revalidated with a conditional GET & only
+        re-downloaded if upstream changed. Returns file_path (linked/copied from the cache), or the
+        cached file's path if no file_path is given."""
+        cache = hgdcache.get_cache()
+
+        with self._url_lock(url):
+            meta = cache.lookup(url)
+            if meta is not None and cache.is_fresh(meta,cache_ttl):
+                cache.touch(url,meta)
+                data_path = cache.data_path(url)
+            else:
+                headers = cache.conditional_headers(meta) if meta is not None else None
+                part_path = f"{cache.data_path(url)}.part"
+                with self._host_limit(url):
+                    response_headers = self._download_verified(url,part_path,headers=headers,span=span,
+                                                               md5_url=md5_url)
+                if response_headers is None:
+                    print(f"Source unchanged, using cached file: {url}")
+                    cache.touch(url,meta,revalidated=True)
+                    data_path = cache.data_path(url)
+                else:
+                    data_path = cache.store(url,part_path,response_headers)
+
+        if file_path is None:
+            return str(data_path)
+        return hgdcache.link_or_copy(data_path,file_path)
+
+
+    ############################################################################################################
+    # Resumable downloads
+    ############################################################################################################
+
+    def _download_verified(self,url,part_path,headers=None,span=None,md5_url=None):
+        """Downloads <url> to <part_path> & checks it against <md5_url> (if one is published) - a file
+        failing the check is downloaded once more from scratch. Returns the response headers, or None
+        when a conditional GET (<headers>) found the source unchanged."""
+        for attempt in range(2):
+            try:
+                response_headers = self._download_body(url,part_path,headers=headers,span=span)
+            except sourceChangedError:
+                # Partial body was of an older version of the file - start over
+                print(f"Source changed during download, restarting: {url}")
+                clear_partial(part_path)
+                response_headers = self._download_body(url,part_path,headers=headers,span=span)
+
+            if response_headers is None or md5_url is None or self.verify_md5(part_path,md5_url):
+                return response_headers
+
+            clear_partial(part_path)
+            if attempt:
+                raise httpFetchError(f"Downloaded file does not match its md5 ({md5_url}): {url}")
+            print(f"Downloaded file does not match its md5, downloading again: {url}")
+
+
+    def _download_body(self,url,part_path,headers=None,span=None):
+        """Streams <url> to <part_path>, resuming the partial download an earlier attempt left (ranges from
+        its .state file). Large files from servers accepting ranges are fetched in HTTP_SEGMENTS segments, in
+        parallel as far as free per-host slots allow (callers hold one slot). Returns the response headers (ETag/Last-Modified), or None on a 304."""
+        state = read_download_state(part_path)
+        finished = False
+        if state is None or state['url'] != url:
+            clear_partial(part_path)
+            response = self._request('GET',url,stream=True,headers=headers)
+            if response.status_code == 304:
+                response.close()
+                return None
+
+            state = new_download_state(url,response.headers)
+            write_download_state(part_path,state)
+            progress = downloadProgress(url,state['size'],span=span)
+
+            if len(state['segments']) > 1:
+                response.close()
+            else:
+                # Single stream - the first response is read directly (a dropped connection resumes below)
+                try:
+                    with response:
+                        self._write_body(response,part_path,progress)
+                    finished = True
+                except RESUME_ERRORS:
+                    pass
+        else:
+            progress = downloadProgress(url,state['size'],span=span,resumed=partial_size(part_path,state))
+            print(f"Resuming download of {url} from {progress.resumed/1024**2:.1f} MiB")
+
+        segment_paths = [segment_path(part_path,i) for i in range(len(state['segments']))]
+        jobs = list(zip(segment_paths,state['segments']))
+        if len(jobs) == 1:
+            if not finished:
+                self._fetch_range(url,*jobs[0],state,progress)
+        else:
+            # The download holds one per-host slot - each further segment fetched at once takes a free slot of
+            # its own (never waiting for one), so a host never sees more than max_per_host connections
+            host_limit, extra_slots = self._host_limit(url), 0
+            while extra_slots < len(jobs) - 1 and host_limit.acquire(blocking=False):
+                extra_slots += 1
+            try:
+                with ThreadPoolExecutor(max_workers=1+extra_slots,thread_name_prefix='hgd_segment') as executor:
+                    list(executor.map(lambda job: self._fetch_range(url,*job,state,progress),jobs))
+            finally:
+                for _ in range(extra_slots):
+                    host_limit.release()
+            join_segments(part_path,segment_paths)
+
+        if state['size'] is not None and os.path.getsize(part_path) != state['size']:
+            raise httpFetchError(f"Incomplete download ({os.path.getsize(part_path)} of {state['size']} bytes): {url}")
+
+        os.remove(state_path(part_path))
+        progress.done()
+        return {'ETag':state['etag'],'Last-Modified':state['last_modified']}
+
+
+    def _fetch_range(self,url,seg_path,segment,state,progress):
+        """Completes one segment (byte range [start,end], end None = to the end) of a download in
+        <seg_path>, requesting only the bytes it does not hold yet - retried on dropped connections"""
+        start,end = segment
+        last_error = None
+        for attempt in range(self.retries+1):
+            have = os.path.getsize(seg_path) if os.path.exists(seg_path) else 0
+            if end is not None and start + have > end:
+                return
+            if attempt:
+                time.sleep(self.backoff * (2**(attempt-1)) * (0.5 + random.random()))
+
+            headers = {}
+            if have or start or end is not None:
+                if not state['validator']:
+                    # Nothing to check a resumed body against - start again
+                    raise sourceChangedError(f"No ETag/Last-Modified to resume with: {url}")
+                headers = {'Range':f"bytes={start+have}-{'' if end is None else end}",'If-Range':state['validator']}
+
+            try:
+                with self._request('GET',url,stream=True,headers=headers) as response:
+                    if headers and response.status_code != 206:
+                        raise sourceChangedError(f"{response.status_code} for ranged request: {url}")
+                    self._write_body(response,seg_path,progress,mode='ab')
+            except RESUME_ERRORS as e:
+                last_error = e
+                continue
+
+            if end is None or os.path.getsize(seg_path) == end - start + 1:
+                return
+
+        raise httpFetchError(f"Download failed after {self.retries+1} attempts: {url} ({last_error})")
+
+
+    def _write_body(self,response,file_path,progress=None,mode='wb',chunk_size=1024*1024):
+        size = 0
+        with open(file_path,mode) as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+                size += len(chunk)
+                if progress is not None:
+                    progress.add(len(chunk))
+        return size
+
+
+    def verify_md5(self,file_path,md5_url):
+        """Whether <file_path> matches the md5 published at <md5_url> (True if none is published)"""
+        try:
+            response = self._request('GET',md5_url)
+        except requests.HTTPError:
+            print(f"No published md5 for file, skipping check: {md5_url}")
+            return True
+
+        expected = re.search(r'\b[0-9a-fA-F]{32}\b',response.text)
+        if expected is None:
+            print(f"Unreadable md5 file, skipping check: {md5_url}")
+            return True
+        return file_md5(file_path) == expected.group(0).lower()
+
+
+    @contextmanager
+    def stream(self,url,headers=None,span=None):
+        """Blocking, streamed GET - yields the (decompressed) response body as a binary file-like object,
+        so a parser can consume it incrementally without the full body ever being held in memory"""
+        span = span or hgdmet.current_span()
+        with self._host_limit(url):
+            with self._request('GET',url,stream=True,headers=headers) as response:
+                response.raw.decode_content = True
+                yield response.raw
+                if span is not None:
+                    span.record(bytes_read=response.raw.tell())
+
+
+    ############################################################################################################
+    # Async (concurrent) requests
+    ############################################################################################################
+
+    async def fetch(self,url,file_path=None,span=None,cache_ttl=None,md5_url=None):
+        """Async GET - returns response bytes, or <file_path> when streaming to disk. With a <cache_ttl> the
+        response cache is used & a file path is always returned (the cached file, if no file_path)"""
+        loop = asyncio.get_running_loop()
+        if cache_ttl is not None:
+            return await loop.run_in_executor(self._executor,functools.partial(self.cached_download,url,file_path,
+                                                                               cache_ttl,span=span,md5_url=md5_url))
+        if file_path is None:
+            response = await loop.run_in_executor(self._executor,functools.partial(self.get,url,span=span))
+            return response.content
+        return await loop.run_in_executor(self._executor,functools.partial(self.download,url,file_path,span=span,
+                                                                           md5_url=md5_url))
+
+
+    async def _fetch_all(self,url_dict,file_dict,cache_ttl,md5_dict):
+        # Worker threads have no metrics span of their own - credit bytes to the caller's span
+        span = hgdmet.current_span()
+        keys = list(url_dict.keys())
+        tasks = [self.fetch(url_dict[k],file_dict.get(k),span=span,cache_ttl=cache_ttl,md5_url=md5_dict.get(k))
+                 for k in keys]
+        results = await asyncio.gather(*tasks,return_exceptions=True)
+        return dict(zip(keys,results))
+
+
+    def fetch_all(self,url_dict,file_dict={},raise_errors=True,cache_ttl=None,md5_dict={}):
+        """Concurrently fetches {key:url}. Returns {key:bytes} (or {key:file_path} for keys in file_dict, &
+        for every key when a <cache_ttl> is given). Downloaded files of keys in md5_dict ({key:md5_url}) are
+        checked against their published md5. With raise_errors=False, failed keys hold their exception
+        instead of raising."""
+        results = asyncio.run(self._fetch_all(url_dict,file_dict,cache_ttl,md5_dict))
+
+        if raise_errors:
+            for key,result in results.items():
+                if isinstance(result,BaseException):
+                    raise httpFetchError(f"Fetch failed for {key}: {result}") from result
+
+        return results
+
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+
+################################################################################################################
+# Download State & Progress
+################################################################################################################
+
+"""
+A download in progress keeps its byte ranges & the source's validator (ETag, else Last-Modified) in
+<part>.state next to the partial body. Each range (segment) is written to its own file - the .part file
+itself for a single-stream download, <part>.<n> for the segments of a large file - so the bytes already on
+disk say where to resume. A resumed range is requested with If-Range, so if the source changed in the
+meantime the server answers with the full new file (200) & the partial download is discarded.
+"""
+
+def state_path(part_path):
+    return f"{part_path}.state"
+
+
+def segment_path(part_path,i):
+    return part_path if i == 0 else f"{part_path}.{i}"
+
+
+def read_download_state(part_path):
+    try:
+        with open(state_path(part_path)) as f:
+            return json.load(f)
+    except (OSError,ValueError):
+        return None
+
+
+def write_download_state(part_path,state):
+    tmp_path = f"{state_path(part_path)}.tmp"
+    with open(tmp_path,'w') as f:
+        json.dump(state,f)
+    os.replace(tmp_path,state_path(part_path))
+
+
+def new_download_state(url,headers):
+    """Byte ranges & validator of a new download, from the first response's headers"""
+    # An encoded (e.g. gzip transfer-encoded) body is decoded as it is read, so its byte offsets cannot be
+    # resumed - such a download restarts instead
+    encoded = 'Content-Encoding' in headers
+    size = headers.get('Content-Length')
+    size = int(size) if size is not None and not encoded else None
+    etag = headers.get('ETag')
+    validator = etag if etag and not etag.startswith('W/') else headers.get('Last-Modified')
+    validator = None if encoded else validator
+
+    n_segments = 1
+    if (size and validator and headers.get('Accept-Ranges') == 'bytes'
+            and size >= cfg.HTTP_SEGMENT_MIN_BYTES):
+        n_segments = max(1,cfg.HTTP_SEGMENTS)
+
+    if n_segments == 1:
+        segments = [[0,size - 1 if size else None]]
+    else:
+        bounds = [size * i // n_segments for i in range(n_segments + 1)]
+        segments = [[bounds[i],bounds[i+1] - 1] for i in range(n_segments)]
+
+    return {'url':url,'size':size,'etag':etag,'last_modified':headers.get('Last-Modified'),
+            'validator':validator,'segments':segments}
+
+
+def partial_size(part_path,state):
+    return sum(os.path.getsize(p) for p in (segment_path(part_path,i) for i in range(len(state['segments'])))
+               if os.path.exists(p))
+
+
+def clear_partial(part_path):
+    """Removes a partial download (body, segments & state)"""
+    state = read_download_state(part_path)
+    n_segments = len(state['segments']) if state else 1
+    for path in [segment_path(part_path,i) for i in range(n_segments)] + [state_path(part_path)]:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def join_segments(part_path,segment_paths):
+    """Appends segments 1..n to the first segment (the .part file) in order"""
+    with open(part_path,'ab') as f:
+        for path in segment_paths[1:]:
+            with open(path,'rb') as seg:
+                shutil.copyfileobj(seg,f,1024*1024)
+            os.remove(path)
+
+
+def file_md5(file_path,chunk_size=1024*1024):
+    md5 = hashlib.md5()
+    with open(file_path,'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size),b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+class downloadProgress:
+    """Bytes received by a download (from any number of segment threads) - printed every
+    HTTP_PROGRESS_INTERVAL seconds with throughput, & added to the metrics span"""
+    def __init__(self,url,size=None,span=None,resumed=0):
+        self.url = url
+        self.size = size
+        self.span = span or hgdmet.current_span()
+        self.resumed = resumed
+        self.received = 0
+        self.start = time.perf_counter()
+        self._last_report = self.start
+        self._lock = threading.Lock()
+
+
+    def add(self,n_bytes):
+        with self._lock:
+            self.received += n_bytes
+            now = time.perf_counter()
+            if now - self._last_report >= cfg.HTTP_PROGRESS_INTERVAL:
+                self._last_report = now
+                print(f"Downloading {self.url}: {self.describe(now)}")
+
+
+    def describe(self,now):
+        done = self.resumed + self.received
+        rate = self.received / max(now - self.start,1e-9) / 1024**2
+        total = f" of {self.size/1024**2:.1f} MiB ({100*done/self.size:.0f}%)" if self.size else " MiB"
+        return f"{done/1024**2:.1f}{total}, {rate:.1f} MiB/s"
+
+
+    def done(self):
+        if self.span is not None:
+            self.span.record(bytes_read=self.received)
+        now = time.perf_counter()
+        if now - self.start >= cfg.HTTP_PROGRESS_INTERVAL:
+            print(f"Downloaded {self.url}: {self.describe(now)}")
+
+
+################################################################################################################
+# Shared Pool
+################################################################################################################
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool():
+    """Process-wide HTTP pool (created on first use), shared by every source pipe"""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = asyncHttpPool()
+    return _POOL
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_integer_dtype, is_numeric_dtype
+
+
+################################################################################################################
+# ID Codec
+################################################################################################################
+
+"""
+Object IDs (genes, pathways, diseases, SNPs) are kept as int64 columns while data moves through the pipeline
+- in memory & in raw/processed files - & only turned into their prefixed string form ('G<id>', 'P<id>', ...)
+at the database boundary (hgd_pipe.load_table). Joins, explodes & lookup-table builds then hash & compare
+integers instead of Python strings.
+
+The column name is the prefix tag: every column listed in ID_CODECS holds the ID's number, & decode_ids
+rebuilds the string form the database stores:
+
+    GENE_ID      10     <->  'G10'
+    PATHWAY_ID   10     <->  'P00010'
+    DISEASE_ID   1      <->  'DS00001'
+    SNP_ID       334    <->  'rs334'
+"""
+
+ID_CODECS = {
+    'GENE_ID':{'prefix':'G','width':None},
+    'PATHWAY_ID':{'prefix':'P','width':5},
+    'DISEASE_ID':{'prefix':'DS','width':5},
+    'SNP_ID':{'prefix':'rs','width':None}
+}
+
+
+def encode_ids(col,strip=()):
+    """int64 ID numbers of a column of source IDs (e.g. 'hsa:10', 'path:hsa00010'), after removing each of
+    the <strip> strings (source prefixes). Integer columns are returned as int64."""
+    if is_integer_dtype(col):
+        return col.astype('int64')
+
+    numbers = col.astype(str)
+    for s in strip:
+        numbers = numbers.str.replace(s,'',regex=False)
+    return numbers.astype('int64')
+
+
+def decode_column(col,prefix,width=None):
+    """Prefixed string IDs from an integer ID column (missing IDs stay missing)"""
+    decoded = pd.Series(np.NaN,index=col.index,dtype=object)
+    has_id = col.notnull().to_numpy()
+    numbers = col[has_id].astype('int64').astype(str)
+    if width:
+        numbers = numbers.str.zfill(width)
+    decoded[has_id] = prefix + numbers
+    return decoded
+
+
+def decode_ids(df):
+    """Copy of <df> with every encoded (numeric) ID column turned back into its prefixed string form.
+    Columns already holding strings are left as they are."""
+    id_cols = [c for c in df.columns if c in ID_CODECS and is_numeric_dtype(df[c])]
+    if not id_cols:
+        return df
+
+    df = df.copy()
+    for col in id_cols:
+        df[col] = decode_column(df[col],**ID_CODECS[col])
+    return df
@@ -1,8 +1,10 @@
 import logging
+import logging.handlers
 import os
-
-import sys, os, functools
-from inspect import getframeinfo, stack
+import queue
+import sys, functools
+import atexit
+import threading
 
 from humangenomedatabase.configs import auto_config as cfg
 
@@ -19,12 +21,25 @@ class CustomFormatter(logging.Formatter):
         if hasattr(record, 'file_name_override'):
             record.filename = record.file_name_override
         return super(CustomFormatter, self).format(record)
-    
 
 
-# Logger Initialization
-def get_logger(log_file_name,log_sub_dir=cfg.LOG_DIR):
-    """ Creates a Log File and returns Logger object """
+################################################################################################################
+# Logger Registry
+################################################################################################################
+
+"""
+Loggers are built once per log-file & cached for the life of the process. Every logger only holds a
+QueueHandler, so a log call just formats the message & puts the record on an in-memory queue. A single
+QueueListener (background thread) per log file owns the FileHandler & does the actual disk writes.
+"""
+
+_LOGGERS = {}
+_LISTENERS = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _log_file_path(log_file_name,log_sub_dir):
+    """ Builds (& creates the directory for) the full log-file path """
 
     windows_log_dir = 'c:\\logs_dir\\'
     linux_log_dir = 'logs_dir/'
@@ -34,53 +49,158 @@ def get_logger(log_file_name,log_sub_dir=cfg.LOG_DIR):
     log_dir = os.path.join(log_dir, log_sub_dir)
 
     # Create Log file directory if not exists
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
+    os.makedirs(log_dir, exist_ok=True)
 
     # Build Log File Full Path
-    logPath = log_file_name if os.path.exists(log_file_name) else os.path.join(log_dir, (str(log_file_name) + '.log'))
+    return log_file_name if os.path.exists(log_file_name) else os.path.join(log_dir, (str(log_file_name) + '.log'))
+
+
+def get_logger(log_file_name,log_sub_dir=cfg.LOG_DIR):
+    """ Returns the process-wide Logger object for a log file, creating it on first use """
+
+    key = (log_file_name,log_sub_dir)
+    logger = _LOGGERS.get(key)
+    if logger is not None:
+        return logger
 
-    # Create logger object and set the format for logging and other attributes
-    logger = logging.Logger(log_file_name)
-    logger.setLevel(logging.DEBUG)
-    handler = logging.FileHandler(logPath, 'a+')
-    """ Set the formatter of 'CustomFormatter' type as we need to log base function name and base file name """
-    handler.setFormatter(CustomFormatter('%(asctime)s - %(levelname)-10s - %(filename)s - %(funcName)s - %(message)s'))
-    logger.addHandler(handler)
+    with _REGISTRY_LOCK:
+        # Another thread may have built it while we waited on the lock
+        if key in _LOGGERS:
+            return _LOGGERS[key]
+
+        logPath = _log_file_path(log_file_name,log_sub_dir)
+
+        file_handler = logging.FileHandler(logPath, 'a+')
+        """ Set the formatter of 'CustomFormatter' type as we need to log base function name and base file name """
+        file_handler.setFormatter(CustomFormatter('%(asctime)s - %(levelname)-10s - %(filename)s - %(funcName)s - %(message)s'))
+
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=False)
+        listener.start()
+
+        # Create logger object and set the format for logging and other attributes
+        logger = logging.Logger(log_file_name)
+        logger.setLevel(cfg.LOG_LEVEL)
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+        _LISTENERS[key] = listener
+        _LOGGERS[key] = logger
 
-    # Return logger object
     return logger
 
 
-# Log Decorator Function
-def log(_func=None):
+@atexit.register
+def shutdown_loggers():
+    """ Flushes all queued records to disk & stops the listener threads """
+
+    with _REGISTRY_LOCK:
+        for listener in _LISTENERS.values():
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+        _LISTENERS.clear()
+        _LOGGERS.clear()
+
+
+################################################################################################################
+# Value Summaries
+################################################################################################################
+
+"""
+Arguments & return values are summarized rather than repr'd - a DataFrame becomes its shape, dtypes and
+(shallow) memory size, containers become their length plus a summary of the first few items.
+"""
+
+SUMMARY_MAX_ITEMS = 5
+SUMMARY_MAX_STR = 120
+
+
+def summarize_value(value):
+    """ Returns a short, cheap-to-build string describing <value> """
+
+    # Avoid importing pandas here - check the class (not the instance, where .dtypes is a computed property)
+    # Column-by-column access is used over .dtypes/.memory_usage(), which both build new Series objects
+    value_type = type(value)
+    if hasattr(value_type,'dtypes') and hasattr(value_type,'shape'):
+        if hasattr(value_type,'columns'):
+            dtypes = {}
+            mem = value.index.nbytes
+            for c in value.columns:
+                col = value[c]
+                mem += col.nbytes
+                if len(dtypes) < SUMMARY_MAX_ITEMS*2:
+                    dtypes[str(c)] = str(col.dtype)
+            if len(value.columns) > len(dtypes):
+                dtypes = f"{dtypes} +{len(value.columns)-len(dtypes)} cols"
+            return f"DataFrame(shape={value.shape}, dtypes={dtypes}, mem={mem}B)"
+        return f"Series(name={value.name!r}, len={len(value)}, dtype={value.dtype}, mem={value.nbytes}B)"
+
+    if isinstance(value,dict):
+        items = [f"{k!r}: {summarize_value(v)}" for k,v in list(value.items())[:SUMMARY_MAX_ITEMS]]
+        more = f", +{len(value)-SUMMARY_MAX_ITEMS} more" if len(value) > SUMMARY_MAX_ITEMS else ""
+        return "{" + ", ".join(items) + more + "}"
+
+    if isinstance(value,(list,tuple,set)):
+        items = [summarize_value(v) for v in list(value)[:SUMMARY_MAX_ITEMS]]
+        more = f", +{len(value)-SUMMARY_MAX_ITEMS} more" if len(value) > SUMMARY_MAX_ITEMS else ""
+        return f"{type(value).__name__}(len={len(value)})[" + ", ".join(items) + more + "]"
+
+    if isinstance(value,(str,bytes)):
+        if len(value) > SUMMARY_MAX_STR:
+            return f"{value[:SUMMARY_MAX_STR]!r}...(len={len(value)})"
+        return repr(value)
+
+    if value is None or isinstance(value,(int,float,bool)):
+        return repr(value)
+
+    return f"<{type(value).__name__}>"
+
+
+################################################################################################################
+# Log Decorator
+################################################################################################################
+
+def log(_func=None,caller_frame=None):
+    """ Logs begin/end (with summarized arguments & return values) of the decorated method.
+
+    caller_frame : bool [optional]
+        Whether to look up the calling file name for the "Begin" record. Defaults
+        to config param LOG_CALLER_FRAME - off unless needed, as frame inspection
+        is the most expensive part of the decorator.
+    """
     def log_decorator_info(func):
+        with_caller = cfg.LOG_CALLER_FRAME if caller_frame is None else caller_frame
+        func_file = os.path.basename(func.__code__.co_filename)
+
         @functools.wraps(func)
         def log_decorator_wrapper(self, *args, **kwargs):
-            # Build logger object
+            # Cached logger object
             logger_obj = get_logger(log_file_name=self.log_file_name, log_sub_dir=cfg.LOG_DIR)
 
-            """ Create a list of the positional arguments passed to function"""
-            args_passed_in_function = [repr(a) for a in args]
-            """ Create a list of the keyword arguments."""
-            kwargs_passed_in_function = [f"{k}={v!r}" for k, v in kwargs.items()]
-            """ The lists of positional and keyword arguments is joined together to form final string """
-            formatted_arguments = ", ".join(args_passed_in_function + kwargs_passed_in_function)
+            if not logger_obj.isEnabledFor(logging.INFO):
+                return func(self, *args, **kwargs)
 
             """ Generate file name and function name for calling function."""
-            py_file_caller = getframeinfo(stack()[1][0])
+            if with_caller:
+                file_name = os.path.basename(sys._getframe(1).f_code.co_filename)
+            else:
+                file_name = func_file
             extra_args = { 'func_name_override': func.__name__,
-                           'file_name_override': os.path.basename(py_file_caller.filename)}
-            
+                           'file_name_override': file_name}
+
+            """ The positional and keyword arguments are summarized & joined together to form final string """
+            formatted_arguments = ", ".join([summarize_value(a) for a in args] +
+                                            [f"{k}={summarize_value(v)}" for k, v in kwargs.items()])
+
             """ Before to the function execution, log function details."""
             logger_obj.info(f"Arguments: {formatted_arguments} - Begin function",extra=extra_args)
             try:
                 """ log return value from the function """
                 value = func(self, *args, **kwargs)
-                logger_obj.info(f"Returned: - End function {value!r}")
+                logger_obj.info(f"Returned: - End function {summarize_value(value)}",extra=extra_args)
             except:
                 """log exception if occurs in function"""
-                logger_obj.error(f"Exception: {str(sys.exc_info()[1])}")
+                logger_obj.error(f"Exception: {str(sys.exc_info()[1])}",extra=extra_args)
                 raise
             # Return function value
             return value
@@ -91,4 +211,4 @@ def log(_func=None):
         return log_decorator_info
     # Decorator was called without arguments, so apply the decorator to the function immediately
     else:
-        return log_decorator_info(_func)
\ No newline at end of file
+        return log_decorator_info(_func)
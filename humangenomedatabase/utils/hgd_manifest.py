@@ -0,0 +1,182 @@
+import os
+import sys
+import json
+import time
+import types
+import hashlib
+import inspect
+import importlib
+from pathlib import Path
+
+import pandas as pd
+
+import humangenomedatabase.utils.hgd_shards as hgdshards
+from humangenomedatabase.configs import auto_config as cfg
+
+
+################################################################################################################
+# Run Manifest
+################################################################################################################
+
+"""
+The run manifest records what a refresh produced, one JSON file per table:
+
+    data/manifest/<source>/<db_table>.json
+
+    {'raw':{<raw table>:<path>},                  raw files of the table's last extract
+     'raw_hash':<sha256>,                         content of the raw data last processed
+     'code_version':<sha256>,                     source of the processing code (see code_version)
+     'processed':{<processed table>:<path>},      flat files of the processed tables
+     'updated_at':<time>}
+
+Raw data is looked up in the manifest, rather than by listing the raw folder - a table without a recorded (&
+still existing) raw file is extracted. A transform is skipped when neither its input nor its code changed: if
+the raw data hashes to the recorded raw_hash & the processing code to the recorded code_version, the recorded
+processed files are reused (TRANSFORM_CACHE - processed tables are then always saved to flat
+files, also in memory mode).
+
+Raw data is hashed by content: a flat file's bytes, a checkpointed pull's shard files (in offset order), or an
+in-memory DataFrame's values. Every table has a file of its own, so tables refreshed side by side (threads or
+worker processes) never write the same file.
+"""
+
+HASH_BLOCK_BYTES = 16*1024**2
+
+
+def manifest_path(source,db_table):
+    return Path(cfg.MANIFEST_DIR) / source / f'{db_table}.json'
+
+
+def read_entry(source,db_table):
+    """Manifest entry of a table ({} if it has none)"""
+    try:
+        with open(manifest_path(source,db_table)) as f:
+            return json.load(f)
+    except (OSError,ValueError):
+        return {}
+
+
+def update_entry(source,db_table,**fields):
+    """Updates fields of a table's entry - the file is replaced atomically"""
+    entry = read_entry(source,db_table)
+    entry.update(fields,updated_at=time.time())
+
+    path = manifest_path(source,db_table)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path,'w') as f:
+        json.dump(entry,f,indent=2)
+    os.replace(tmp_path,path)
+    return entry
+
+
+################################################################################################################
+## Content Hashes
+################################################################################################################
+
+def file_hash(file_path,digest=None):
+    digest = digest or hashlib.sha256()
+    with open(file_path,'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES),b''):
+            digest.update(block)
+    return digest
+
+
+def frame_hash(df,digest=None):
+    digest = digest or hashlib.sha256()
+    digest.update(json.dumps([str(c) for c in df.columns]).encode())
+    digest.update(pd.util.hash_pandas_object(df,index=False).to_numpy().tobytes())
+    return digest
+
+
+def raw_hash(raw_data):
+    """sha256 of raw data's content - None when it can't be hashed (e.g. a file on S3)"""
+    if isinstance(raw_data,pd.DataFrame):
+        return frame_hash(raw_data).hexdigest()
+
+    if hgdshards.is_manifest(raw_data):
+        store = hgdshards.shardStore.from_manifest(raw_data)
+        digest = hashlib.sha256()
+        for offset in sorted(int(o) for o in store.manifest['completed']):
+            file_hash(store.dir / store.manifest['completed'][str(offset)]['file'],digest)
+        return digest.hexdigest()
+
+    if isinstance(raw_data,(str,Path)) and os.path.isfile(raw_data):
+        return file_hash(raw_data).hexdigest()
+    return None
+
+
+PACKAGE = 'humangenomedatabase'
+
+# Every transform runs through these as well as its processing function - raw reads, schemas & row shards
+TRANSFORM_MODULES = ['humangenomedatabase.utils.hgd_utils','humangenomedatabase.utils.hgd_schema',
+                     'humangenomedatabase.utils.hgd_split']
+
+
+def package_modules(*modules):
+    """Modules of this package <modules> use - themselves & every package module they import, or import names
+    from, directly or through other package modules"""
+    found, pending = {}, list(modules)
+    while pending:
+        module = pending.pop()
+        if module.__name__ in found:
+            continue
+        found[module.__name__] = module
+
+        for value in vars(module).values():
+            if isinstance(value,types.ModuleType):
+                used = value
+            else:
+                used = sys.modules.get(getattr(value,'__module__',None) or '')
+            if used is not None and used.__name__.split('.')[0] == PACKAGE and getattr(used,'__file__',None):
+                pending.append(used)
+    return found
+
+
+def code_version(proc_func):
+    """sha256 of a processing function's name & the source of every package module it or the transform uses
+    (e.g. the source utils, hgd_normalize, hgd_ids & hgd_schema) - editing any of them is a new version"""
+    proc_func = inspect.unwrap(proc_func)
+    digest = hashlib.sha256(proc_func.__qualname__.encode())
+    modules = [sys.modules[proc_func.__module__]] + [importlib.import_module(m) for m in TRANSFORM_MODULES]
+    for name,module in sorted(package_modules(*modules).items()):
+        digest.update(name.encode())
+        file_hash(module.__file__,digest)
+    return digest.hexdigest()
+
+
+################################################################################################################
+## Lookups
+################################################################################################################
+
+def record_raw(source,db_table,raw_data_dict):
+    """Records the raw files of an extract (in-memory raw data has none)"""
+    raw_files = {t:str(data) for t,data in raw_data_dict.items() if isinstance(data,(str,Path))}
+    return update_entry(source,db_table,raw=raw_files)
+
+
+def raw_files(source,db_table):
+    """{raw table:path} of a table's last extract - None if there is none, or a file is gone"""
+    raw = read_entry(source,db_table).get('raw')
+    if not raw or not all(os.path.exists(path) for path in raw.values()):
+        return None
+    return raw
+
+
+def record_transform(source,db_table,raw_digest,version,processed):
+    """Records a transform - processed: {processed table:path}, empty when its outputs weren't saved"""
+    return update_entry(source,db_table,raw_hash=raw_digest,code_version=version,processed=processed)
+
+
+def cached_outputs(source,db_table,raw_digest,version):
+    """{processed table:path} of a previous transform of the same raw data with the same code - None if there
+    is none, or an output file is gone"""
+    if raw_digest is None:
+        return None
+
+    entry = read_entry(source,db_table)
+    processed = entry.get('processed')
+    if (entry.get('raw_hash') != raw_digest or entry.get('code_version') != version or not processed
+            or not all(os.path.exists(path) for path in processed.values())):
+        return None
+    return processed
@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+################################################################################################################
+# Stage Spans
+################################################################################################################
+
+"""
+A span records one timed unit of pipeline work (a stage of a table - "extract", "transform", "load" - or a
+whole "refresh"). Spans opened while another span is open on the same thread become its children, so a
+single_table_refresh span contains the extract/transform/load spans run inside it.
+
+Peak memory is the process high-water RSS (in bytes) at the time the span closes, as reported by the OS.
+It is cheap to read but never goes down, so "peak_mem_delta" (growth of the high-water mark during the
+span) is the better indicator of which stage pushed memory up.
+"""
+
+
+def _peak_rss():
+    """Process high-water resident memory, in bytes (0 if not available)"""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak if sys.platform == 'darwin' else peak*1024
+
+
+def count_rows(data):
+    """Row count of a DataFrame, or summed row counts of a {db_table:DataFrame} dict.
+    File-paths (IN_MEM=False) are not counted."""
+    if isinstance(data,dict):
+        return sum(count_rows(v) for v in data.values())
+    if hasattr(type(data),'shape'):
+        return int(data.shape[0])
+    return 0
+
+
+def count_file_bytes(data):
+    """On-disk size of a file-path, or summed sizes of a {db_table:file-path} dict"""
+    if isinstance(data,dict):
+        return sum(count_file_bytes(v) for v in data.values())
+    if isinstance(data,str) and os.path.isfile(data):
+        return os.path.getsize(data)
+    return 0
+
+
+class stageSpan:
+    def __init__(self,stage,db_table=None,parent=None):
+        self.stage = stage
+        self.db_table = db_table
+        self.parent = parent
+        self.children = []
+
+        self.rows_in = 0
+        self.rows_out = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.status = 'ok'
+        self.error = None
+
+        self.start_time = None
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+        self.peak_mem = 0
+        self.peak_mem_delta = 0
+
+
+    def start(self):
+        self.start_time = time.time()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._mem_start = _peak_rss()
+        return self
+
+
+    def stop(self):
+        self.wall_s = time.perf_counter() - self._wall_start
+        self.cpu_s = time.process_time() - self._cpu_start
+        self.peak_mem = _peak_rss()
+        self.peak_mem_delta = self.peak_mem - self._mem_start
+        return self
+
+
+    def record(self,rows_in=0,rows_out=0,bytes_read=0,bytes_written=0):
+        """Adds counts to the span - can be called any number of times while it is open"""
+        self.rows_in += rows_in
+        self.rows_out += rows_out
+        self.bytes_read += bytes_read
+        self.bytes_written += bytes_written
+
+
+    def to_dict(self):
+        return {'stage':self.stage,
+                'db_table':self.db_table,
+                'status':self.status,
+                'error':self.error,
+                'start_time':self.start_time,
+                'wall_s':round(self.wall_s,6),
+                'cpu_s':round(self.cpu_s,6),
+                'rows_in':self.rows_in,
+                'rows_out':self.rows_out,
+                'bytes_read':self.bytes_read,
+                'bytes_written':self.bytes_written,
+                'peak_mem':self.peak_mem,
+                'peak_mem_delta':self.peak_mem_delta,
+                'children':[c.to_dict() for c in self.children]}
+
+
+################################################################################################################
+# Metrics Recorder
+################################################################################################################
+
+_ACTIVE = threading.local()
+
+
+def current_span():
+    """Innermost open span on this thread (or None) - lets extract/processing code add byte & row counts
+    without the span being passed down to it"""
+    stack = getattr(_ACTIVE,'stack',None)
+    return stack[-1] if stack else None
+
+
+def record(**counts):
+    """Adds counts to the innermost open span, if any (no-op outside of a span)"""
+    span = current_span()
+    if span is not None:
+        span.record(**counts)
+
+
+class metricsRecorder:
+    def __init__(self,run_name='hgd_run'):
+        self.run_name = run_name
+        self.run_start = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+
+    @contextmanager
+    def span(self,stage,db_table=None):
+        """Context manager timing a stage for a table. Nested spans (same thread) become children."""
+        if not hasattr(_ACTIVE,'stack'):
+            _ACTIVE.stack = []
+
+        parent = _ACTIVE.stack[-1] if _ACTIVE.stack else None
+        span = stageSpan(stage,db_table,parent)
+
+        if parent is not None:
+            parent.children.append(span)
+        else:
+            with self._lock:
+                self.spans.append(span)
+
+        _ACTIVE.stack.append(span)
+        span.start()
+        try:
+            yield span
+        except BaseException as e:
+            span.status = 'error'
+            span.error = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            span.stop()
+            _ACTIVE.stack.pop()
+
+
+    def add_spans(self,spans):
+        """Adds spans recorded by another recorder (e.g. in a worker process) as top-level spans"""
+        with self._lock:
+            self.spans.extend(spans)
+
+
+    def record_error(self,stage,db_table,error):
+        """Adds a failed top-level span for a stage whose own spans were lost (e.g. its worker process died)"""
+        span = stageSpan(stage,db_table)
+        span.status = 'error'
+        span.error = error
+        self.add_spans([span])
+
+
+    def iter_spans(self):
+        """All recorded spans, depth-first"""
+        todo = list(reversed(self.spans))
+        while todo:
+            span = todo.pop()
+            yield span
+            todo.extend(reversed(span.children))
+
+
+    def table_summary(self):
+        """Per-table totals for each stage - {db_table:{stage:{wall_s,cpu_s,rows_in,...}}}"""
+        summary = {}
+        for span in self.iter_spans():
+            if span.db_table is None:
+                continue
+            stage = summary.setdefault(span.db_table,{}).setdefault(span.stage,
+                        {'count':0,'wall_s':0.0,'cpu_s':0.0,'rows_in':0,'rows_out':0,
+                         'bytes_read':0,'bytes_written':0,'peak_mem':0,'errors':0})
+            stage['count'] += 1
+            stage['wall_s'] += span.wall_s
+            stage['cpu_s'] += span.cpu_s
+            stage['rows_in'] += span.rows_in
+            stage['rows_out'] += span.rows_out
+            stage['bytes_read'] += span.bytes_read
+            stage['bytes_written'] += span.bytes_written
+            stage['peak_mem'] = max(stage['peak_mem'],span.peak_mem)
+            stage['errors'] += span.status == 'error'
+
+        return summary
+
+
+    def report(self):
+        summary = self.table_summary()
+
+        # Rank tables by their top-level (refresh, or stand-alone stage) wall time
+        table_wall = {}
+        for span in self.spans:
+            if span.db_table is not None:
+                table_wall[span.db_table] = table_wall.get(span.db_table,0.0) + span.wall_s
+
+        return {'run_name':self.run_name,
+                'run_start':self.run_start,
+                'run_wall_s':round(time.time()-self.run_start,6),
+                'tables_by_wall_s':sorted(table_wall,key=table_wall.get,reverse=True),
+                'tables':summary,
+                'spans':[s.to_dict() for s in self.spans]}
+
+
+    def active_wall_s(self):
+        """Time from the first span's start to the last span's end - a run's length when its spans overlap"""
+        spans = [s for s in self.spans if s.start_time is not None]
+        if not spans:
+            return 0.0
+        return max(s.start_time + s.wall_s for s in spans) - min(s.start_time for s in spans)
+
+
+    def write_report(self,file_path=None):
+        """Writes the JSON run report & returns its path (default: data/metrics/<run_name>_<timestamp>.json)"""
+        return write_json_report(self.report(),self.run_name,self.run_start,file_path)
+
+
+def write_json_report(report,run_name,run_start,file_path=None):
+    if file_path is None:
+        stamp = datetime.fromtimestamp(run_start).strftime('%Y%m%d_%H%M%S')
+        file_path = f"data/metrics/{run_name}_{stamp}.json"
+
+    Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(file_path,'w') as f:
+        json.dump(report,f,indent=2,default=str)
+
+    print(f"Saving run metrics to path: {file_path}")
+    return file_path
+
+
+################################################################################################################
+# Multi-Source Reports
+################################################################################################################
+
+"""
+A multi-source refresh (hgd_pipe.refresh_sources) runs a pipeline - & a recorder - per source at the same time.
+Their reports are combined into one run report, with each source's report under 'sources' & the sources ranked
+by how long they were active: the run takes about as long as the slowest source, not the sum of all of them.
+"""
+
+def combined_report(recorders,run_name='hgd_refresh',run_start=None,errors=None):
+    """One run report of {source:metricsRecorder} - errors: {source:{db_table:error message}}"""
+    run_start = run_start or min((r.run_start for r in recorders.values()),default=time.time())
+    source_wall = {source:round(recorder.active_wall_s(),6) for source,recorder in recorders.items()}
+
+    return {'run_name':run_name,
+            'run_start':run_start,
+            'run_wall_s':round(time.time()-run_start,6),
+            'sources_by_wall_s':sorted(source_wall,key=source_wall.get,reverse=True),
+            'source_wall_s':source_wall,
+            'errors':{source:table_errors for source,table_errors in (errors or {}).items() if table_errors},
+            'sources':{source:recorder.report() for source,recorder in recorders.items()}}
+
+
+def write_combined_report(recorders,run_name='hgd_refresh',run_start=None,errors=None,file_path=None):
+    """Writes the combined JSON run report of several recorders & returns its path"""
+    report = combined_report(recorders,run_name,run_start,errors)
+    return write_json_report(report,run_name,report['run_start'],file_path)
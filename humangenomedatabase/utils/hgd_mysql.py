@@ -5,6 +5,8 @@ import sqlalchemy
 import pandas as pd
 import bcpandas as bcp 
 
+import humangenomedatabase.utils.hgd_delta as hgddelta
+import humangenomedatabase.utils.hgd_scheduler as hgdsched
 from humangenomedatabase.configs import auto_config as cfg
 
 class mysqlDataPipe:
@@ -14,7 +16,8 @@ class mysqlDataPipe:
     def connect(self):
         #self.conn = pymysql.connect(cfg.DB_HOST, cfg.DB_USER, cfg.DB_PASS, local_infile=True)
         conn_string = f"mysql+mysqlconnector://[{cfg.DB_USER}]:[{cfg.DB_PASS}]@[{cfg.DB_HOST}]:[3306]/[{cfg.RDS_DB}]"
-        self.conn = sqlalchemy.create_engine(conn_string, echo=False)
+        # Local infile: bulk loads read partition files from the client (see ncbi_pipe/dbsnp_utils.py)
+        self.conn = sqlalchemy.create_engine(conn_string, echo=False, connect_args={'allow_local_infile':True})
         
         self.creds = bcp.SqlCreds(
             'my_server',
@@ -24,24 +27,23 @@ class mysqlDataPipe:
 
 
     def write_data(self,db_table,db_table_df,overwrite,chunksize=None):
+        """Writes a table - replacing it when overwriting, else appending to it (a missing table is created).
+        Failures raise, so a refresh records the table as failed"""
         if overwrite:
-            if_exists = 'overwrite'
+            if_exists = 'replace'
         else:
             if_exists = 'append'
 
-        try:
-            db_table_df.to_sql(name=db_table,con=self.conn,
-                            if_exists=if_exists,
-                            index=False,
-                            chunksize=chunksize,
-                            method="multi")
-        except Exception as e:
-            print(e)
+        db_table_df.to_sql(name=db_table,con=self.conn,
+                        if_exists=if_exists,
+                        index=False,
+                        chunksize=chunksize,
+                        method="multi")
 
     
     def write_data_bcp(self,db_table,db_table_df,overwrite,chunksize=None):
         if overwrite:
-            if_exists = 'overwrite'
+            if_exists = 'replace'
         else:
             if_exists = 'append'
 
@@ -51,6 +53,56 @@ class mysqlDataPipe:
             print(e)
         
     
+    def execute_statements(self,statements):
+        """Runs SQL statements in order, in one transaction on a connection of its own - safe to call from
+        several threads at once"""
+        with self.conn.begin() as connection:
+            for statement in statements:
+                connection.execute(sqlalchemy.text(statement))
+
+
+    def table_exists(self,db_table):
+        return sqlalchemy.inspect(self.conn).has_table(db_table)
+
+
+    def create_table(self,db_table,schema_file=hgdsched.SCHEMA_FILE):
+        """Creates a table from its CREATE TABLE statement in the database schema, with its keys, indexes &
+        foreign keys (to_sql creates tables without any). False when the schema has no such table"""
+        statement = hgdsched.create_statements(schema_file).get(db_table)
+        if statement is None:
+            return False
+        self.execute_statements([statement])
+        return True
+
+
+    def delete_rows(self,db_table):
+        """Deletes every row of a table, keeping the table - its referencing tables' rows are left in place (foreign
+        keys aren't checked), as a refresh reloads them after it"""
+        self.execute_statements(['SET FOREIGN_KEY_CHECKS=0',f"DELETE FROM `{db_table}`",'SET FOREIGN_KEY_CHECKS=1'])
+
+
+    def apply_delta(self,db_table,rows,removed_keys,key_cols,batch_rows=None):
+        """Writes an incremental load (see utils/hgd_delta.py) - deletes rows by key (deleted & updated rows) with
+        one join against a temporary table of the keys, then inserts rows (inserted & updated rows), in batches of
+        <batch_rows>, all in one transaction"""
+        batch_rows = batch_rows or cfg.DELTA_BATCH_ROWS
+
+        def execute_batches(connection,statement,params):
+            statement = sqlalchemy.text(statement)
+            for start in range(0,len(params),batch_rows):
+                connection.execute(statement,params[start:start + batch_rows])
+
+        with self.conn.begin() as connection:
+            if len(removed_keys):
+                connection.execute(sqlalchemy.text(hgddelta.create_keys_statement(db_table,key_cols)))
+                execute_batches(connection,hgddelta.insert_statement(hgddelta.keys_table(db_table),key_cols),
+                                hgddelta.records(removed_keys[key_cols]))
+                connection.execute(sqlalchemy.text(hgddelta.delete_statement(db_table,key_cols)))
+                connection.execute(sqlalchemy.text(hgddelta.drop_keys_statement(db_table)))
+
+            execute_batches(connection,hgddelta.insert_statement(db_table,list(rows.columns)),hgddelta.records(rows))
+
+
     def execute_query(self,query,from_file=True):
 
         try:
@@ -69,5 +121,6 @@ class mysqlDataPipe:
             
 
     def close(self):
-        if self.connection != None:
-            self.connection.close()
+        # Closes every pooled connection of the engine
+        if self.conn is not None:
+            self.conn.dispose()
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+
+################################################################################################################
+# Normalizing Multi-Valued Columns
+################################################################################################################
+
+"""
+Source fields often hold several values in one delimited string - gene synonyms 'A1B|ABG', disease names
+'<name>; <alt name>', SNP ss ids 'ss1,ss3'. They are normalized into lookup tables with one row per
+(key, item):
+
+    lookup = hgd_normalize.normalize_column(df,'GENE_ID','SYNONYMS','|',source='gene_info')
+
+A column is split once, over all of its values (Series.str.split), into a flat array of items & each value's
+item count. Keys are repeated by the counts - the parent frame is never copied or exploded. Items of the form
+'<prefix>:<value>' (DBXREFS 'MIM:138670', FEATURE_TYPE '<category>:<feature>') are split into columns the
+same way (fields).
+"""
+
+
+def split_items(values,sep):
+    """Items of every value split on <sep> (flattened, in order) & each value's item count - the same as
+    splitting then exploding"""
+    lists = pd.Series(values,dtype=object).str.split(sep,regex=False)
+    if lists.empty:
+        return np.array([],dtype=object), np.zeros(0,dtype='int64')
+    return lists.explode().to_numpy(dtype=object), lists.str.len().to_numpy(dtype='int64')
+
+
+def split_field(items,sep,index):
+    """Field <index> (0, 1, ... or -1 for the last) of every item split on <sep>. Raises a ValueError when an
+    item has too few fields."""
+    fields = pd.Series(items,dtype=object).str.split(sep,regex=False).str[index]
+    if fields.isnull().any():
+        raise ValueError(f"Field {index} found in {fields.notnull().sum()} of {len(fields)} items (split on '{sep}')")
+    return fields.to_numpy(dtype=object)
+
+
+def normalize_column(df,key_column,column,sep,values=None,name=None,fields=None,field_sep=':',
+                     missing=(),drop_empty=False,source=None,keep_index=False,return_counts=False):
+    """Lookup table of <key_column> & every item of the <sep>-delimited <column> of <df>, one row per item.
+
+    values: the column's values, when they are derived from it (default df[column])
+    name: name of the item column (default <column>)
+    fields: {name:index} - columns split out of each item on <field_sep> (instead of the item itself)
+    missing: values that, like nulls, hold no items (e.g. '-')
+    drop_empty: leave out empty items
+    source: LOOKUP_SOURCE of every row
+    keep_index: rows keep the index of their value in <df> (else a new range index)
+    return_counts: also return each value's number of lookup rows (0 for values without items), as an array
+                   in the order of <df>"""
+    values = np.asarray(df[column] if values is None else values,dtype=object)
+    has_items = ~pd.isnull(values)
+    if missing:
+        has_items &= ~pd.Series(values).isin(missing).to_numpy()
+
+    items, counts = split_items(values[has_items],sep)
+    positions = np.flatnonzero(has_items).repeat(counts)
+    keys = df[key_column].to_numpy()[positions]
+    index = df.index[positions] if keep_index else None
+
+    if drop_empty:
+        is_item = items != ''
+        items, keys, positions = items[is_item], keys[is_item], positions[is_item]
+        index = index[is_item] if keep_index else None
+
+    lookup = pd.DataFrame({key_column:keys},index=index)
+    if fields:
+        for field_name,field_index in fields.items():
+            lookup[field_name] = split_field(items,field_sep,field_index)
+    else:
+        lookup[name or column] = items
+
+    if source is not None:
+        lookup['LOOKUP_SOURCE'] = source
+    if return_counts:
+        return lookup, np.bincount(positions,minlength=len(values))
+    return lookup
@@ -0,0 +1,92 @@
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from humangenomedatabase.configs import auto_config as cfg
+
+
+################################################################################################################
+# Table-Parallel Execution
+################################################################################################################
+
+"""
+Tables of a source are independent until they're loaded, so their extract & transform stages can run side by
+side. run_tables runs a task (a module-level function, e.g. hgd_pipe.refresh_table_worker) for each table in
+a pool of NCPU_MAX worker processes:
+
+    results, errors = hgd_parallel.run_tables(task,db_tables,<task args>)
+
+Each task's result comes back to the parent process (processed DataFrames in memory mode, file paths
+otherwise, & the task's metric spans) to be merged into the pipeline's data_dict. A table whose task raises -
+or whose worker dies - is recorded in errors & the other tables keep running. A dying worker breaks the whole
+pool (every pending task fails with BrokenProcessPool), so those tables are run again, each in a worker process
+of its own: only the table that kills its worker fails.
+
+Workers are started with 'spawn', not forked: the parent's shared HTTP & Entrez pools hold threads, locks &
+open sockets, which a forked child would inherit in an unusable state. Each worker builds its own pools.
+Table workers already use the NCPU_MAX processes between them, so a task running in one doesn't start worker
+processes of its own (no row-sharded transforms - see hgd_split.use_split).
+"""
+
+_TABLE_WORKER = False
+
+
+def mark_table_worker():
+    """Worker-process initializer"""
+    global _TABLE_WORKER
+    _TABLE_WORKER = True
+
+
+def in_table_worker():
+    """Whether this process is a table worker of run_tables"""
+    return _TABLE_WORKER
+
+
+def pool_size(n_tasks,workers=None):
+    """Worker processes for <n_tasks> tasks - NCPU_MAX at most"""
+    return max(1,min(workers or cfg.NCPU_MAX,n_tasks))
+
+
+def run_isolated(task,db_table,*args,mp_context=None):
+    """task(db_table,*args) in a worker process of its own - a dying worker only fails this table"""
+    with ProcessPoolExecutor(max_workers=1,mp_context=mp_context,initializer=mark_table_worker) as executor:
+        return executor.submit(task,db_table,*args).result()
+
+
+def collect_results(futures,results,errors):
+    """Results & errors of {future:db_table} - returns the tables whose pool broke"""
+    broken = []
+    for future in as_completed(futures):
+        db_table = futures[future]
+        try:
+            results[db_table] = future.result()
+        except BrokenProcessPool:
+            broken.append(db_table)
+        except Exception as e:
+            # Isolated - the table is reported as failed, the others carry on
+            errors[db_table] = f'{type(e).__name__}: {e}'
+            print(f"Table {db_table} failed:\n{''.join(traceback.format_exception(e))}")
+    return broken
+
+
+def run_tables(task,db_tables,*args,workers=None):
+    """Runs task(db_table,*args) for each of <db_tables> in worker processes - returns ({db_table:result},
+    {db_table:error message})"""
+    results, errors = {}, {}
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=pool_size(len(db_tables),workers),mp_context=context,
+                             initializer=mark_table_worker) as executor:
+        futures = {executor.submit(task,db_table,*args):db_table for db_table in db_tables}
+        broken = collect_results(futures,results,errors)
+
+    if broken:
+        print(f"A worker process died - running {broken} again, each in a process of its own")
+        with ThreadPoolExecutor(max_workers=pool_size(len(broken),workers)) as executor:
+            futures = {executor.submit(run_isolated,task,db_table,*args,mp_context=context):db_table
+                       for db_table in broken}
+            for db_table in collect_results(futures,results,errors):
+                errors[db_table] = 'BrokenProcessPool: worker process died'
+                print(f"Table {db_table} failed: its worker process died")
+
+    return results, errors
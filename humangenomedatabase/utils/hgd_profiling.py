@@ -0,0 +1,117 @@
+import cProfile
+import functools
+import threading
+import tracemalloc
+from pathlib import Path
+
+from humangenomedatabase.configs import auto_config as cfg
+
+
+################################################################################################################
+# Profiling Mode
+################################################################################################################
+
+"""
+When the config param PROFILE is True, the source datapipes wrap every extract_one call & every table's
+proc_func with cProfile & tracemalloc. Each profiled call writes two files to PROFILE_DIR/<source>/:
+
+    <db_table>_<stage>.pstats       - cProfile stats (open with pstats / snakeviz)
+    <db_table>_<stage>_alloc.txt    - peak traced memory & top PROFILE_TOP_N allocation sites
+
+PROFILE_TABLES limits profiling to the listed tables (empty = all tables). With PROFILE off nothing is
+wrapped, so there is no cost at all.
+
+tracemalloc is process-wide, so profiled calls run one at a time - a call from another thread (HTTP pool,
+scheduler stages) waits for the running one to finish, rather than resetting or stopping its trace.
+"""
+
+_ACTIVE = threading.local()
+_PROFILE_LOCK = threading.Lock()
+
+
+def profiling_enabled(db_table):
+    """Whether a table should be profiled under the current config"""
+    if not getattr(cfg,'PROFILE',False):
+        return False
+    tables = getattr(cfg,'PROFILE_TABLES',[])
+    return (not tables) or (db_table in tables)
+
+
+def write_alloc_report(snapshot,peak,file_path,top_n):
+    """Writes peak traced memory & the top-N allocation sites (by size) of a tracemalloc snapshot"""
+    stats = snapshot.statistics('lineno')
+
+    with open(file_path,'w') as f:
+        f.write(f"Peak traced memory: {peak/1024/1024:.2f} MiB\n")
+        f.write(f"Top {top_n} allocation sites (still allocated at end of call):\n")
+        for i,stat in enumerate(stats[:top_n],1):
+            frame = stat.traceback[0]
+            f.write(f"{i:>3}. {frame.filename}:{frame.lineno} - {stat.size/1024:.1f} KiB in {stat.count} blocks\n")
+
+
+def profile_call(func,source,db_table,stage,*args,**kwargs):
+    """Runs func(*args,**kwargs) under cProfile & tracemalloc & writes the per-table reports"""
+
+    # cProfile can not nest - inner calls of an already-profiled call just run
+    if getattr(_ACTIVE,'on',False):
+        return func(*args,**kwargs)
+
+    out_dir = Path(cfg.PROFILE_DIR) / source
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    with _PROFILE_LOCK:
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+        profiler = cProfile.Profile()
+        _ACTIVE.on = True
+        try:
+            return profiler.runcall(func,*args,**kwargs)
+        finally:
+            _ACTIVE.on = False
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if started_tracing:
+                tracemalloc.stop()
+
+            file_base = out_dir / f"{db_table}_{stage}"
+            profiler.dump_stats(f"{file_base}.pstats")
+            write_alloc_report(snapshot,peak,f"{file_base}_alloc.txt",cfg.PROFILE_TOP_N)
+            print(f"Saving {stage} profile to path: {file_base}.pstats")
+
+
+def profile_extract(extract_one,source):
+    """Wraps a datapipe's (bound) extract_one method - the first argument is always db_table"""
+
+    @functools.wraps(extract_one)
+    def profiled_extract(db_table,*args,**kwargs):
+        if not profiling_enabled(db_table):
+            return extract_one(db_table,*args,**kwargs)
+        return profile_call(extract_one,source,db_table,'extract',db_table,*args,**kwargs)
+
+    return profiled_extract
+
+
+def profile_table_dict(db_table_dict,source):
+    """Returns a copy of a source db_table_dict with each table's proc_func wrapped for profiling.
+    The original (module-level) dict is left untouched."""
+
+    profiled_dict = {}
+    for db_table,params in db_table_dict.items():
+        params = dict(params)
+        if profiling_enabled(db_table):
+            params['proc_func'] = _profile_proc_func(params['proc_func'],source,db_table)
+        profiled_dict[db_table] = params
+
+    return profiled_dict
+
+
+def _profile_proc_func(proc_func,source,db_table):
+    # functools.wraps keeps __name__, which transform_table checks for process_link
+    @functools.wraps(proc_func)
+    def profiled_proc_func(*args,**kwargs):
+        return profile_call(proc_func,source,db_table,'transform',*args,**kwargs)
+
+    return profiled_proc_func
@@ -0,0 +1,176 @@
+import re
+import threading
+import traceback
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from humangenomedatabase.configs import auto_config as cfg
+
+
+################################################################################################################
+# Pipelined Stage Scheduler
+################################################################################################################
+
+"""
+A refresh is a graph of stages - each table is extracted (network), processed (CPU) & its processed tables are
+loaded (database) - & a stage only waits for the stages it needs, not for every stage before it:
+
+    extract:<table> --> transform:<table> --> load:<processed table> (one per output of the transform)
+
+so while one table is processed, the next is downloaded & the previous one written to the database. Each
+resource class has its own concurrency limit (PIPELINE_LIMITS, e.g. {'network':4,'cpu':1,'db':2}) & stages run
+in threads - extracts & loads wait on sockets, & processing gets its CPU parallelism from row-shard worker
+processes (utils/hgd_split.py), so one 'cpu' stage at a time keeps a core busy without stages fighting over the
+GIL.
+
+    scheduler = hgd_scheduler.stageScheduler()
+    scheduler.add('extract:gene',<func>,resource='network')
+    scheduler.add('transform:gene',<func>,resource='cpu',deps=['extract:gene'],expands=True)
+    results, errors = scheduler.run()
+
+Loads follow the foreign keys of sql/models/hgd_database.sql: a table is loaded after the tables it references
+(kegg_human_gene before kegg_human_gene_symbol_lookup). Tables are loaded to their schema names & created from
+the schema's statements (see hgd_mysql.create_table), so the foreign keys the order follows exist in MySQL. Load stages are only known once a transform returns its
+tables, so a stage may add stages while it runs (expands=True) & a dependency on a stage that doesn't exist yet
+is waited on until no expanding stage is left - a referenced table that isn't part of the run doesn't hold up
+the load. A stage whose dependency failed is not run & is reported as failed, with the others carrying on.
+"""
+
+SCHEMA_FILE = Path(__file__).parents[1] / 'sql' / 'models' / 'hgd_database.sql'
+
+CREATE_TABLE_PATTERN = re.compile(r'CREATE TABLE `(\w+)` \((.*?)\) ENGINE',re.S)
+REFERENCES_PATTERN = re.compile(r'FOREIGN KEY \([^)]*\) REFERENCES `(\w+)`')
+CREATE_STATEMENT_PATTERN = re.compile(r'CREATE TABLE `(\w+)` \(.*?\) ENGINE[^;]*',re.S)
+
+
+def foreign_keys(schema_file=SCHEMA_FILE):
+    """{table:[referenced tables]} of the database schema - only tables with foreign keys"""
+    with open(schema_file) as f:
+        sql = f.read()
+
+    references = {}
+    for table,body in CREATE_TABLE_PATTERN.findall(sql):
+        parents = list(dict.fromkeys(p for p in REFERENCES_PATTERN.findall(body) if p != table))
+        if parents:
+            references[table] = parents
+    return references
+
+
+def create_statements(schema_file=SCHEMA_FILE):
+    """{table:CREATE TABLE statement} of the database schema - with its keys, indexes & foreign keys"""
+    with open(schema_file) as f:
+        sql = f.read()
+    return {match.group(1):match.group(0) for match in CREATE_STATEMENT_PATTERN.finditer(sql)}
+
+
+def schema_table(source,db_table):
+    """Schema name of a processed table - '<source>_human_<table>'"""
+    return f"{source}_human_{db_table}"
+
+
+def load_dependencies(source,db_table,references):
+    """Processed tables of <source> that <db_table> references, by their load names"""
+    prefix = schema_table(source,'')
+    return [p[len(prefix):] for p in references.get(schema_table(source,db_table),[]) if p.startswith(prefix)]
+
+
+class stageScheduler:
+    def __init__(self,limits=None):
+        self.limits = dict(limits or cfg.PIPELINE_LIMITS)
+        self.stages = {}
+        self.results = {}
+        self.errors = {}
+        self._running = {resource:0 for resource in self.limits}
+        self._lock = threading.Lock()
+
+
+    def add(self,name,func,*args,resource='cpu',deps=(),expands=False):
+        """Adds stage <name> - func(*args), run on <resource> once every stage in <deps> has finished. Stages
+        may be added while the scheduler runs (from an expanding stage)."""
+        if resource not in self.limits:
+            raise ValueError(f"Unknown resource class {resource} - one of {list(self.limits)}")
+
+        with self._lock:
+            if name in self.stages:
+                raise ValueError(f"Stage {name} already added")
+            self.stages[name] = {'func':func,'args':args,'resource':resource,'deps':list(deps),
+                                 'expands':expands,'status':'pending'}
+
+
+    def _state(self,name):
+        """'done', 'failed', or 'waiting' for a dependency <name>"""
+        stage = self.stages.get(name)
+        if stage is None:
+            # Not (yet) added - can only still appear while an expanding stage hasn't finished
+            open_expands = any(s['expands'] and s['status'] in ('pending','running') for s in self.stages.values())
+            return 'waiting' if open_expands else 'done'
+        if stage['status'] in ('done','failed'):
+            return stage['status']
+        return 'waiting'
+
+
+    def _ready_stages(self):
+        """Pending stages whose dependencies have all finished - stages behind a failed one fail too"""
+        ready = []
+        for name,stage in self.stages.items():
+            if stage['status'] != 'pending':
+                continue
+            states = {dep:self._state(dep) for dep in stage['deps']}
+            failed = [dep for dep,state in states.items() if state == 'failed']
+            if failed:
+                stage['status'] = 'failed'
+                self.errors[name] = f'Skipped: {failed[0]} failed'
+            elif all(state == 'done' for state in states.values()):
+                ready.append(name)
+        return ready
+
+
+    def _finish(self,name,future):
+        stage = self.stages[name]
+        self._running[stage['resource']] -= 1
+        try:
+            self.results[name] = future.result()
+            stage['status'] = 'done'
+        except Exception as e:
+            stage['status'] = 'failed'
+            self.errors[name] = f'{type(e).__name__}: {e}'
+            print(f"Stage {name} failed:\n{''.join(traceback.format_exception(e))}")
+
+
+    def run(self):
+        """Runs every stage, each as soon as its dependencies are done & its resource has a free slot - returns
+        ({stage:result}, {stage:error message})"""
+        futures = {}
+        with ThreadPoolExecutor(max_workers=sum(self.limits.values())) as executor:
+            while True:
+                with self._lock:
+                    # Failed dependencies can cascade - settle them before submitting
+                    while True:
+                        n_failed = len(self.errors)
+                        ready = self._ready_stages()
+                        if len(self.errors) == n_failed:
+                            break
+
+                    for name in ready:
+                        stage = self.stages[name]
+                        if self._running[stage['resource']] >= self.limits[stage['resource']]:
+                            continue
+                        self._running[stage['resource']] += 1
+                        stage['status'] = 'running'
+                        futures[executor.submit(stage['func'],*stage['args'])] = name
+
+                if not futures:
+                    break
+
+                done, _ = wait(futures,return_when=FIRST_COMPLETED)
+                with self._lock:
+                    for future in done:
+                        self._finish(futures.pop(future),future)
+
+            # Anything left pending waits on a stage that never finished (a dependency cycle)
+            for name,stage in self.stages.items():
+                if stage['status'] == 'pending':
+                    stage['status'] = 'failed'
+                    self.errors[name] = f"Unresolved dependencies: {stage['deps']}"
+
+        return self.results, self.errors
@@ -0,0 +1,94 @@
+import importlib
+
+import pandas as pd
+
+
+################################################################################################################
+# Table Schemas
+################################################################################################################
+
+"""
+Each source's utils module declares a typed schema for its tables next to db_table_dict, in table_schemas:
+
+    table_schemas = {
+        'raw':{<db_table>:{'columns':[...],'dtypes':{...}}},
+        'processed':{<db_table>:{'dtypes':{...}}}
+    }
+
+'columns' lists the columns kept from a (raw) file - any other column is never parsed. 'dtypes' maps a column
+to its dtype: low-cardinality text (GENE_TYPE, CHROMOSOME, EVIDENCE, CATEGORY, LOOKUP_SOURCE) is 'category',
+positions & counts that may be missing (CHRSTART, CHRSTOP, EXONCOUNT) are the nullable 'Int64', IDs are
+'int64' (see hgd_ids.py) & text is str. Column names are upper case & matched case-insensitively, as raw files
+keep the source's spelling (e.g. '#tax_id', 'GeneID').
+
+Readers parse each column straight into its declared dtype (read_csv) & writers cast frames before they're
+saved or handed on (apply_schema), so a table has the same dtypes in memory & when re-read from a flat file,
+& pandas never has to infer types from the data. Columns a schema does not declare are read as str.
+"""
+
+SOURCE_UTILS = {'kegg':'humangenomedatabase.source_pipes.kegg_pipe.kegg_utils',
+                'ncbi':'humangenomedatabase.source_pipes.ncbi_pipe.ncbi_utils',
+                'reactome':'humangenomedatabase.source_pipes.reactome_pipe.reactome_utils'}
+
+
+def get_schema(source,db_table,table_type):
+    """Declared schema of a <source> table, or None when there is none"""
+    if source not in SOURCE_UTILS:
+        return None
+    # Imported on use - the source utils modules import the shared utils themselves
+    table_schemas = getattr(importlib.import_module(SOURCE_UTILS[source]),'table_schemas',{})
+    return table_schemas.get(table_type,{}).get(db_table)
+
+
+def read_kwargs(schema,header,raw=False):
+    """usecols & dtype arguments of pd.read_csv for a file with <header> columns. Raw text is kept as published
+    (<raw>): '' & 'NA' are values, not missing - only columns of a nullable dtype ('Int64') read '' as missing"""
+    kept = schema.get('columns')
+    dtypes = schema.get('dtypes',{})
+
+    usecols = [c for c in header if kept is None or c.upper() in kept]
+    kwargs = {'usecols':usecols,'dtype':{c:dtypes.get(c.upper(),str) for c in usecols}}
+    if raw:
+        nullable = [c for c,dtype in kwargs['dtype'].items() if dtype == 'Int64']
+        kwargs.update(keep_default_na=False,na_values={c:[''] for c in nullable})
+    return kwargs
+
+
+def read_csv(file_path,schema,raw=False,**kwargs):
+    """pd.read_csv of a table's flat file with its schema - the header is read first, then only the kept
+    columns are parsed, each into its declared dtype (see read_kwargs for <raw> tables). Without a schema this
+    is a plain pd.read_csv. With a chunksize, a reader of typed chunks is returned."""
+    if schema is None:
+        return pd.read_csv(file_path,**kwargs)
+
+    header_kwargs = {k:v for k,v in kwargs.items() if k != 'chunksize'}
+    header = pd.read_csv(file_path,nrows=0,**header_kwargs).columns
+    if hasattr(file_path,'seek'):
+        file_path.seek(0)
+    return pd.read_csv(file_path,**read_kwargs(schema,header,raw),**kwargs)
+
+
+def apply_schema(df,schema):
+    """<df> cut to the schema's kept columns, with declared columns cast to their dtypes (<df> itself is not
+    changed). Declared columns missing from <df> are skipped."""
+    if schema is None:
+        return df
+
+    kept = schema.get('columns')
+    if kept is not None and not all(c.upper() in kept for c in df.columns):
+        df = df[[c for c in df.columns if c.upper() in kept]]
+
+    casts = {}
+    for c in df.columns:
+        dtype = schema.get('dtypes',{}).get(c.upper())
+        if dtype is None or dtype is str or df[c].dtype == dtype:
+            continue
+        if dtype == 'Int64' and df[c].dtype == object:
+            # Numbers held as text (e.g. parsed from XML) - '' is missing
+            casts[c] = pd.to_numeric(df[c]).astype('Int64')
+        else:
+            casts[c] = df[c].astype(dtype)
+
+    if not casts:
+        return df
+    return df.assign(**casts)
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import shutil
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from humangenomedatabase.configs import auto_config as cfg
+
+
+################################################################################################################
+# Checkpointed Shards
+################################################################################################################
+
+"""
+A long, batched extract (e.g. Entrez summaries, pulled 5000 records at a time) is written batch-by-batch as
+shard files next to a manifest, so a failed run can pick up where it stopped instead of starting over:
+
+    <shard_dir>/<db_table>/manifest.json
+    <shard_dir>/<db_table>/shard_<offset>.pkl
+
+The manifest holds the parameters of the pull (for Entrez: search term, WebEnv, QueryKey, record count,
+batch size) & the offsets of completed shards. A shard is only recorded as completed once its file is fully
+written, & both files are replaced atomically, so a crash never leaves a half-written shard marked as done.
+
+The manifest's path is handed on as the table's raw data - readers load the shards lazily (iter_shards), in
+offset order.
+"""
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def is_manifest(raw_data):
+    """Whether a raw data value is a shard manifest path (rather than a DataFrame or flat file)"""
+    return isinstance(raw_data,(str,Path)) and str(raw_data).endswith(MANIFEST_NAME)
+
+
+class shardStore:
+    def __init__(self,db_table,shard_dir=None):
+        self.db_table = db_table
+        self.dir = Path(shard_dir or cfg.SHARD_DIR) / db_table
+        self.manifest_path = self.dir / MANIFEST_NAME
+        self._lock = threading.Lock()
+        self.manifest = self._read_manifest()
+
+
+    @classmethod
+    def from_manifest(cls,manifest_path):
+        manifest_path = Path(manifest_path)
+        return cls(manifest_path.parent.name,shard_dir=manifest_path.parent.parent)
+
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError,ValueError):
+            return None
+
+
+    def _write_manifest(self):
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path,'w') as f:
+            json.dump(self.manifest,f,indent=2)
+        os.replace(tmp_path,self.manifest_path)
+
+
+    ############################################################################################################
+    # Pull state
+    ############################################################################################################
+
+    def start(self,count,batch_size,**params):
+        """Begins a new pull of <count> records in <batch_size> shards - drops any previous shards"""
+        with self._lock:
+            if self.dir.exists():
+                shutil.rmtree(self.dir)
+            self.dir.mkdir(parents=True, exist_ok=True)
+            self.manifest = {'db_table':self.db_table,
+                             'count':count,
+                             'batch_size':batch_size,
+                             'params':params,
+                             'started_at':time.time(),
+                             'updated_at':time.time(),
+                             'completed':{}}
+            self._write_manifest()
+
+
+    def update_params(self,**params):
+        """Updates pull parameters (e.g. a renewed WebEnv) - completed shards are kept"""
+        with self._lock:
+            self.manifest['params'].update(params)
+            self.manifest['updated_at'] = time.time()
+            self._write_manifest()
+
+
+    def offsets(self):
+        return list(range(0,self.manifest['count'],self.manifest['batch_size']))
+
+
+    def missing_offsets(self):
+        return [o for o in self.offsets() if str(o) not in self.manifest['completed']]
+
+
+    @property
+    def complete(self):
+        return self.manifest is not None and not self.missing_offsets()
+
+
+    ############################################################################################################
+    # Shard files
+    ############################################################################################################
+
+    def shard_path(self,offset):
+        return self.dir / f"shard_{offset:010d}.pkl"
+
+
+    def write_shard(self,offset,df):
+        """Saves the shard for <offset> & marks it completed"""
+        shard_path = self.shard_path(offset)
+        tmp_path = f"{shard_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path,shard_path)
+
+        with self._lock:
+            self.manifest['completed'][str(offset)] = {'file':shard_path.name,'rows':len(df)}
+            self.manifest['updated_at'] = time.time()
+            self._write_manifest()
+
+
+    def iter_shards(self):
+        """Completed shards as DataFrames, loaded one at a time in offset order"""
+        for offset in sorted(int(o) for o in self.manifest['completed']):
+            yield pd.read_pickle(self.dir / self.manifest['completed'][str(offset)]['file'])
+
+
+    def read_all(self):
+        """All completed shards as one DataFrame (concatenated once)"""
+        shards = list(self.iter_shards())
+        if not shards:
+            return pd.DataFrame()
+        return pd.concat(shards,ignore_index=True)
@@ -0,0 +1,153 @@
+import os
+import inspect
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import humangenomedatabase.utils.hgd_shards as hgdshards
+import humangenomedatabase.utils.hgd_parallel as hgdpar
+from humangenomedatabase.configs import auto_config as cfg
+
+
+################################################################################################################
+# Row-Sharded Transforms
+################################################################################################################
+
+"""
+The largest tables (snp_summary, gene_info, gene2go) are processed row by row - every output row, lookup rows
+included, comes from one raw row & nothing is sorted, grouped or counted across rows. Their processing function
+can run on slices of the raw rows side by side & the outputs be joined back together:
+
+    proc_data_dict = hgd_split.split_transform(proc_func,raw_data)
+
+The raw rows are cut into shards of TRANSFORM_SHARD_ROWS rows, each written to a file, & a pool of NCPU_MAX
+worker processes (spawned, like utils/hgd_parallel.py) each read a shard file, run the processing function &
+write every output table to a file of its own. Only file paths go between processes - no DataFrame is pickled
+through the pool. Raw data is split without being held whole:
+
+    - a checkpointed (Entrez) pull: its shard files (utils/hgd_shards.py) are grouped into shards & read by
+      the workers themselves
+    - a flat file: read TRANSFORM_SHARD_ROWS rows at a time (see hgd_utils.load_data)
+    - a DataFrame (IN_MEM): cut into slices
+
+Without a pool (one worker process, or inside a table worker), a checkpointed pull is still processed a shard
+at a time, one after another (serial_transform), rather than read whole.
+
+The merge is the deterministic final step: each output table is concatenated in shard order with a new range
+index, which gives the same table as processing the raw rows at once. Tables opt in with 'row_local' in their
+source's db_table_dict - a table whose processing isn't row-local (sorts, first-per-key, cumulative counts)
+must not. Inside a table worker of a parallel refresh (utils/hgd_parallel.py) tables get no pool, as the
+table workers already use the NCPU_MAX processes - a pool in each would start up to NCPU_MAX^2.
+"""
+
+
+def use_split(db_params):
+    """Whether a table's transform is sharded - row-local tables, with more than one worker process (outside
+    of table workers)"""
+    return cfg.NCPU_MAX > 1 and db_params.get('row_local',False) and not hgdpar.in_table_worker()
+
+
+def read_shard(files):
+    """A shard's raw rows, from its file(s)"""
+    df = pd.concat([pd.read_pickle(f) for f in files],ignore_index=True)
+    df.columns = [c.upper() for c in df.columns]
+    return df
+
+
+def transform_shard(proc_func,files,out_dir,shard_no):
+    """Worker-process task - processes one shard, returning {db_table:path} of its output tables"""
+    paths = {}
+    for db_table,df in proc_func(read_shard(files)).items():
+        paths[db_table] = os.path.join(out_dir,f'{db_table}_{shard_no:06d}.pkl')
+        df.to_pickle(paths[db_table])
+    return paths
+
+
+def iter_raw_chunks(raw_data,shard_rows):
+    """Raw rows of a DataFrame or of a chunked reader (e.g. hgd_utils.load_data with a chunksize), <shard_rows>
+    at a time"""
+    if isinstance(raw_data,pd.DataFrame):
+        for start in range(0,len(raw_data),shard_rows):
+            yield raw_data.iloc[start:start + shard_rows]
+    else:
+        yield from raw_data
+
+
+def manifest_shards(manifest_path,shard_rows=None):
+    """Shard files of a checkpointed pull grouped into shards of about <shard_rows> rows - the file list of each
+    shard, in offset order"""
+    shard_rows = shard_rows or cfg.TRANSFORM_SHARD_ROWS
+    store = hgdshards.shardStore.from_manifest(manifest_path)
+    shards, rows = [[]], 0
+    for offset in sorted(int(o) for o in store.manifest['completed']):
+        shard = store.manifest['completed'][str(offset)]
+        if rows >= shard_rows:
+            shards, rows = shards + [[]], 0
+        shards[-1].append(str(store.dir / shard['file']))
+        rows += shard['rows']
+    return [files for files in shards if files]
+
+
+def write_shards(raw_data,shard_dir,shard_rows=None):
+    """Splits raw data into shards - returns the file list of each shard"""
+    shard_rows = shard_rows or cfg.TRANSFORM_SHARD_ROWS
+
+    if hgdshards.is_manifest(raw_data):
+        # Checkpoint shards are files already
+        return manifest_shards(raw_data,shard_rows)
+
+    shards = []
+    for shard_no,df in enumerate(iter_raw_chunks(raw_data,shard_rows)):
+        if df.empty:
+            continue
+        path = os.path.join(shard_dir,f'raw_{shard_no:06d}.pkl')
+        df.to_pickle(path)
+        shards.append([path])
+    return shards
+
+
+def merge_outputs(shard_paths):
+    """Output tables of all shards, each concatenated in shard order (with a new range index)"""
+    db_tables = list(dict.fromkeys(t for paths in shard_paths for t in paths))
+    return {db_table:pd.concat([pd.read_pickle(paths[db_table]) for paths in shard_paths if db_table in paths],
+                               ignore_index=True)
+            for db_table in db_tables}
+
+
+def serial_transform(proc_func,manifest_path,shard_rows=None):
+    """proc_func (a row-local processing function) run on the shards of a checkpointed pull one after another,
+    in this process - only one shard's raw rows are in memory at a time. Returns its {db_table:DataFrame},
+    merged like split_transform's"""
+    outputs = [proc_func(read_shard(files)) for files in manifest_shards(manifest_path,shard_rows)]
+    if not outputs:
+        raise ValueError("No raw rows to process")
+
+    db_tables = list(dict.fromkeys(t for output in outputs for t in output))
+    return {db_table:pd.concat([output[db_table] for output in outputs if db_table in output],ignore_index=True)
+            for db_table in db_tables}
+
+
+def split_transform(proc_func,raw_data,shard_rows=None,workers=None):
+    """proc_func (a row-local processing function) run on shards of <raw_data> in worker processes - returns
+    its {db_table:DataFrame}, the same as proc_func(raw_data). Workers get the module-level function a wrapper
+    (e.g. profiling's, utils/hgd_profiling.py) wraps, as a wrapper can't be pickled"""
+    with tempfile.TemporaryDirectory(prefix='hgd_split_',dir=cfg.TRANSFORM_SHARD_DIR) as shard_dir:
+        shards = write_shards(raw_data,shard_dir,shard_rows)
+        if not shards:
+            raise ValueError("No raw rows to process")
+        if len(shards) == 1:
+            # Not worth a pool
+            return proc_func(read_shard(shards[0]))
+
+        n_workers = max(1,min(workers or cfg.NCPU_MAX,len(shards)))
+        print(f"Processing {len(shards)} shards with {n_workers} processes")
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=n_workers,mp_context=context) as executor:
+            futures = [executor.submit(transform_shard,inspect.unwrap(proc_func),files,shard_dir,shard_no)
+                       for shard_no,files in enumerate(shards)]
+            # Any failed shard fails the table
+            shard_paths = [future.result() for future in futures]
+
+        return merge_outputs(shard_paths)
@@ -4,6 +4,7 @@ import numpy as np
 from pathlib import Path
 
 from humangenomedatabase.configs import auto_config as cfg
+import humangenomedatabase.utils.hgd_schema as hgdschema
 
 
 def validate_db_type(db_table,source_dbs):
@@ -14,17 +15,25 @@ def validate_db_type(db_table,source_dbs):
         raise Exception(f"Invalid Database ({db_table}). Please Try one of: {source_dbs}")
 
 
-def load_data(db_table,table_type,source):
+def data_path(db_table,table_type,source):
+    """Local path of a table's flat file (see load_data & save_data)"""
+    return os.path.join(os.getcwd(),f"data/{table_type}/{source}/{source}_human_{db_table}.csv")
+
+
+def load_data(db_table,table_type,source,chunksize=None):
     """Loads data from flat-file to Pandas DF, from either local
-    or AWS-S3 location (configured in config.py)"""
+    or AWS-S3 location (configured in config.py), typed with the
+    table's schema (see utils/hgd_schema.py). With a chunksize,
+    a reader of <chunksize>-row DataFrames is returned instead"""
     
+    schema = hgdschema.get_schema(source,db_table,table_type)
     filename = f"{source}_human_{db_table}.csv"
     file_path = f"data/{table_type}/{source}/{filename}"
 
     if cfg.SAVELOC:
         # Load from local dir
         base_dir = os.getcwd()
-        return pd.read_csv(os.path.join(base_dir, file_path))
+        return hgdschema.read_csv(os.path.join(base_dir, file_path),schema,table_type == 'raw',chunksize=chunksize)
     else:
          # Load from S3
         bucket = cfg.S3_BUCKET
@@ -32,12 +41,15 @@ def load_data(db_table,table_type,source):
         if db_table in ['gene2go','gene_summary','snp_summary']:
             file_path = file_path.replace('csv','gz')
             
-        return pd.read_csv(file_path)
+        return hgdschema.read_csv(file_path,schema,table_type == 'raw',chunksize=chunksize)
 
 
 def save_data(df,db_table,source,table_type):
     """Saves data from Pandas DF, to flat file in either local
-    or AWS-S3 location (configured in config.py)"""
+    or AWS-S3 location (configured in config.py), cast to the
+    table's schema first (see utils/hgd_schema.py)"""
+
+    df = hgdschema.apply_schema(df,hgdschema.get_schema(source,db_table,table_type))
 
     file_name = f"{source}_human_{db_table}.csv"
     file_path = f"data/{table_type}/{source}/"
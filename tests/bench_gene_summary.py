@@ -0,0 +1,73 @@
+import io
+import time
+import argparse
+
+import pandas as pd
+
+import humangenomedatabase.source_pipes.ncbi_pipe.ncbi_utils as ncbi
+from tests.hgd_tests import legacy_process_gene_summary
+
+
+# Benchmark: gene-summary pull - ESummary parsing (nested fields flattened in the same pass) & processing,
+# previous per-row version vs. column-level version. Defaults to the size of a full human pull
+# Kept with the tests, whose row-by-row reference version it times: python -m tests.bench_gene_summary
+parser = argparse.ArgumentParser(description='Gene summary transform benchmark')
+parser.add_argument('-n','--n_rows',required=False,type=int,default=190000,\
+                    help='Number of synthetic gene summaries')
+args = vars(parser.parse_args())
+
+CHROMOSOMES = [str(c) for c in range(1,23)] + ['X','Y','MT','X, Y','Un','']
+
+
+def synthetic_record(i):
+    # Shaped like ESummary gene records (incl. genes without placement, aliases, MIM ids or official names)
+    chromosome = CHROMOSOMES[i%len(CHROMOSOMES)]
+    symbol = f'MT-S{i}' if chromosome == 'MT' else (f'S{i}' if i%4 else '')
+    placement = (f'<GenomicInfoType><ChrLoc>{chromosome}</ChrLoc><ChrAccVer>NC_0000{i%24}.11</ChrAccVer>'
+                 f'<ChrStart>{i*1000}</ChrStart><ChrStop>{i*1000+900}</ChrStop><ExonCount>{i%30}</ExonCount>'
+                 f'</GenomicInfoType>') if i%7 else ''
+    return (f'<DocumentSummary uid="{i+1}"><Name>S{i}</Name><Description>gene {i}</Description><Status>0</Status>'
+            f'<CurrentID>0</CurrentID><Chromosome>{chromosome}</Chromosome><GeneticSource>genomic</GeneticSource>'
+            f'<MapLocation>{chromosome}p1</MapLocation>'
+            f'<OtherAliases>{"A%d, B%d" % (i,i) if i%3 else ""}</OtherAliases>'
+            f'<OtherDesignations>designation {i}</OtherDesignations><NomenclatureSymbol>{symbol}</NomenclatureSymbol>'
+            f'<NomenclatureName>{"name %d" % i if symbol else ""}</NomenclatureName>'
+            f'<NomenclatureStatus>{"Official" if symbol else ""}</NomenclatureStatus>'
+            f'<Mim>{"<int>%d</int>" % (100000+i) if i%5 == 0 else ""}</Mim>'
+            f'<GenomicInfo>{placement}</GenomicInfo><GeneWeight>{i%5000}</GeneWeight><Summary>summary {i}</Summary>'
+            f'<ChrSort>{chromosome}</ChrSort><ChrStart>{i*1000}</ChrStart>'
+            f'<Organism><ScientificName>Homo sapiens</ScientificName><CommonName>human</CommonName>'
+            f'<TaxID>9606</TaxID></Organism>'
+            f'<LocationHist><LocationHistType><AnnotationRelease>110</AnnotationRelease>'
+            f'<ChrStart>{i*1000}</ChrStart></LocationHistType></LocationHist></DocumentSummary>')
+
+
+def best_time(func,raw_df,repeat=3):
+    # Best of <repeat> runs, each on a fresh copy (processing functions modify their input)
+    times = []
+    for _ in range(repeat):
+        df = raw_df.copy()
+        start = time.perf_counter()
+        result = func(df)
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+response = ('<eSummaryResult><DocumentSummarySet status="OK">' +
+            ''.join(synthetic_record(i) for i in range(args['n_rows'])) +
+            '</DocumentSummarySet></eSummaryResult>').encode()
+
+print(f"Parsing & processing {args['n_rows']} gene summaries ({len(response)/2**20:.0f} MiB of XML)")
+start = time.perf_counter()
+raw_df = pd.DataFrame(ncbi.parse_esummary_xml(io.BytesIO(response)))
+raw_df.columns = [c.upper() for c in raw_df.columns]
+print(f"       parse: {time.perf_counter()-start:8.3f} s   ({len(raw_df.columns)} flat columns)")
+
+expected, legacy_time = best_time(legacy_process_gene_summary,raw_df)
+result, vector_time = best_time(ncbi.process_gene_summary,raw_df)
+
+for key in expected:
+    pd.testing.assert_frame_equal(result[key],expected[key])
+print(f"gene_summary: row-by-row {legacy_time:8.3f} s   vectorized {vector_time:8.3f} s   "
+      f"({legacy_time/vector_time:5.1f}x)")
+print("Outputs identical")
@@ -0,0 +1,64 @@
+import io
+import time
+import tracemalloc
+import argparse
+
+import pandas as pd
+
+import humangenomedatabase.source_pipes.kegg_pipe.kegg_utils as kegg
+
+
+# Benchmark: KEGG TSV parsing - previous str/list-of-lists parser vs. C-reader parser
+# Kept with the tests, like the other benchmarks: python -m tests.bench_kegg_parse
+parser = argparse.ArgumentParser(description='KEGG response parsing benchmark')
+parser.add_argument('-n','--n_rows',required=False,type=int,default=500000,\
+                    help='Number of synthetic link/hsa/pathway rows to parse')
+args = vars(parser.parse_args())
+
+
+def legacy_api_download_to_df(response_data,columns):
+    df = pd.DataFrame([x.split('\t') for x in response_data.split('\n')])
+    df = df.iloc[:-1,:]
+    df.columns = columns
+
+    return df
+
+
+def run_legacy(content,columns):
+    # Previous extract path decoded the full response first
+    return legacy_api_download_to_df(content.decode(),columns)
+
+
+def run_bytes(content,columns):
+    return kegg.api_download_to_df(content,columns)
+
+
+def run_stream(content,columns):
+    # Stand-in for an HTTP response body read incrementally
+    return pd.concat(kegg.api_download_to_df(io.BufferedReader(io.BytesIO(content)),columns,chunksize=50000),
+                     ignore_index=True)
+
+
+def measure(func,content,columns):
+    tracemalloc.start()
+    start = time.perf_counter()
+    df = func(content,columns)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return df, elapsed, peak
+
+
+columns = kegg.db_table_dict['pathway_gene']['columns']
+content = b''.join(f'path:hsa{i%400:05d}\thsa:{i}\n'.encode() for i in range(args['n_rows']))
+print(f"Parsing {args['n_rows']} rows ({len(content)/1024/1024:.1f} MiB)")
+
+results = {}
+for name,func in [('legacy',run_legacy),('bytes',run_bytes),('stream',run_stream)]:
+    df, elapsed, peak = measure(func,content,columns)
+    results[name] = df
+    print(f"{name:>8}: {elapsed:8.3f} s   peak {peak/1024/1024:8.1f} MiB")
+
+for name in ['bytes','stream']:
+    pd.testing.assert_frame_equal(results[name],results['legacy'])
+print("Outputs identical")
@@ -0,0 +1,62 @@
+import time
+import argparse
+
+import pandas as pd
+
+import humangenomedatabase.source_pipes.kegg_pipe.kegg_utils as kegg
+import humangenomedatabase.utils.hgd_ids as hgdids
+from tests.hgd_tests import legacy_proc_funcs
+
+
+# Benchmark: KEGG processing functions - previous row-by-row (.apply) versions vs. vectorized versions
+# Kept with the tests, whose row-by-row reference versions it times: python -m tests.bench_kegg_transform
+parser = argparse.ArgumentParser(description='KEGG transform benchmark')
+parser.add_argument('-n','--n_rows',required=False,type=int,default=200000,\
+                    help='Number of synthetic rows per table')
+args = vars(parser.parse_args())
+
+
+def synthetic_raw(db_table,n):
+    # Shaped like the KEGG list endpoints (incl. complement/MT/unplaced genes & multi-name diseases)
+    if db_table == 'pathway':
+        rows = [(f'hsa{i:05d}',f'Pathway {i} - Homo sapiens (human)') for i in range(n)]
+    elif db_table == 'gene':
+        positions = [lambda i: f'{i%22+1}:{i}..{i+900}',lambda i: f'{i%22+1}:complement({i}..{i+900})',
+                     lambda i: ['Un','X; Y','19q13.43','MT:complement(9207..9990)'][i%4]]
+        rows = [(f'hsa:{i}','CDS',positions[0 if i%50 else 2](i) if i%3 else positions[1](i),
+                 f'SYM{i}, ALIAS{i}; gene {i} name' if i%20 else f'LOC{i}')
+                for i in range(n)]
+    elif db_table == 'disease':
+        rows = [(f'H{i:05d}',f'Disease {i}; Alternate name {i}; Abbrev{i}') for i in range(n)]
+    elif db_table == 'variant':
+        rows = [(f'hsa_var_{i}v{i%4}',f'GENE{i} mutation') for i in range(n)]
+    else:
+        rows = [(f'M{i:05d}',f'Module {i} (alt {i}), class {i}') for i in range(n)]
+
+    columns = [c.upper() for c in kegg.db_table_dict[db_table]['columns']]
+    return pd.DataFrame(rows,columns=columns)
+
+
+def best_time(func,raw_df,repeat=3):
+    # Best of <repeat> runs, each on a fresh copy (processing functions modify their input)
+    times = []
+    for _ in range(repeat):
+        df = raw_df.copy()
+        start = time.perf_counter()
+        result = func(df)
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+print(f"Processing {args['n_rows']} rows per table")
+for db_table,legacy_func in legacy_proc_funcs.items():
+    raw_df = synthetic_raw(db_table,args['n_rows'])
+    expected, legacy_time = best_time(legacy_func,raw_df)
+    result, vector_time = best_time(kegg.db_table_dict[db_table]['proc_func'],raw_df)
+
+    for key in expected:
+        pd.testing.assert_frame_equal(hgdids.decode_ids(result[key]),expected[key])
+    print(f"{db_table:>8}: row-by-row {legacy_time:8.3f} s   vectorized {vector_time:8.3f} s   "
+          f"({legacy_time/vector_time:5.1f}x)")
+
+print("Outputs identical")
@@ -0,0 +1,68 @@
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import humangenomedatabase.source_pipes.ncbi_pipe.ncbi_utils as ncbi
+from tests.hgd_tests import legacy_process_snp_summary
+
+
+# Benchmark: SNP-summary processing - previous per-row split/explode version vs. column-level version
+# Kept with the tests, whose row-by-row reference version it times: python -m tests.bench_snp_transform
+parser = argparse.ArgumentParser(description='SNP summary transform benchmark')
+parser.add_argument('-n','--n_rows',required=False,type=int,default=1000000,\
+                    help='Number of synthetic SNP summaries')
+args = vars(parser.parse_args())
+
+
+def synthetic_raw(n):
+    # Shaped like flattened ESummary shards (incl. SNPs without genes, clinical significance or SS ids)
+    i = np.arange(n)
+    genes = np.where(i%3==1,(i%20000).astype(str),
+                     np.char.add(np.char.add((i%20000).astype(str),','),(i%7000+100000).astype(str))).astype(object)
+    genes[i%3==0] = np.NaN
+    fxn = np.array(['missense_variant','coding_sequence_variant,missense_variant','','intron_variant'],
+                   dtype=object)[i%4]
+    ss = np.char.add(np.char.add('ss',i.astype(str)),np.where(i%2==0,'',np.char.add(',ss',(i+1).astype(str))))
+    return pd.DataFrame({'UID':i.astype(str),
+                         'SNP_ID':i.astype(str),
+                         'ALLELE_ORIGIN':'',
+                         'GLOBAL_MAFS_STUDY':'1000Genomes,GnomAD',
+                         'GLOBAL_MAFS_FREQ':'T=0.012,T=0.004',
+                         'CLINICAL_SIGNIFICANCE':np.where(i%5==0,'pathogenic',''),
+                         'GENES_NAME':np.where(i%3==0,None,'GENE'),
+                         'GENES_GENE_ID':genes,
+                         'CHR':(i%22+1).astype(str),
+                         'FXN_CLASS':fxn,
+                         'DOCSUM':'HGVS=NC_000011.10:g.5227002T>A|SEQ=[T/A]|LEN=1',
+                         'DOCSUM_HGVS':'NC_000011.10:g.5227002T>A',
+                         'DOCSUM_SEQ':'[T/A]',
+                         'DOCSUM_LEN':'1',
+                         'TAX_ID':'9606',
+                         'SS':ss.astype(object),
+                         'CHRPOS':np.char.add('11:',i.astype(str)),
+                         'SNP_ID_SORT':np.char.zfill(i.astype(str),10)})
+
+
+def best_time(func,raw_df,repeat=3):
+    # Best of <repeat> runs, each on a fresh copy (processing functions modify their input)
+    times = []
+    for _ in range(repeat):
+        df = raw_df.copy()
+        start = time.perf_counter()
+        result = func(df)
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+print(f"Processing {args['n_rows']} SNP summaries")
+raw_df = synthetic_raw(args['n_rows'])
+expected, legacy_time = best_time(legacy_process_snp_summary,raw_df)
+result, vector_time = best_time(ncbi.process_snp_summary,raw_df)
+
+for key in expected:
+    pd.testing.assert_frame_equal(result[key],expected[key])
+print(f"snp_summary: row-by-row {legacy_time:8.3f} s   vectorized {vector_time:8.3f} s   "
+      f"({legacy_time/vector_time:5.1f}x)")
+print("Outputs identical")
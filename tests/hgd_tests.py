@@ -0,0 +1,2141 @@
+import io
+import os
+import gzip
+import json
+import hashlib
+import logging
+import logging.handlers
+import functools
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+import tracemalloc
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+
+import numpy as np
+import pandas as pd
+
+import humangenomedatabase.utils.hgd_http as hgdhttp
+import humangenomedatabase.utils.hgd_cache as hgdcache
+import humangenomedatabase.utils.hgd_ids as hgdids
+import humangenomedatabase.utils.hgd_shards as hgdshards
+import humangenomedatabase.utils.hgd_entrez as hgdentrez
+import humangenomedatabase.utils.hgd_schema as hgdschema
+import humangenomedatabase.utils.hgd_normalize as hgdnorm
+import humangenomedatabase.utils.hgd_utils as hgd
+import humangenomedatabase.utils.hgd_logging as hgdlog
+import humangenomedatabase.utils.hgd_metrics as hgdmet
+import humangenomedatabase.utils.hgd_profiling as hgdprof
+import humangenomedatabase.utils.hgd_parallel as hgdpar
+import humangenomedatabase.utils.hgd_split as hgdsplit
+import humangenomedatabase.utils.hgd_scheduler as hgdsched
+import humangenomedatabase.utils.hgd_delta as hgddelta
+import humangenomedatabase.utils.hgd_manifest as hgdmanifest
+import humangenomedatabase.source_pipes.kegg_pipe.kegg_utils as kegg_utils
+import humangenomedatabase.source_pipes.ncbi_pipe.ncbi_utils as ncbi_utils
+import humangenomedatabase.source_pipes.ncbi_pipe.dbsnp_utils as dbsnp_utils
+import humangenomedatabase.source_pipes.reactome_pipe.reactome_utils as reactome_utils
+
+try:
+    # The pipe & its MySQL writer need the full build environment (pyspark, sqlalchemy, bcpandas)
+    import humangenomedatabase.hgd_pipe as hgdp
+    import humangenomedatabase.utils.hgd_mysql as hgdm
+except ImportError:
+    hgdp = hgdm = None
+
+
+################################################################################################################
+# Logging (utils/hgd_logging.py)
+################################################################################################################
+
+class loggedPipe:
+    def __init__(self,log_file_name):
+        self.log_file_name = log_file_name
+
+    @hgdlog.log
+    def transform(self,df,db_table='gene'):
+        return {db_table:df}
+
+    @hgdlog.log
+    def fail(self):
+        raise ValueError('broken table')
+
+
+class loggingTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree,self.tmp_dir,True)
+        # An existing file is logged to as-is
+        self.log_path = os.path.join(self.tmp_dir,'hgd_test.log')
+        open(self.log_path,'w').close()
+        self.addCleanup(hgdlog.shutdown_loggers)
+
+    def read_log(self):
+        # Stopping the listeners flushes every queued record to disk
+        hgdlog.shutdown_loggers()
+        with open(self.log_path) as f:
+            return f.read().splitlines()
+
+    def test_one_logger_per_file(self):
+        logger = hgdlog.get_logger(self.log_path)
+        self.assertIs(hgdlog.get_logger(self.log_path),logger)
+        self.assertIsInstance(logger.handlers[0],logging.handlers.QueueHandler)
+        self.assertEqual(len(logger.handlers),1)
+
+        other_path = os.path.join(self.tmp_dir,'other.log')
+        open(other_path,'w').close()
+        self.assertIsNot(hgdlog.get_logger(other_path),logger)
+        self.assertEqual(len([k for k in hgdlog._LISTENERS if k[0] in (self.log_path,other_path)]),2)
+
+    def test_decorator_logs_summaries(self):
+        pipe = loggedPipe(self.log_path)
+        df = pd.DataFrame({'GENE_ID':[1,2,3],'GENE_NAME':['a','b','c']})
+        self.assertIs(pipe.transform(df,db_table='pathway')['pathway'],df)
+        with self.assertRaises(ValueError):
+            pipe.fail()
+
+        begin, end, fail_begin, error = self.read_log()
+        self.assertIn(' - INFO       - hgd_tests.py - transform - Arguments: DataFrame(shape=(3, 2)',begin)
+        self.assertIn("db_table='pathway' - Begin function",begin)
+        self.assertIn("Returned: - End function {'pathway': DataFrame(shape=(3, 2)",end)
+        self.assertIn(' - fail - Arguments:  - Begin function',fail_begin)
+        self.assertIn(' - ERROR      - hgd_tests.py - fail - Exception: broken table',error)
+
+    def test_summarize_value(self):
+        df = pd.DataFrame({'GENE_ID':np.arange(4,dtype='int64')})
+        self.assertEqual(hgdlog.summarize_value(df),
+                         f"DataFrame(shape=(4, 1), dtypes={{'GENE_ID': 'int64'}}, mem={df.index.nbytes + 32}B)")
+        self.assertEqual(hgdlog.summarize_value(df['GENE_ID']),"Series(name='GENE_ID', len=4, dtype=int64, mem=32B)")
+        self.assertEqual(hgdlog.summarize_value(list(range(7))),'list(len=7)[0, 1, 2, 3, 4, +2 more]')
+        self.assertEqual(hgdlog.summarize_value({'a':None}),"{'a': None}")
+        self.assertEqual(hgdlog.summarize_value('x'*200),f"{'x'*120!r}...(len=200)")
+        self.assertEqual(hgdlog.summarize_value(threading.Lock()),'<lock>')
+
+
+################################################################################################################
+# Stage metrics (utils/hgd_metrics.py)
+################################################################################################################
+
+class metricsTests(unittest.TestCase):
+    def test_spans_nest_on_their_thread(self):
+        metrics = hgdmet.metricsRecorder('kegg_refresh')
+        with metrics.span('refresh','gene') as refresh:
+            with metrics.span('extract','gene') as extract:
+                self.assertIs(hgdmet.current_span(),extract)
+                hgdmet.record(rows_in=5,bytes_read=100)
+            with metrics.span('transform','gene') as transform:
+                hgdmet.record(rows_out=3)
+                transform.record(rows_out=2)
+
+            # Another thread's spans are top-level
+            def extract_pathway():
+                with metrics.span('extract','pathway'):
+                    pass
+            thread = threading.Thread(target=extract_pathway)
+            thread.start()
+            thread.join()
+
+        self.assertIsNone(hgdmet.current_span())
+        self.assertEqual([s.db_table for s in metrics.spans],['gene','pathway'])
+        self.assertEqual(refresh.children,[extract,transform])
+        self.assertEqual((extract.rows_in,extract.bytes_read,transform.rows_out),(5,100,5))
+        self.assertGreaterEqual(refresh.wall_s,extract.wall_s + transform.wall_s)
+        # Outside of a span
+        hgdmet.record(rows_in=1)
+
+    def test_error_status(self):
+        metrics = hgdmet.metricsRecorder()
+        with self.assertRaises(KeyError):
+            with metrics.span('refresh','gene'):
+                with metrics.span('transform','gene'):
+                    raise KeyError('GENE_ID')
+
+        refresh, transform = metrics.iter_spans()
+        self.assertEqual((refresh.status,transform.status),('error','error'))
+        self.assertEqual(transform.error,"KeyError: 'GENE_ID'")
+        self.assertEqual(metrics.table_summary()['gene']['transform']['errors'],1)
+
+    def test_report_layout(self):
+        metrics = hgdmet.metricsRecorder('ncbi_refresh')
+        for db_table,seconds in [('gene2go',0.01),('gene_info',0.03)]:
+            with metrics.span('refresh',db_table):
+                with metrics.span('load',db_table) as span:
+                    time.sleep(seconds)
+                    span.record(rows_out=10)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = metrics.write_report(os.path.join(tmp_dir,'metrics','report.json'))
+            with open(path) as f:
+                report = json.load(f)
+
+        self.assertEqual(set(report),{'run_name','run_start','run_wall_s','tables_by_wall_s','tables','spans'})
+        self.assertEqual(report['run_name'],'ncbi_refresh')
+        self.assertEqual(report['tables_by_wall_s'],['gene_info','gene2go'])
+        self.assertEqual(report['tables']['gene2go']['load']['rows_out'],10)
+        self.assertEqual(report['tables']['gene2go']['refresh']['count'],1)
+        span = report['spans'][0]
+        self.assertEqual((span['stage'],span['status'],span['children'][0]['stage']),('refresh','ok','load'))
+        self.assertEqual(set(span),set(hgdmet.stageSpan('load').to_dict()))
+
+
+################################################################################################################
+# Profiling mode (utils/hgd_profiling.py)
+################################################################################################################
+
+def profiled_work(n,seconds=0):
+    # Allocates, so the allocation report has sites to list
+    time.sleep(seconds)
+    return len([str(i) for i in range(n)])
+
+
+class profilingTests(unittest.TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree,self.profile_dir,True)
+        for name,value in [('PROFILE',True),('PROFILE_TABLES',[]),('PROFILE_DIR',self.profile_dir)]:
+            self.addCleanup(setattr,hgdprof.cfg,name,getattr(hgdprof.cfg,name))
+            setattr(hgdprof.cfg,name,value)
+
+    def test_reports_written(self):
+        table_dict = hgdprof.profile_table_dict({'gene':{'proc_func':profiled_work}},source='kegg')
+        self.assertIsNot(table_dict['gene']['proc_func'],profiled_work)
+        self.assertEqual(table_dict['gene']['proc_func'].__name__,'profiled_work')
+
+        self.assertEqual(table_dict['gene']['proc_func'](1000),1000)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.profile_dir,'kegg'))),
+                         ['gene_transform.pstats','gene_transform_alloc.txt'])
+        with open(os.path.join(self.profile_dir,'kegg','gene_transform_alloc.txt')) as f:
+            self.assertTrue(f.readline().startswith('Peak traced memory:'))
+
+    def test_profiled_transform_split_across_workers(self):
+        # The profiling wrapper can't be pickled - shard workers get the function it wraps
+        proc_func = hgdprof.profile_table_dict({'gene_info':{'proc_func':ncbi_utils.process_gene_info}},
+                                               source='ncbi')['gene_info']['proc_func']
+        schema = ncbi_utils.table_schemas['raw']['gene_info']
+        raw = hgdschema.read_csv(io.BytesIO(GENE_INFO_TSV.encode()),schema,sep='\t')
+
+        # As transform_table profiles a split table - around the whole split
+        result = hgdprof.profile_call(hgdsplit.split_transform,'ncbi','gene_info','transform',
+                                      proc_func,raw.copy(),shard_rows=2,workers=1)
+        expected = ncbi_utils.process_gene_info(raw.copy())
+        for db_table in expected:
+            pd.testing.assert_frame_equal(result[db_table],expected[db_table],check_dtype=False,check_categorical=False)
+        self.assertIn('gene_info_transform.pstats',os.listdir(os.path.join(self.profile_dir,'ncbi')))
+
+    def test_concurrent_calls_take_turns(self):
+        active, peak, lock = [0], [0], threading.Lock()
+
+        def work(n):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0],active[0])
+            result = profiled_work(n,seconds=0.05)
+            with lock:
+                active[0] -= 1
+            return result
+
+        threads = [threading.Thread(target=hgdprof.profile_call,args=(work,'ncbi',f'table{i}','extract',100))
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # tracemalloc is process-wide - one profiled call at a time, each with its own reports
+        self.assertEqual(peak[0],1)
+        self.assertEqual(len(os.listdir(os.path.join(self.profile_dir,'ncbi'))),8)
+        self.assertFalse(tracemalloc.is_tracing())
+
+
+################################################################################################################
+# Local stand-in HTTP server
+################################################################################################################
+
+class standInHandler(BaseHTTPRequestHandler):
+    """Serves <routes> of the server: {path:(status_list,body,delay_s[,etag])}. Each request to a path pops
+    the next status from its list (the last one repeats), so flaky endpoints can be simulated. Routes with an
+    etag answer a matching If-None-Match with 304."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.max_active,server.active)
+            server.hits[self.path] = server.hits.get(self.path,0) + 1
+            statuses,body,delay,*etag = server.routes.get(self.path,([404],b'',0))
+            status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+
+        time.sleep(delay)
+        if etag and self.headers.get('If-None-Match') == etag[0]:
+            status, body = 304, b''
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag',etag[0])
+        self.send_header('Content-Length',str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+        with server.lock:
+            server.active -= 1
+
+    def log_message(self,*args):
+        pass
+
+
+def start_stand_in_server(routes):
+    server = ThreadingHTTPServer(('127.0.0.1',0),standInHandler)
+    server.routes = routes
+    server.hits = {}
+    server.active = 0
+    server.max_active = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever,daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class rangeHandler(BaseHTTPRequestHandler):
+    """Serves the server's files {path:body} with an ETag & byte ranges (206, If-Range). <drops> lists per
+    path, request by request, after how many body bytes the connection is cut (None = sent in full). Ranged
+    requests take the server's <delay> seconds & the most served at once is kept in max_ranges."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path,self.headers.get('Range')))
+            body = server.files.get(self.path)
+            drops = server.drops.get(self.path,[])
+            drop = drops.pop(0) if drops else None
+
+        range_header = self.headers.get('Range')
+        if range_header:
+            with server.lock:
+                server.ranges += 1
+                server.max_ranges = max(server.max_ranges,server.ranges)
+            time.sleep(server.delay)
+            with server.lock:
+                server.ranges -= 1
+
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Length','0')
+            self.end_headers()
+            return
+
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        status, start, end = 200, 0, len(body) - 1
+        if range_header and self.headers.get('If-Range',etag) == etag:
+            first,last = range_header.replace('bytes=','').split('-')
+            status, start, end = 206, int(first), int(last) if last else len(body) - 1
+
+        self.send_response(status)
+        self.send_header('ETag',etag)
+        self.send_header('Accept-Ranges','bytes')
+        self.send_header('Content-Length',str(end - start + 1))
+        if status == 206:
+            self.send_header('Content-Range',f'bytes {start}-{end}/{len(body)}')
+        self.end_headers()
+
+        chunk = body[start:end+1]
+        if drop is not None:
+            self.wfile.write(chunk[:drop])
+            self.wfile.flush()
+            self.close_connection = True
+        else:
+            self.wfile.write(chunk)
+
+    def log_message(self,*args):
+        pass
+
+
+def start_range_server(files,drops=None):
+    server = ThreadingHTTPServer(('127.0.0.1',0),rangeHandler)
+    server.files = files
+    server.drops = drops or {}
+    server.requests = []
+    server.delay, server.ranges, server.max_ranges = 0, 0, 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever,daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+################################################################################################################
+# Extraction engine (utils/hgd_http.py)
+################################################################################################################
+
+class httpPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_fetch_all_runs_concurrently(self):
+        routes = {f'/list/{i}':([200],f'id{i}\tname{i}\n'.encode(),0.3) for i in range(10)}
+        server, base = start_stand_in_server(routes)
+        pool = hgdhttp.asyncHttpPool(max_per_host=10,retries=0)
+
+        start = time.perf_counter()
+        results = pool.fetch_all({i:f'{base}/list/{i}' for i in range(10)})
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(results[3],b'id3\tname3\n')
+        # ~ slowest request (0.3s), not the sum of all requests (3s)
+        self.assertLess(elapsed,1.5)
+        pool.close()
+        server.shutdown()
+
+    def test_per_host_limit(self):
+        routes = {f'/x/{i}':([200],b'ok',0.2) for i in range(6)}
+        server, base = start_stand_in_server(routes)
+        pool = hgdhttp.asyncHttpPool(max_per_host=2,retries=0)
+
+        pool.fetch_all({i:f'{base}/x/{i}' for i in range(6)})
+
+        self.assertLessEqual(server.max_active,2)
+        pool.close()
+        server.shutdown()
+
+    def test_retry_with_backoff(self):
+        routes = {'/flaky':([503,503,200],b'finally',0)}
+        server, base = start_stand_in_server(routes)
+        pool = hgdhttp.asyncHttpPool(retries=3,backoff=0.01)
+
+        self.assertEqual(pool.get(f'{base}/flaky').content,b'finally')
+        self.assertEqual(server.hits['/flaky'],3)
+        pool.close()
+        server.shutdown()
+
+    def test_retries_exhausted(self):
+        routes = {'/down':([500],b'',0)}
+        server, base = start_stand_in_server(routes)
+        pool = hgdhttp.asyncHttpPool(retries=1,backoff=0.01)
+
+        with self.assertRaises(hgdhttp.httpFetchError):
+            pool.fetch_all({'down':f'{base}/down'})
+        results = pool.fetch_all({'down':f'{base}/down'},raise_errors=False)
+        self.assertIsInstance(results['down'],hgdhttp.httpFetchError)
+        pool.close()
+        server.shutdown()
+
+    def test_download_to_file(self):
+        routes = {'/gene2go.gz':([200],b'\x1f\x8b' + b'x'*5000,0)}
+        server, base = start_stand_in_server(routes)
+        pool = hgdhttp.asyncHttpPool(retries=0)
+        file_path = os.path.join(self.tmp_dir,'ncbi','ncbi_human_gene2go.gz')
+
+        results = pool.fetch_all({'gene2go':f'{base}/gene2go.gz'},{'gene2go':file_path})
+
+        self.assertEqual(results['gene2go'],file_path)
+        self.assertEqual(os.path.getsize(file_path),5002)
+        self.assertFalse(os.path.exists(file_path+'.part'))
+        pool.close()
+        server.shutdown()
+
+    def test_stream_parses_kegg_tsv(self):
+        body = b''.join(f'path:hsa0{i:04d}\thsa:{i}\n'.encode() for i in range(2000))
+        routes = {'/link/hsa/pathway':([200],body,0)}
+        server, base = start_stand_in_server(routes)
+        pool = hgdhttp.asyncHttpPool(retries=0)
+
+        with pool.stream(f'{base}/link/hsa/pathway') as response_body:
+            df = kegg_utils.api_download_to_df(response_body,['pathway_id','gene_id'])
+
+        self.assertEqual(df.shape,(2000,2))
+        self.assertEqual(df.loc[1999,'gene_id'],'hsa:1999')
+        pool.close()
+        server.shutdown()
+
+
+class resumableDownloadTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree,self.tmp_dir)
+        self.body = os.urandom(3*1024*1024)
+        self.files = {'/gene2go.gz':self.body}
+        self.server, self.base = start_range_server(self.files)
+        self.addCleanup(self.server.shutdown)
+        self.url = f'{self.base}/gene2go.gz'
+        self.file_path = os.path.join(self.tmp_dir,'ncbi','ncbi_human_gene2go.gz')
+
+    def make_pool(self,retries):
+        pool = hgdhttp.asyncHttpPool(retries=retries,backoff=0)
+        self.addCleanup(pool.close)
+        return pool
+
+    def read(self):
+        with open(self.file_path,'rb') as f:
+            return f.read()
+
+    def test_dropped_connection_resumes(self):
+        self.server.drops['/gene2go.gz'] = [int(2.5*1024*1024)]
+        self.make_pool(retries=2).download(self.url,self.file_path)
+
+        self.assertEqual(self.read(),self.body)
+        # Second request only asks for the bytes not yet on disk
+        ranges = [r for _,r in self.server.requests]
+        self.assertIsNone(ranges[0])
+        self.assertGreater(int(ranges[1].replace('bytes=','').split('-')[0]),0)
+        self.assertFalse([f for f in os.listdir(os.path.dirname(self.file_path)) if '.part' in f])
+
+    def test_partial_file_resumed_by_next_run(self):
+        self.server.drops['/gene2go.gz'] = [int(2.5*1024*1024),int(0.2*1024*1024)]
+        with self.assertRaises(hgdhttp.httpFetchError):
+            self.make_pool(retries=0).download(self.url,self.file_path)
+        self.assertTrue(os.path.exists(self.file_path + '.part.state'))
+
+        self.make_pool(retries=0).download(self.url,self.file_path)
+        self.assertEqual(self.read(),self.body)
+
+    def test_changed_source_restarts(self):
+        self.server.drops['/gene2go.gz'] = [int(2.5*1024*1024),int(0.2*1024*1024)]
+        with self.assertRaises(hgdhttp.httpFetchError):
+            self.make_pool(retries=0).download(self.url,self.file_path)
+
+        # If-Range no longer matches -> full new file
+        self.files['/gene2go.gz'] = new_body = os.urandom(1024*1024)
+        self.make_pool(retries=0).download(self.url,self.file_path)
+        self.assertEqual(self.read(),new_body)
+
+    def test_segmented_download(self):
+        for name,value in [('HTTP_SEGMENTS',4),('HTTP_SEGMENT_MIN_BYTES',1024*1024)]:
+            self.addCleanup(setattr,hgdhttp.cfg,name,getattr(hgdhttp.cfg,name))
+            setattr(hgdhttp.cfg,name,value)
+
+        self.server.drops['/gene2go.gz'] = [None,None,int(0.3*1024*1024)]
+        self.make_pool(retries=2).download(self.url,self.file_path)
+
+        self.assertEqual(self.read(),self.body)
+        ranges = {r for _,r in self.server.requests if r}
+        for i in range(4):
+            self.assertTrue(any(r.endswith(f'-{len(self.body)*(i+1)//4 - 1}') for r in ranges))
+
+    def test_segments_share_per_host_limit(self):
+        for name,value in [('HTTP_SEGMENTS',4),('HTTP_SEGMENT_MIN_BYTES',1024*1024)]:
+            self.addCleanup(setattr,hgdhttp.cfg,name,getattr(hgdhttp.cfg,name))
+            setattr(hgdhttp.cfg,name,value)
+        for i in range(3):
+            self.files[f'/file{i}.gz'] = self.body
+        self.server.delay = 0.2
+
+        pool = hgdhttp.asyncHttpPool(max_per_host=4,retries=0,backoff=0)
+        self.addCleanup(pool.close)
+        results = pool.fetch_all({i:f'{self.base}/file{i}.gz' for i in range(3)},
+                                 file_dict={i:os.path.join(self.tmp_dir,f'file{i}.gz') for i in range(3)})
+
+        # 3 files of 4 segments each - never more than 4 connections to the host
+        self.assertLessEqual(self.server.max_ranges,4)
+        for path in results.values():
+            with open(path,'rb') as f:
+                self.assertEqual(f.read(),self.body)
+
+    def test_md5_verified(self):
+        pool = self.make_pool(retries=0)
+        self.files['/gene2go.gz.md5'] = f'{hashlib.md5(self.body).hexdigest()}  gene2go.gz\n'.encode()
+        pool.download(self.url,self.file_path,md5_url=f'{self.url}.md5')
+        self.assertEqual(self.read(),self.body)
+
+        # No published md5 -> not checked
+        pool.download(self.url,self.file_path,md5_url=f'{self.base}/missing.md5')
+
+        self.files['/gene2go.gz.md5'] = b'0123456789abcdef0123456789abcdef  gene2go.gz\n'
+        with self.assertRaises(hgdhttp.httpFetchError):
+            pool.download(self.url,self.file_path,md5_url=f'{self.url}.md5')
+        self.assertEqual(len([p for p,_ in self.server.requests if p == '/gene2go.gz']),4)
+
+
+################################################################################################################
+# Raw response cache (utils/hgd_cache.py)
+################################################################################################################
+
+class httpCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.routes = {'/list/pathway/hsa':([200],b'hsa00010\tGlycolysis\n',0,'"v1"')}
+        self.server, self.base = start_stand_in_server(self.routes)
+        self.url = f'{self.base}/list/pathway/hsa'
+        self.pool = hgdhttp.asyncHttpPool(retries=0)
+        hgdcache._CACHE = hgdcache.httpCache(cache_dir=os.path.join(self.tmp_dir,'cache'))
+
+    def tearDown(self):
+        hgdcache._CACHE = None
+        self.pool.close()
+        self.server.shutdown()
+        shutil.rmtree(self.tmp_dir)
+
+    def read(self,file_path):
+        with open(file_path,'rb') as f:
+            return f.read()
+
+    def test_fresh_entry_skips_network(self):
+        first = self.pool.cached_download(self.url,cache_ttl=3600)
+        second = self.pool.cached_download(self.url,cache_ttl=3600)
+
+        self.assertEqual(first,second)
+        self.assertEqual(self.read(second),b'hsa00010\tGlycolysis\n')
+        self.assertEqual(self.server.hits['/list/pathway/hsa'],1)
+
+    def test_stale_entry_revalidated(self):
+        self.pool.cached_download(self.url,cache_ttl=0)
+        meta = hgdcache.get_cache().lookup(self.url)
+        self.assertEqual(meta['etag'],'"v1"')
+
+        # Unchanged upstream -> 304, cached body reused
+        file_path = os.path.join(self.tmp_dir,'raw','kegg_pathway.tsv')
+        self.pool.cached_download(self.url,file_path,cache_ttl=0)
+        self.assertEqual(self.server.hits['/list/pathway/hsa'],2)
+        self.assertEqual(self.read(file_path),b'hsa00010\tGlycolysis\n')
+
+        # Changed upstream -> new body
+        self.routes['/list/pathway/hsa'] = ([200],b'hsa00020\tTCA cycle\n',0,'"v2"')
+        self.pool.cached_download(self.url,file_path,cache_ttl=0)
+        self.assertEqual(self.read(file_path),b'hsa00020\tTCA cycle\n')
+        self.assertEqual(hgdcache.get_cache().lookup(self.url)['etag'],'"v2"')
+
+    def test_corrupt_entry_redownloaded(self):
+        cache_path = self.pool.cached_download(self.url,cache_ttl=3600)
+        with open(cache_path,'wb') as f:
+            f.write(b'hsa00010\tGlycolysiX\n')
+
+        self.assertIsNone(hgdcache.get_cache().lookup(self.url))
+        cache_path = self.pool.cached_download(self.url,cache_ttl=3600)
+        self.assertEqual(self.read(cache_path),b'hsa00010\tGlycolysis\n')
+        self.assertEqual(self.server.hits['/list/pathway/hsa'],2)
+
+    def test_lru_eviction(self):
+        for i in range(3):
+            self.routes[f'/f{i}'] = ([200],b'x'*100,0)
+        cache = hgdcache.get_cache()
+        cache.max_bytes = 250
+
+        self.pool.cached_download(f'{self.base}/f0',cache_ttl=3600)
+        self.pool.cached_download(f'{self.base}/f1',cache_ttl=3600)
+        time.sleep(0.01)
+        # f0 used more recently than f1 -> f1 evicted when f2 arrives
+        self.pool.cached_download(f'{self.base}/f0',cache_ttl=3600)
+        self.pool.cached_download(f'{self.base}/f2',cache_ttl=3600)
+
+        self.assertIsNotNone(cache.lookup(f'{self.base}/f0'))
+        self.assertIsNone(cache.lookup(f'{self.base}/f1'))
+        self.assertIsNotNone(cache.lookup(f'{self.base}/f2'))
+
+
+################################################################################################################
+# Row-by-row KEGG transforms (previous implementation) - reference for the vectorized versions
+################################################################################################################
+
+def legacy_gene_name_split(gene_cf_row):
+    try:
+        x = gene_cf_row.split(';')[1]
+    except:
+        x = gene_cf_row.split(';')[0]
+    return x
+
+
+def legacy_gene_symbol_split(gene_cf_row):
+    col_split = gene_cf_row.split(';')
+    if len(col_split)==1:
+        return ['None']
+    return col_split[0].split(', ')
+
+
+def legacy_extract_chr_positions(kgene_row,pos_type="start"):
+    try:
+        if 'complement' in kgene_row:
+            kgene_row = kgene_row.split("(")[1].replace(')','')
+        else:
+            kgene_row = kgene_row.split(":")[1]
+        if pos_type == "start":
+            return int(kgene_row.split('..')[1])
+        else:
+            return int(kgene_row.split('..')[0])
+    except:
+        return 0
+
+
+def legacy_extract_chr(kgene_row):
+    if 'MT' in kgene_row:
+        return 'MT'
+    elif 'q' in kgene_row:
+        return kgene_row.split('q')[0]
+    elif ('p' in kgene_row)&('complement' not in kgene_row):
+        return kgene_row.split('p')[0]
+    elif kgene_row == 'X; Y':
+        return 'X;Y'
+    elif kgene_row in ['nan','Un','']:
+        return 'Unknown'
+    elif kgene_row == '13cen':
+        return '13'
+    else:
+        return kgene_row.split(':')[0]
+
+
+def legacy_process_pathway(df):
+    df['PATHWAY_ID'] = df['PATHWAY_ID'].apply(lambda x: x.replace('hsa','P'))
+    df['PATHWAY_NAME'] = df['PATHWAY_NAME'].apply(lambda x: x.split(' - ')[0])
+    return {'pathway':df}
+
+
+def legacy_process_gene(df):
+    df['GENE_NAME'] = df['GENE_SYMBOL_AND_NAME'].apply(lambda x: legacy_gene_name_split(x))
+    df['GENE_SYMBOL'] = df['GENE_SYMBOL_AND_NAME'].apply(lambda x: legacy_gene_symbol_split(x))
+    df['GENE_ID'] = df['GENE_ID'].apply(lambda x: x.replace('hsa:','G'))
+
+    gene_symbols = df.explode('GENE_SYMBOL')
+    gene_symbols = gene_symbols[['GENE_SYMBOL','GENE_ID']]
+    gene_symbols['gene_alias_no'] = gene_symbols.groupby(['GENE_ID'],as_index=False).cumcount()+1
+    gene_symbols.columns = [c.upper() for c in gene_symbols.columns]
+    gene_symbols = gene_symbols[['GENE_ID','GENE_SYMBOL','GENE_ALIAS_NO']]
+    gene_symbols['LOOKUP_SOURCE'] = 'gene'
+
+    df['CHRSTOP'] = df['CHROMOSOMAL_POSITION'].apply(lambda x: legacy_extract_chr_positions(x,pos_type="stop"))
+    df['CHRSTART'] = df['CHROMOSOMAL_POSITION'].apply(lambda x: legacy_extract_chr_positions(x,pos_type="start"))
+    df['CHR_COMPLEMENT'] = np.where(df['CHROMOSOMAL_POSITION'].str.contains('complement'),1,0)
+    df['CHROMOSOMAL_POSITION'] = df['CHROMOSOMAL_POSITION'].astype(str)
+    df['CHROMOSOME'] = df['CHROMOSOMAL_POSITION'].apply(lambda x: legacy_extract_chr(x))
+
+    df = df.drop(columns=['GENE_SYMBOL','GENE_SYMBOL_AND_NAME','CHROMOSOMAL_POSITION'])
+    return {'gene':df,'gene_symbol_lookup':gene_symbols}
+
+
+def legacy_process_disease(df):
+    df['DISEASE_ID'] = df['DISEASE_ID'].apply(lambda x: x.replace('H','DS'))
+    df['DISEASE_NAME'] = df['DISEASE_NAME'].apply(lambda x: x.split('; '))
+
+    disease_names = df.explode('DISEASE_NAME')
+    disease_names = disease_names[['DISEASE_ID','DISEASE_NAME']]
+    disease_names['LOOKUP_SOURCE'] = 'disease'
+
+    df['DISEASE_NAME_COUNT'] = df['DISEASE_NAME'].apply(lambda x: len(x))
+    df = df.drop(columns=['DISEASE_NAME'])
+    return {'disease':df,'disease_name_lookup':disease_names}
+
+
+def legacy_process_variant(df):
+    df['VARIANT_VERSION'] = df['VARIANT_ID'].apply(lambda x: x.rsplit("v",1)[1])
+    df['VARIANT_ID'] = df['VARIANT_ID'].apply(lambda x: 'V'+x.rsplit("v",1)[0])
+    df['GENE_SYMBOL'] = df['VARIANT_NAME'].apply(lambda x: x.split(' ')[0])
+    return {'variant':df}
+
+
+def legacy_clean_mod_name(mod_row):
+    try:
+        x = mod_row.rsplit(',',1)[0]
+        x = x.replace(' (',',').replace(')','')
+        return x.split(',')
+    except:
+        return [np.NaN]
+
+
+def legacy_process_module(df):
+    df['MODULE_NAME'] = df['MODULE_NAME'].apply(lambda x: legacy_clean_mod_name(x))
+    mod_names = df.explode('MODULE_NAME')
+    mod_names['LOOKUP_SOURCE'] = 'module'
+    df = df.drop(columns=['MODULE_NAME'])
+    return {'module':df,'module_name_lookup':mod_names}
+
+
+def legacy_process_link(df,db_table):
+    if 'PATHWAY_ID' in df.columns:
+        df['PATHWAY_ID'] = df['PATHWAY_ID'].apply(lambda x: x.replace('path:hsa','P'))
+        df['PATHWAY_ID'] = df['PATHWAY_ID'].apply(lambda x: x.replace('path:map','P'))
+    if 'GENE_ID' in df.columns:
+        df['GENE_ID'] = df['GENE_ID'].apply(lambda x: x.replace('hsa:','G'))
+    if 'DISEASE_ID' in df.columns:
+        df['DISEASE_ID'] = df['DISEASE_ID'].apply(lambda x: x.replace('ds:H','DS'))
+    if 'MODULE_ID' in df.columns:
+        df['MODULE_ID'] = df['MODULE_ID'].apply(lambda x: x.replace('md:',''))
+    if db_table == 'gene_ncbi':
+        df['NCBI_GENE_ID'] = df['NCBI_GENE_ID'].apply(lambda x: x.replace('ncbi-geneid:','G'))
+    return {db_table+'_lookup':df}
+
+
+legacy_proc_funcs = {'pathway':legacy_process_pathway,
+                     'gene':legacy_process_gene,
+                     'disease':legacy_process_disease,
+                     'variant':legacy_process_variant,
+                     'module':legacy_process_module}
+
+
+################################################################################################################
+# Row-by-row Entrez summary transforms (previous implementation) - reference for the vectorized versions
+################################################################################################################
+
+def legacy_list_attribute(snp_row):
+    if pd.isnull(snp_row):
+        return np.NaN
+    else:
+        return snp_row.split(',')
+
+
+def legacy_normalize_snp_column(df,columns,explode_column):
+    df_explode = df.copy(deep=True)
+    df_explode = df_explode[columns]
+    df_explode = df_explode.explode(explode_column)
+
+    df_explode = df_explode[df_explode[explode_column]!='']
+    df_explode = df_explode[df_explode[explode_column].notnull()].reset_index(drop=True)
+    df_explode['LOOKUP_SOURCE'] = 'snp_summary'
+    return df_explode
+
+
+def legacy_process_snp_summary(df):
+    df = df.rename(columns={"GENES_GENE_ID":"GENE_ID"})
+    if 'GENE_ID' not in df.columns:
+        df['GENE_ID'] = np.NaN
+    df['SNP_ID'] = hgdids.encode_ids(df['SNP_ID'])
+
+    explode_dict = {}
+    for column in ['GENE_ID','FXN_CLASS','SS']:
+        df[column] = df[column].apply(lambda x: legacy_list_attribute(x))
+        explode_dict[column] = legacy_normalize_snp_column(df,['SNP_ID',column],column)
+    explode_dict['GENE_ID']['GENE_ID'] = hgdids.encode_ids(explode_dict['GENE_ID']['GENE_ID'])
+
+    for docsum_attr in ['SEQ','LEN','HGVS']:
+        df[docsum_attr] = df.get(f'DOCSUM_{docsum_attr}',np.NaN)
+    df['CLINICAL_SIGNIFICANCE'] = df['CLINICAL_SIGNIFICANCE'].replace('',np.NaN)
+
+    drop_cols = ['GLOBAL_SAMPLESIZE','GLOBAL_POPULATION','SUSPECTED',
+                 'ALLELE_ORIGIN','ACC','GLOBAL_MAFS','GENE_LIST','n_genes',
+                 'TAX_ID','CREATEDATE','UPDATEDATE','HANDLE','ORIG_BUILD','CHRPOS_PREV_ASSM','TEXT','uid','UID']
+    drop_cols = drop_cols + [c for c in df.columns if '_SORT' in c]
+    drop_cols += [c for c in df.columns if c.startswith(('GENES_','GLOBAL_MAFS_','DOCSUM_'))]
+    drop_cols += ['GENE_ID','GENES','FXN_CLASS','SS','DOCSUM']
+    for col in drop_cols:
+        try:
+            df.drop(columns=[col],inplace=True)
+        except:
+            pass
+
+    return {'snp_summary':df,
+            'snp_summary_gene_lookup':explode_dict['GENE_ID'],
+            'snp_summary_fxn_lookup':explode_dict['FXN_CLASS'],
+            'snp_summary_ss_lookup':explode_dict['SS']}
+
+
+def legacy_process_gene_summary(df):
+    df = df.rename(columns={'UID':'GENE_ID','MIM':'MIM_ID','NOMENCLATURENAME':'GENE_NAME','NAME':'GENE_SYMB_ALT',
+                            'GENEWEIGHT':'GENE_WEIGHT','MAPLOCATION':'MAP_LOCATION'})
+    df['GENE_ID'] = hgdids.encode_ids(df['GENE_ID'])
+
+    for gi_attr in ['CHRSTART','CHRSTOP','EXONCOUNT','CHRACCVER']:
+        df[gi_attr] = df.get(f'GENOMICINFO_{gi_attr}',np.NaN)
+    for gi_attr in ['CHRSTART','CHRSTOP','EXONCOUNT']:
+        df[gi_attr] = pd.to_numeric(df[gi_attr]).astype('Int64')
+
+    df['GENE_SYMBOL'] = np.where(df['NOMENCLATURESYMBOL']!='',df['NOMENCLATURESYMBOL'],'')
+    df['NOMENCLATURESTATUS'] = np.where(df['NOMENCLATURESTATUS']=='Official',1,0)
+    df['GENE_NAME'] = df['GENE_NAME'].replace('',np.NaN)
+    df['SUMMARY'] = df['SUMMARY'].replace('',np.NaN)
+    df['MAP_LOCATION'] = df['MAP_LOCATION'].replace('',np.NaN)
+    df['CHRSTOP'] = df['CHRSTOP'].fillna(0)
+    df['CHRSTART'] = df['CHRSTART'].fillna(0)
+    df['CHRSTART'] = df['CHRSTART'].mask(df['CHRSTART']==999999999,0)
+    df['CHROMOSOME'] = df['CHROMOSOME'].apply(lambda x: ncbi_utils.process_chr(str(x)))
+
+    gene_summary_symbols = df[['GENE_ID','OTHERALIASES']]
+    gene_summary_symbols = gene_summary_symbols[gene_summary_symbols['OTHERALIASES']!='']
+    gene_summary_symbols = gene_summary_symbols[gene_summary_symbols['OTHERALIASES'].notnull()].reset_index(drop=True)
+    gene_summary_symbols['OTHERALIASES'] = gene_summary_symbols['OTHERALIASES'].apply(lambda x: x.split(', '))
+    gene_summary_symbols = gene_summary_symbols.explode("OTHERALIASES")
+    gene_summary_symbols = gene_summary_symbols.rename(columns={'OTHERALIASES':'GENE_SYMBOL'})
+
+    gene_symb_alt = df[['GENE_ID','GENE_SYMBOL','GENE_SYMB_ALT']]
+    gene_symb_alt = gene_symb_alt[gene_symb_alt['GENE_SYMBOL'].notnull()]
+    gene_symb_alt['GENE_SYMBOL2'] = gene_symb_alt['GENE_SYMBOL'].apply(lambda x: x.replace('MT-',''))
+    gene_symb_alt = gene_symb_alt[gene_symb_alt['GENE_SYMB_ALT']!=gene_symb_alt['GENE_SYMBOL2']].reset_index(drop=True)
+    gene_symb_alt = gene_symb_alt.drop(columns=['GENE_SYMBOL','GENE_SYMBOL2'])
+    gene_symb_alt = gene_symb_alt.rename(columns={'GENE_SYMB_ALT':'GENE_SYMBOL'})
+
+    gene_summary_symbols = pd.concat([gene_summary_symbols,gene_symb_alt],ignore_index=True)
+    gene_summary_symbols['LOOKUP_SOURCE'] = 'gene_summary'
+    df['GENE_SYMBOL'] = df['GENE_SYMBOL'].replace('',np.NaN)
+
+    gene_summary_omim = df[['GENE_ID','MIM_ID']].rename(columns={'MIM_ID':'OMIM_ID'})
+    gene_summary_omim['OMIM_ID'] = gene_summary_omim['OMIM_ID'].str.split(',')
+    gene_summary_omim = gene_summary_omim.explode("OMIM_ID")
+    gene_summary_omim = gene_summary_omim[gene_summary_omim['OMIM_ID']!='']
+    gene_summary_omim = gene_summary_omim[gene_summary_omim['OMIM_ID'].notnull()].reset_index(drop=True)
+    gene_summary_omim['LOOKUP_SOURCE'] = 'gene_summary'
+
+    nested_cols = [c for c in df.columns if c.split('_')[0] in ['LOCATIONHIST','ORGANISM','GENOMICINFO']]
+    df = df.drop(columns=['CHRSORT','OTHERDESIGNATIONS','OTHERALIASES','MIM_ID','CHRACCVER','STATUS','CURRENTID',
+                          'NOMENCLATURESTATUS','NOMENCLATURESYMBOL','GENE_SYMB_ALT','GENETICSOURCE'] + nested_cols)
+    df = df[['GENE_ID','GENE_SYMBOL'] + [c for c in df.columns if c not in ['GENE_ID','GENE_SYMBOL']]]
+    df = df.sort_values(by=['GENE_ID']).reset_index(drop=True)
+
+    return {'gene_summary':df,
+            'gene_summary_symbol_lookup':gene_summary_symbols,
+            'gene_summary_omim_lookup':gene_summary_omim}
+
+
+################################################################################################################
+# KEGG parsing & processing (source_pipes/kegg_pipe/kegg_utils.py)
+################################################################################################################
+
+class keggParseTests(unittest.TestCase):
+    columns = ['gene_id','gene_type','chromosomal_position','gene_symbol_and_name']
+    data = ('hsa:10\tCDS\t8p22\tNAT2, AAC2; N-acetyltransferase 2 "arylamine"\n'
+            'hsa:100\tCDS\t20q13.12\tNA; adenosine deaminase\n'
+            'hsa:1\tncRNA\t\tA1BG\n')
+
+    def legacy_api_download_to_df(self,response_data,columns):
+        df = pd.DataFrame([x.split('\t') for x in response_data.split('\n')])
+        df = df.iloc[:-1,:]
+        df.columns = columns
+        return df
+
+    def test_matches_legacy_parser(self):
+        expected = self.legacy_api_download_to_df(self.data,self.columns)
+        for response_data in [self.data,self.data.encode(),io.BytesIO(self.data.encode())]:
+            pd.testing.assert_frame_equal(kegg_utils.api_download_to_df(response_data,self.columns),expected)
+
+    def test_chunked(self):
+        chunks = list(kegg_utils.api_download_to_df(self.data.encode(),self.columns,chunksize=2))
+        self.assertEqual([len(c) for c in chunks],[2,1])
+        pd.testing.assert_frame_equal(pd.concat(chunks),
+                                      self.legacy_api_download_to_df(self.data,self.columns))
+
+
+class keggTransformTests(unittest.TestCase):
+    raw = {'pathway':[('hsa00010','Glycolysis / Gluconeogenesis - Homo sapiens (human)'),
+                      ('hsa01100','Metabolic pathways - Homo sapiens (human) - x'),
+                      ('hsa04010','MAPK signaling pathway')],
+           'gene':[('hsa:10','CDS','8:18391282..18401218','NAT2, AAC2, PNAT; N-acetyltransferase 2'),
+                   ('hsa:100','CDS','20:complement(44619522..44652233)','ADA, ADA1; adenosine deaminase'),
+                   ('hsa:4514','CDS','MT:complement(9207..9990)','COX3; cytochrome c oxidase III'),
+                   ('hsa:1','ncRNA','','A1BG'),
+                   ('hsa:2','CDS','Un','X; Y; Z'),
+                   ('hsa:3','CDS','X; Y','ABC; name; extra'),
+                   ('hsa:4','CDS','13cen','S1'),
+                   ('hsa:5','CDS','19q13.43','S2; n'),
+                   ('hsa:6','CDS','1p36','S3; n'),
+                   ('hsa:7','CDS','complement','S4; n'),
+                   ('hsa:8','CDS','2:abc..12','S5; n'),
+                   ('hsa:9','CDS','3:5.. 12 ','; empty symbol'),
+                   ('hsa:10','CDS','4:+5..-12','NAT2; repeated id'),
+                   ('hsa:11','CDS','5:5','x, ; y')],
+           'disease':[('H00001','B-cell acute lymphoblastic leukemia (ALL); Precursor B lymphoblastic leukemia'),
+                      ('H00002','Chronic myeloid leukemia'),
+                      ('H00003','a; ; b;c')],
+           'variant':[('hsa_var_1019v2','CDK4 mutation'),
+                      ('hsa_var_vv1','NAME'),
+                      ('v3','X Y Z')],
+           'module':[('M00001','Glycolysis (Embden-Meyerhof pathway), glucose => pyruvate'),
+                     ('M00002','Glycolysis, core module involving three-carbon compounds'),
+                     ('M00003','NoComma'),
+                     ('M00004','A (B) (C), D, E')],
+           'pathway_gene':[('path:hsa00010','hsa:10'),('path:map01100','hsa:100')],
+           'pathway_module':[('path:hsa00010','md:hsa_M00001')],
+           'pathway_disease':[('path:hsa05200','ds:H00001')],
+           'gene_disease':[('ds:H00001','hsa:10')],
+           'ncbi_gene':[('ncbi-geneid:10','hsa:10')]}
+
+    def raw_df(self,db_table):
+        columns = [c.upper() for c in kegg_utils.db_table_dict[db_table]['columns']]
+        return pd.DataFrame(self.raw[db_table],columns=columns)
+
+    def test_matches_row_by_row(self):
+        for db_table,legacy_func in legacy_proc_funcs.items():
+            expected = legacy_func(self.raw_df(db_table))
+            result = kegg_utils.db_table_dict[db_table]['proc_func'](self.raw_df(db_table))
+            self.assertEqual(result.keys(),expected.keys())
+            for key in expected:
+                with self.subTest(table=key):
+                    # IDs are compared in the (string) form written to the database
+                    pd.testing.assert_frame_equal(hgdids.decode_ids(result[key]),expected[key])
+
+    def test_links_match_row_by_row(self):
+        for db_table in ['pathway_gene','pathway_module','pathway_disease','gene_disease','ncbi_gene']:
+            expected = legacy_process_link(self.raw_df(db_table),db_table)
+            result = kegg_utils.process_link(self.raw_df(db_table),db_table)
+            with self.subTest(table=db_table):
+                pd.testing.assert_frame_equal(hgdids.decode_ids(result[db_table+'_lookup']),
+                                              expected[db_table+'_lookup'])
+
+    def test_gene_positions(self):
+        gene = kegg_utils.process_gene(self.raw_df('gene'))['gene']
+        self.assertEqual(gene['CHRSTART'].tolist()[:3],[18401218,44652233,9990])
+        self.assertEqual(gene['CHRSTOP'].tolist()[:3],[18391282,44619522,9207])
+        self.assertEqual(gene['CHRSTART'].dtype,np.int64)
+
+    def test_ids_encoded(self):
+        gene_data = kegg_utils.process_gene(self.raw_df('gene'))
+        self.assertEqual(gene_data['gene']['GENE_ID'].dtype,np.int64)
+        self.assertEqual(gene_data['gene_symbol_lookup']['GENE_ID'].dtype,np.int64)
+        link = kegg_utils.process_link(self.raw_df('pathway_gene'),'pathway_gene')['pathway_gene_lookup']
+        self.assertEqual(link['PATHWAY_ID'].tolist(),[10,1100])
+
+
+################################################################################################################
+# ID codec (utils/hgd_ids.py)
+################################################################################################################
+
+class idCodecTests(unittest.TestCase):
+    def test_encode_strips_source_prefixes(self):
+        ids = pd.Series(['path:hsa00010','path:map01100'],index=[3,4])
+        encoded = hgdids.encode_ids(ids,strip=('path:hsa','path:map'))
+        pd.testing.assert_series_equal(encoded,pd.Series([10,1100],index=[3,4],dtype='int64'))
+        pd.testing.assert_series_equal(hgdids.encode_ids(pd.Series([1,2],dtype='int32')),
+                                       pd.Series([1,2],dtype='int64'))
+
+    def test_encode_rejects_non_numeric(self):
+        with self.assertRaises(ValueError):
+            hgdids.encode_ids(pd.Series(['hsa:10','hsa:ABC']),strip=('hsa:',))
+
+    def test_decode_round_trip(self):
+        df = pd.DataFrame({'GENE_ID':[10,7157],'PATHWAY_ID':[10,4010],'DISEASE_ID':[1,552],
+                           'SNP_ID':[334,1],'GENE_SYMBOL':['NAT2','TP53']})
+        decoded = hgdids.decode_ids(df)
+        self.assertEqual(decoded['GENE_ID'].tolist(),['G10','G7157'])
+        self.assertEqual(decoded['PATHWAY_ID'].tolist(),['P00010','P04010'])
+        self.assertEqual(decoded['DISEASE_ID'].tolist(),['DS00001','DS00552'])
+        self.assertEqual(decoded['SNP_ID'].tolist(),['rs334','rs1'])
+        self.assertEqual(decoded['GENE_SYMBOL'].tolist(),['NAT2','TP53'])
+        # Input left encoded
+        self.assertEqual(df['GENE_ID'].dtype,np.int64)
+
+    def test_decode_missing_and_strings(self):
+        # e.g. an outer merge (float with NaN) & a column already in string form
+        df = pd.DataFrame({'GENE_ID':[10.0,np.NaN],'DISEASE_ID':['DS00001','DS00002']})
+        decoded = hgdids.decode_ids(df)
+        self.assertEqual(decoded['GENE_ID'].tolist()[0],'G10')
+        self.assertTrue(pd.isnull(decoded['GENE_ID'].tolist()[1]))
+        self.assertEqual(decoded['DISEASE_ID'].tolist(),['DS00001','DS00002'])
+
+
+################################################################################################################
+# Checkpointed Entrez pulls (utils/hgd_shards.py, ncbi_utils.extract_summary_data)
+################################################################################################################
+
+class shardStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.shard_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree,self.shard_dir,True)
+
+        # Stand-in Entrez: 23 records, fetches counted & failing on request
+        self.searches = 0
+        self.fetched = []
+        self.fail_at = None
+        self.count = 23
+
+        def get_accession_ids(db_table,search_term,**kwargs):
+            self.searches += 1
+            return f'webenv{self.searches}','1',self.count
+
+        def fetch_data(db_table,webenv,querykey,batch_size=10,retstart=0,**kwargs):
+            if retstart == self.fail_at:
+                raise RuntimeError('HTTP Error 500')
+            self.fetched.append((retstart,webenv))
+            uids = range(retstart,min(retstart + batch_size,self.count))
+            return pd.DataFrame({'uid':[str(u) for u in uids],'name':[f'GENE{u}' for u in uids]})
+
+        for name,func in [('get_accession_ids',get_accession_ids),('fetch_data',fetch_data)]:
+            original = getattr(ncbi_utils,name)
+            setattr(ncbi_utils,name,func)
+            self.addCleanup(setattr,ncbi_utils,name,original)
+
+        original_dir = ncbi_utils.cfg.SHARD_DIR
+        ncbi_utils.cfg.SHARD_DIR = self.shard_dir
+        self.addCleanup(setattr,ncbi_utils.cfg,'SHARD_DIR',original_dir)
+
+    def test_shards_read_in_offset_order(self):
+        shards = hgdshards.shardStore('gene_summary',shard_dir=self.shard_dir)
+        shards.start(25,10,search_term='human')
+        for offset in [20,0]:
+            shards.write_shard(offset,pd.DataFrame({'UID':[offset]}))
+
+        reopened = hgdshards.shardStore.from_manifest(shards.manifest_path)
+        self.assertEqual(reopened.missing_offsets(),[10])
+        self.assertFalse(reopened.complete)
+        self.assertEqual(reopened.read_all()['UID'].tolist(),[0,20])
+        self.assertTrue(hgdshards.is_manifest(str(shards.manifest_path)))
+        self.assertFalse(hgdshards.is_manifest(pd.DataFrame()))
+
+    def test_failed_pull_resumes_missing_batches(self):
+        # Batches are fetched concurrently - others may finish before the failed one
+        self.fail_at = 10
+        with self.assertRaises(RuntimeError):
+            ncbi_utils.extract_summary_data('gene_summary','human',batch_size=5)
+        first_run = {o for o,_ in self.fetched}
+        self.assertNotIn(10,first_run)
+
+        self.fail_at = None
+        self.fetched = []
+        manifest_path = ncbi_utils.extract_summary_data('gene_summary','human',batch_size=5)
+        self.assertEqual(sorted(o for o,_ in self.fetched),sorted({0,5,10,15,20} - first_run))
+        self.assertEqual(self.searches,1)
+
+        df = hgdshards.shardStore.from_manifest(manifest_path).read_all()
+        self.assertEqual(df['uid'].tolist(),[str(u) for u in range(23)])
+
+        # A completed pull starts over
+        self.fetched = []
+        ncbi_utils.extract_summary_data('gene_summary','human',batch_size=5)
+        self.assertEqual(len(self.fetched),5)
+
+    def test_expired_search_restarts_pull(self):
+        self.fail_at = 5
+        with self.assertRaises(RuntimeError):
+            ncbi_utils.extract_summary_data('snp_summary','human',batch_size=5)
+
+        shards = hgdshards.shardStore('snp_summary',shard_dir=self.shard_dir)
+        shards.update_params(searched_at=time.time() - ncbi_utils.cfg.ENTREZ_HISTORY_TTL - 1)
+
+        # A new WebEnv may order the results differently - every batch is fetched again from the new search
+        self.fail_at = None
+        self.fetched = []
+        manifest_path = ncbi_utils.extract_summary_data('snp_summary','human',batch_size=5)
+        self.assertEqual(sorted(self.fetched),[(o,'webenv2') for o in range(0,self.count,5)])
+        self.assertEqual(hgdshards.shardStore.from_manifest(manifest_path).read_all()['uid'].tolist(),
+                         [str(u) for u in range(self.count)])
+
+
+################################################################################################################
+# Rate-limited Entrez pool (utils/hgd_entrez.py)
+################################################################################################################
+
+class entrezPoolTests(unittest.TestCase):
+    def setUp(self):
+        state_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree,state_dir,True)
+        self.state_path = os.path.join(state_dir,'rate')
+
+    def test_bucket_shared_by_limiters(self):
+        # Two limiters on one state file (as in two processes) & several threads draw from one rate
+        limiters = [hgdentrez.tokenBucket(rate=20,state_path=self.state_path) for _ in range(2)]
+        start = time.perf_counter()
+        threads = [threading.Thread(target=limiters[i%2].acquire) for i in range(9)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertGreaterEqual(time.perf_counter() - start,8/20 - 0.02)
+
+    def test_rate_follows_api_key(self):
+        original = hgdentrez.Entrez.api_key
+        self.addCleanup(setattr,hgdentrez.Entrez,'api_key',original)
+        limiter = hgdentrez.tokenBucket(state_path=self.state_path)
+        hgdentrez.Entrez.api_key = None
+        self.assertEqual(limiter.rate,3)
+        hgdentrez.Entrez.api_key = 'key'
+        self.assertEqual(limiter.rate,10)
+
+    def test_retries_transient_errors(self):
+        pool = hgdentrez.entrezPool(max_workers=2,retries=2,backoff=0,
+                                    limiter=hgdentrez.tokenBucket(rate=1000,state_path=self.state_path))
+        self.addCleanup(pool.close)
+        errors = [HTTPError('url',429,'Too Many Requests',{},None),HTTPError('url',502,'Bad Gateway',{},None)]
+
+        def flaky():
+            if errors:
+                raise errors.pop(0)
+            return 'ok'
+
+        self.assertEqual(pool.call(flaky),'ok')
+
+        def bad_request():
+            errors.append(1)
+            raise HTTPError('url',400,'Bad Request',{},None)
+
+        with self.assertRaises(HTTPError):
+            pool.call(bad_request)
+        self.assertEqual(len(errors),1)
+
+    def test_run_all_keeps_order(self):
+        pool = hgdentrez.entrezPool(max_workers=4,limiter=hgdentrez.tokenBucket(rate=1000,state_path=self.state_path))
+        self.addCleanup(pool.close)
+        seen = []
+        results = pool.run_all(lambda i: time.sleep(0.01*(5-i)) or i,[(i,) for i in range(5)],
+                               on_result=lambda args,result: seen.append(result))
+        # Results handed to on_result aren't kept - the args are returned
+        self.assertEqual(results,[(0,),(1,),(2,),(3,),(4,)])
+        self.assertEqual(sorted(seen),[0,1,2,3,4])
+        self.assertEqual(pool.run_all(lambda i: i*2,[(i,) for i in range(3)]),[0,2,4])
+
+        def fail_on_two(i):
+            if i == 2:
+                raise ValueError('batch 2')
+            return i
+
+        with self.assertRaises(ValueError):
+            pool.run_all(fail_on_two,[(i,) for i in range(5)])
+
+
+################################################################################################################
+# ESummary parsing (ncbi_utils.parse_esummary_xml / parse_esummary_json)
+################################################################################################################
+
+GENE_ESUMMARY_XML = b"""<?xml version="1.0" ?>
+<!DOCTYPE eSummaryResult PUBLIC "-//NLM//DTD esummary gene 20230101//EN" "https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20230101/esummary_gene.dtd">
+<eSummaryResult><DocumentSummarySet status="OK"><DbBuild>Build230531-1855.1</DbBuild>
+<DocumentSummary uid="7157">
+  <Name>TP53</Name><Description>tumor protein p53</Description><Status>0</Status><CurrentID>0</CurrentID>
+  <Chromosome>17</Chromosome><GeneticSource>genomic</GeneticSource><MapLocation>17p13.1</MapLocation>
+  <OtherAliases>BCC7, LFS1, P53</OtherAliases><OtherDesignations>cellular tumor antigen p53</OtherDesignations>
+  <NomenclatureSymbol>TP53</NomenclatureSymbol><NomenclatureName>tumor protein p53</NomenclatureName>
+  <NomenclatureStatus>Official</NomenclatureStatus>
+  <Mim><int>191170</int></Mim>
+  <GenomicInfo>
+    <GenomicInfoType><ChrLoc>17</ChrLoc><ChrAccVer>NC_000017.11</ChrAccVer><ChrStart>7687489</ChrStart>
+      <ChrStop>7668401</ChrStop><ExonCount>12</ExonCount></GenomicInfoType>
+    <GenomicInfoType><ChrLoc>17</ChrLoc><ChrAccVer>NT_187614.1</ChrAccVer><ChrStart>7687</ChrStart>
+      <ChrStop>7668</ChrStop><ExonCount>11</ExonCount></GenomicInfoType>
+  </GenomicInfo>
+  <GeneWeight>54891</GeneWeight><Summary>Tumor suppressor.</Summary><ChrSort>17</ChrSort><ChrStart>7661778</ChrStart>
+  <Organism><ScientificName>Homo sapiens</ScientificName><CommonName>human</CommonName><TaxID>9606</TaxID></Organism>
+  <LocationHist>
+    <LocationHistType><AnnotationRelease>110</AnnotationRelease><ChrStart>7687489</ChrStart></LocationHistType>
+    <LocationHistType><AnnotationRelease>105</AnnotationRelease><ChrStart>7590807</ChrStart></LocationHistType>
+  </LocationHist>
+</DocumentSummary>
+<DocumentSummary uid="6">
+  <Name>A1S9T</Name><Description>A1S9T</Description><Status>0</Status><CurrentID>0</CurrentID>
+  <Chromosome>X</Chromosome><GeneticSource>genomic</GeneticSource><MapLocation>Xp11.23</MapLocation>
+  <OtherAliases></OtherAliases><OtherDesignations></OtherDesignations><NomenclatureSymbol></NomenclatureSymbol>
+  <NomenclatureName></NomenclatureName><NomenclatureStatus></NomenclatureStatus>
+  <Mim><int>313110</int><int>313111</int></Mim>
+  <GenomicInfo>
+  </GenomicInfo>
+  <GeneWeight>0</GeneWeight><Summary></Summary><ChrSort>X</ChrSort><ChrStart>999999999</ChrStart>
+  <Organism><ScientificName>Homo sapiens</ScientificName><CommonName>human</CommonName><TaxID>9606</TaxID></Organism>
+  <LocationHist>
+  </LocationHist>
+</DocumentSummary>
+</DocumentSummarySet></eSummaryResult>
+"""
+
+SNP_ESUMMARY_XML = b"""<?xml version="1.0" ?>
+<eSummaryResult><DocumentSummarySet status="OK">
+<DocumentSummary uid="334">
+  <SNP_ID>334</SNP_ID><ALLELE_ORIGIN></ALLELE_ORIGIN>
+  <GLOBAL_MAFS><MAF><STUDY>1000Genomes</STUDY><FREQ>T=0.012</FREQ></MAF><MAF><STUDY>GnomAD</STUDY><FREQ>T=0.004</FREQ></MAF></GLOBAL_MAFS>
+  <CLINICAL_SIGNIFICANCE>pathogenic</CLINICAL_SIGNIFICANCE>
+  <GENES><GENE_E><NAME>HBB</NAME><GENE_ID>3043</GENE_ID></GENE_E><GENE_E><NAME>LOC1</NAME><GENE_ID>106099062</GENE_ID></GENE_E></GENES>
+  <CHR>11</CHR><FXN_CLASS>coding_sequence_variant,missense_variant</FXN_CLASS>
+  <DOCSUM>HGVS=NC_000011.10:g.5227002T&gt;A|SEQ=[T/A]|LEN=1|GENE=HBB:3043</DOCSUM>
+  <TAX_ID>9606</TAX_ID><SS>ss1,ss3</SS><CHRPOS>11:5227002</CHRPOS><SNP_ID_SORT>0000000334</SNP_ID_SORT>
+</DocumentSummary>
+<DocumentSummary uid="12">
+  <SNP_ID>12</SNP_ID><ALLELE_ORIGIN></ALLELE_ORIGIN>
+  <GLOBAL_MAFS>
+  </GLOBAL_MAFS>
+  <CLINICAL_SIGNIFICANCE></CLINICAL_SIGNIFICANCE>
+  <GENES>
+  </GENES>
+  <CHR>1</CHR><FXN_CLASS></FXN_CLASS><DOCSUM>HGVS=NC_000001.11:g.1001C&gt;G|SEQ=[C/G]|LEN=1</DOCSUM>
+  <TAX_ID>9606</TAX_ID><SS>ss12</SS><CHRPOS>1:1001</CHRPOS><SNP_ID_SORT>0000000012</SNP_ID_SORT>
+</DocumentSummary>
+<DocumentSummary uid="99"><error>cannot get document summary</error></DocumentSummary>
+</DocumentSummarySet></eSummaryResult>
+"""
+
+SNP_ESUMMARY_JSON = {'header':{'type':'esummary','version':'0.3'},
+                     'result':{'uids':['334','12','99'],
+                               '334':{'uid':'334','snp_id':334,'allele_origin':'',
+                                      'global_mafs':[{'study':'1000Genomes','freq':'T=0.012'},
+                                                     {'study':'GnomAD','freq':'T=0.004'}],
+                                      'clinical_significance':'pathogenic',
+                                      'genes':[{'name':'HBB','gene_id':'3043'},{'name':'LOC1','gene_id':'106099062'}],
+                                      'chr':'11','fxn_class':'coding_sequence_variant,missense_variant',
+                                      'docsum':'HGVS=NC_000011.10:g.5227002T>A|SEQ=[T/A]|LEN=1|GENE=HBB:3043',
+                                      'tax_id':9606,'ss':'ss1,ss3','chrpos':'11:5227002',
+                                      'snp_id_sort':'0000000334'},
+                               '12':{'uid':'12','snp_id':12,'allele_origin':'','global_mafs':[],
+                                     'clinical_significance':'','genes':[],'chr':'1','fxn_class':'',
+                                     'docsum':'HGVS=NC_000001.11:g.1001C>G|SEQ=[C/G]|LEN=1',
+                                     'tax_id':9606,'ss':'ss12','chrpos':'1:1001','snp_id_sort':'0000000012'},
+                               '99':{'uid':'99','error':'cannot get document summary'}}}
+
+
+def parsed_summary(columns):
+    # As read back from shards (see hgd_split.read_shard)
+    df = pd.DataFrame(columns)
+    df.columns = [c.upper() for c in df.columns]
+    return df
+
+
+class esummaryParseTests(unittest.TestCase):
+    def test_scalar_fields_match_entrez_read(self):
+        from Bio import Entrez
+        records = Entrez.read(io.BytesIO(GENE_ESUMMARY_XML))['DocumentSummarySet']['DocumentSummary']
+        columns = ncbi_utils.parse_esummary_xml(io.BytesIO(GENE_ESUMMARY_XML))
+
+        self.assertEqual(columns['uid'],[r.attributes['uid'] for r in records])
+        for field in ['Name','OtherAliases','NomenclatureStatus','Summary','ChrStart']:
+            self.assertEqual(columns[field],[r[field] for r in records])
+
+    def test_nested_fields_flattened(self):
+        df = parsed_summary(ncbi_utils.parse_esummary_xml(io.BytesIO(GENE_ESUMMARY_XML)))
+        # First placement only, & missing for a gene without one
+        self.assertEqual(df['GENOMICINFO_CHRSTART'].tolist()[0],'7687489')
+        self.assertTrue(pd.isnull(df['GENOMICINFO_CHRSTART'].tolist()[1]))
+        self.assertEqual(df['ORGANISM_TAXID'].tolist(),['9606','9606'])
+        self.assertEqual(df['MIM'].tolist(),['191170','313110,313111'])
+        self.assertEqual(df['LOCATIONHIST_ANNOTATIONRELEASE'].tolist()[0],'110,105')
+
+        snp_df = parsed_summary(ncbi_utils.parse_esummary_xml(io.BytesIO(SNP_ESUMMARY_XML)))
+        self.assertEqual(snp_df['UID'].tolist(),['334','12'])
+        self.assertEqual(snp_df['GENES_GENE_ID'].tolist()[0],'3043,106099062')
+        self.assertEqual(snp_df['DOCSUM_HGVS'].tolist(),['NC_000011.10:g.5227002T>A','NC_000001.11:g.1001C>G'])
+        self.assertEqual(snp_df['DOCSUM_SEQ'].tolist(),['[T/A]','[C/G]'])
+
+    def test_json_matches_xml(self):
+        xml_df = parsed_summary(ncbi_utils.parse_esummary_xml(io.BytesIO(SNP_ESUMMARY_XML)))
+        json_bytes = io.BytesIO(json.dumps(SNP_ESUMMARY_JSON).encode())
+        json_df = parsed_summary(ncbi_utils.parse_esummary_json(json_bytes))
+        pd.testing.assert_frame_equal(json_df[sorted(json_df.columns)],xml_df[sorted(xml_df.columns)])
+
+    def test_error_response_raises(self):
+        with self.assertRaises(RuntimeError):
+            ncbi_utils.parse_esummary_xml(io.BytesIO(b'<eSummaryResult><ERROR>Invalid uid</ERROR></eSummaryResult>'))
+
+    def test_summaries_processed(self):
+        gene_data = ncbi_utils.process_gene_summary(
+            parsed_summary(ncbi_utils.parse_esummary_xml(io.BytesIO(GENE_ESUMMARY_XML))))
+        gene_df = gene_data['gene_summary']
+        self.assertEqual(gene_df['GENE_ID'].tolist(),[6,7157])
+        self.assertEqual(gene_df['CHRSTART'].tolist(),[0,7687489])
+        self.assertEqual(str(gene_df['CHRSTART'].dtype),'Int64')
+        self.assertTrue(pd.isnull(gene_df['EXONCOUNT'].tolist()[0]))
+        self.assertFalse([c for c in gene_df.columns if c.startswith(('GENOMICINFO','ORGANISM','LOCATIONHIST'))])
+        self.assertEqual(gene_data['gene_summary_omim_lookup']['OMIM_ID'].tolist(),['191170','313110','313111'])
+
+        snp_data = ncbi_utils.process_snp_summary(
+            parsed_summary(ncbi_utils.parse_esummary_xml(io.BytesIO(SNP_ESUMMARY_XML))))
+        self.assertEqual(snp_data['snp_summary']['SEQ'].tolist(),['[T/A]','[C/G]'])
+        self.assertEqual(snp_data['snp_summary_gene_lookup']['GENE_ID'].tolist(),[3043,106099062])
+        self.assertEqual(snp_data['snp_summary_ss_lookup']['SS'].tolist(),['ss1','ss3','ss12'])
+        self.assertFalse([c for c in snp_data['snp_summary'].columns
+                          if c.startswith(('GENES','DOCSUM','GLOBAL_MAFS','UID'))])
+
+    def test_gene_transform_matches_legacy(self):
+        raw = parsed_summary(ncbi_utils.parse_esummary_xml(io.BytesIO(GENE_ESUMMARY_XML)))
+        # Aliases with empty items, mitochondrial symbols, MIM lists with empty items & missing chromosomes
+        extra = raw.assign(UID=['8','9'],OTHERALIASES=['A, , B',''],MIM=[',1',None],NOMENCLATURESYMBOL=['MT-CO3',''],
+                           NAME=['CO3','X'],CHROMOSOME=['X, Y',None])
+        raw = pd.concat([raw,extra],ignore_index=True)
+
+        expected = legacy_process_gene_summary(raw.copy())
+        result = ncbi_utils.process_gene_summary(raw.copy())
+        for db_table in expected:
+            pd.testing.assert_frame_equal(result[db_table],expected[db_table])
+
+    def test_snp_transform_matches_legacy(self):
+        raw = parsed_summary(ncbi_utils.parse_esummary_xml(io.BytesIO(SNP_ESUMMARY_XML)))
+        # Empty items, lists with one item & SNPs without any genes
+        extra = raw.iloc[[0,1,0]].assign(SNP_ID=['5','6','7'],GENES_GENE_ID=['1,,2',np.NaN,'3'],
+                                         SS=['ss5,','',np.NaN],FXN_CLASS=[',x','y',''])
+        raw = pd.concat([raw,extra],ignore_index=True)
+
+        expected = legacy_process_snp_summary(raw.copy())
+        result = ncbi_utils.process_snp_summary(raw.copy())
+        for db_table in expected:
+            pd.testing.assert_frame_equal(result[db_table],expected[db_table])
+
+        no_genes = raw.drop(columns=[c for c in raw.columns if c.startswith('GENES')])
+        pd.testing.assert_frame_equal(ncbi_utils.process_snp_summary(no_genes.copy())['snp_summary_gene_lookup'],
+                                      legacy_process_snp_summary(no_genes.copy())['snp_summary_gene_lookup'])
+
+
+################################################################################################################
+# Streaming FTP ingest (ncbi_utils.read_ftp_file)
+################################################################################################################
+
+class ftpIngestTests(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree,tmp_dir)
+        self.file_path = os.path.join(tmp_dir,'gene2go.gz')
+
+        lines = ['#tax_id\tGeneID\tGO_ID\tEvidence\tQualifier\tGO_term\tPubMed\tCategory']
+        for i in range(300):
+            tax_id = [3702,9606,96060,10090][i%4]
+            lines.append(f'{tax_id}\t{i}\tGO:{i:07d}\tIEA\tenables\tterm {i}\t{i}|{i+1}\tFunction')
+        # Last line without a trailing newline
+        with gzip.open(self.file_path,'wt') as f:
+            f.write('\n'.join(lines + ['9606\t999\tGO:0000999\tIEA\tenables\tlast\t-\tProcess']))
+
+        original = ncbi_utils.ftp_file_path
+        ncbi_utils.ftp_file_path = lambda db_table: self.file_path
+        self.addCleanup(setattr,ncbi_utils,'ftp_file_path',original)
+        for name,value in [('FTP_STREAM_INGEST',True),('FTP_CHUNK_BYTES',100)]:
+            self.addCleanup(setattr,ncbi_utils.cfg,name,getattr(ncbi_utils.cfg,name))
+            setattr(ncbi_utils.cfg,name,value)
+
+    def test_human_rows_streamed(self):
+        df = ncbi_utils.read_ftp_file('gene2go')
+
+        full_df = pd.read_csv(self.file_path,sep='\t')
+        expected = full_df[full_df['#tax_id']==9606].drop(columns=['PubMed']).reset_index(drop=True)
+        pd.testing.assert_frame_equal(df,expected,check_dtype=False,check_categorical=False)
+        self.assertEqual(df['GeneID'].tolist()[-1],999)
+        self.assertEqual(df['Evidence'].dtype,'category')
+
+    def test_processed_output_unchanged(self):
+        streamed = ncbi_utils.process_gene2go(ncbi_utils.read_ftp_file('gene2go'))['gene2go']
+        full = ncbi_utils.process_gene2go(pd.read_csv(self.file_path,sep='\t'))['gene2go']
+        pd.testing.assert_frame_equal(streamed,full,check_dtype=False,check_categorical=False)
+
+
+################################################################################################################
+# Normalizing multi-valued columns (utils/hgd_normalize.py)
+################################################################################################################
+
+class normalizeTests(unittest.TestCase):
+    def test_split_matches_explode(self):
+        values = ['a|b','c','','d||e|','|f']
+        for sep in ['|',', ','; ']:
+            col = pd.Series([v.replace('|',sep) for v in values])
+            items, counts = hgdnorm.split_items(col,sep)
+            expected = col.str.split(sep).explode()
+            self.assertEqual(list(items),expected.tolist())
+            self.assertEqual(list(col.index.repeat(counts)),expected.index.tolist())
+
+        items, counts = hgdnorm.split_items([],'|')
+        self.assertEqual((len(items),len(counts)),(0,0))
+
+    def test_lookup_table(self):
+        df = pd.DataFrame({'GENE_ID':[1,2,3,4],'DBXREFS':['MIM:138670|HGNC:HGNC:5','-',np.NaN,'Ensembl:E1|']},
+                          index=[10,11,12,13])
+        lookup = hgdnorm.normalize_column(df,'GENE_ID','DBXREFS','|',fields={'REF_ID':-1,'REF':0},missing=('-',),
+                                          drop_empty=True,source='gene_info')
+        expected = pd.DataFrame({'GENE_ID':[1,1,4],'REF_ID':['138670','5','E1'],'REF':['MIM','HGNC','Ensembl'],
+                                 'LOOKUP_SOURCE':'gene_info'})
+        pd.testing.assert_frame_equal(lookup,expected)
+
+        kept = hgdnorm.normalize_column(df,'GENE_ID','DBXREFS','|',name='REF',missing=('-',),keep_index=True)
+        self.assertEqual(kept.index.tolist(),[10,10,13,13])
+        self.assertEqual(kept['REF'].tolist(),['MIM:138670','HGNC:HGNC:5','Ensembl:E1',''])
+
+        # Lookup rows per value, in the order of the frame
+        _, counts = hgdnorm.normalize_column(df,'GENE_ID','DBXREFS','|',missing=('-',),drop_empty=True,
+                                             return_counts=True)
+        self.assertEqual(counts.tolist(),[2,0,0,1])
+
+    def test_missing_field_raises(self):
+        with self.assertRaises(ValueError):
+            hgdnorm.split_field(np.array(['cat:feature','no_category'],dtype=object),':',1)
+
+
+################################################################################################################
+# Typed table schemas (utils/hgd_schema.py)
+################################################################################################################
+
+GENE_INFO_TSV = (
+    '#tax_id\tGeneID\tSymbol\tLocusTag\tSynonyms\tdbXrefs\tchromosome\tmap_location\tdescription\t'
+    'type_of_gene\tSymbol_from_nomenclature_authority\tFull_name_from_nomenclature_authority\t'
+    'Nomenclature_status\tOther_designations\tModification_date\tFeature_type\n'
+    '9606\t1\tA1BG\t-\tA1B|ABG\tMIM:138670|HGNC:HGNC:5\t19\t19q13.43\talpha-1-B glycoprotein\t'
+    'protein-coding\tA1BG\talpha-1-B glycoprotein\tO\tHEL-S-163pA\t20240101\t-\n'
+    '9606\t7\t7\t-\t-\t-\tX|Y\t-\tseven\tunknown\t-\t-\t-\t-\t20240101\tgene:x\n'
+    '9606\t10\tNAT2\t-\tAAC2\tMIM:612182\t8\t8p22\tN-acetyltransferase 2\t'
+    'protein-coding\tNAT2\tN-acetyltransferase 2\tO\tarylamide acetylase 2\t20240101\t-\n')
+
+
+class tableSchemaTests(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree,tmp_dir)
+        self.addCleanup(os.chdir,os.getcwd())
+        os.chdir(tmp_dir)
+
+    def test_raw_file_read_with_schema(self):
+        schema = hgdschema.get_schema('ncbi','gene_info','raw')
+        df = hgdschema.read_csv(io.BytesIO(GENE_INFO_TSV.encode()),schema,sep='\t')
+
+        self.assertNotIn('LocusTag',df.columns)
+        self.assertNotIn('Modification_date',df.columns)
+        self.assertEqual(df['GeneID'].dtype,'int64')
+        self.assertEqual(df['chromosome'].dtype,'category')
+        # Declared as text - not inferred as a number
+        self.assertEqual(df['Symbol'].tolist(),['A1BG','7','NAT2'])
+
+        typed = ncbi_utils.process_gene_info(df)
+        untyped = ncbi_utils.process_gene_info(pd.read_csv(io.StringIO(GENE_INFO_TSV),sep='\t'))
+        for db_table in untyped:
+            pd.testing.assert_frame_equal(typed[db_table],untyped[db_table],check_dtype=False,
+                                          check_categorical=False)
+
+    def test_raw_text_kept_as_published(self):
+        # Gene symbol 'NA' (gene 65) & an empty description are values of a raw file, not missing ones
+        raw_tsv = GENE_INFO_TSV.replace('\tNAT2\t-\tAAC2','\tNA\t-\tAAC2').replace('N-acetyltransferase 2\tprotein','\tprotein')
+        schema = hgdschema.get_schema('ncbi','gene_info','raw')
+        df = hgdschema.read_csv(io.BytesIO(raw_tsv.encode()),schema,raw=True,sep='\t')
+        self.assertEqual(df['Symbol'].tolist(),['A1BG','7','NA'])
+        self.assertEqual(df['description'].tolist()[-1],'')
+        self.assertFalse(df.isnull().any().any())
+
+        hgd.save_data(df,'gene_info','ncbi','raw')
+        pd.testing.assert_frame_equal(hgd.load_data('gene_info','raw','ncbi'),df)
+
+    def test_processed_tables_round_trip(self):
+        gene_data = ncbi_utils.process_gene_summary(
+            parsed_summary(ncbi_utils.parse_esummary_xml(io.BytesIO(GENE_ESUMMARY_XML))))
+        # Genes with a name & symbols - empty strings are read back from a flat file as missing
+        kegg_data = kegg_utils.process_gene(pd.DataFrame(keggTransformTests.raw['gene'][:3],
+                                                         columns=['GENE_ID','GENE_TYPE','CHROMOSOMAL_POSITION',
+                                                                  'GENE_SYMBOL_AND_NAME']))
+
+        for source,proc_data in [('ncbi',gene_data),('kegg',kegg_data)]:
+            for db_table,df in proc_data.items():
+                typed = hgdschema.apply_schema(df,hgdschema.get_schema(source,db_table,'processed'))
+                hgd.save_data(df,db_table,source,'processed')
+                loaded = hgd.load_data(db_table,'processed',source)
+                pd.testing.assert_frame_equal(loaded,typed.reset_index(drop=True))
+
+                if db_table == 'gene':
+                    self.assertEqual(str(loaded['CHRSTART'].dtype),'Int64')
+                    self.assertEqual(loaded['GENE_TYPE'].dtype,'category')
+
+
+
+
+################################################################################################################
+# dbSNP bulk loader (ncbi_pipe/dbsnp_utils.py)
+################################################################################################################
+
+class dbsnpLoaderTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree,self.tmp_dir)
+        self.definitions = dbsnp_utils.table_definitions()
+
+    def test_schema_scripts_translated(self):
+        for script in ['index','constraint']:
+            statements = dbsnp_utils.script_statements(script)
+            self.assertTrue(statements)
+            for statement in statements:
+                self.assertIsNotNone(dbsnp_utils.mysql_statement(statement,self.definitions),statement)
+
+        self.assertEqual(self.definitions['SNP_tax_id'][0],('snp_id','int',False))
+        self.assertEqual(self.definitions['Allele'][2],('create_time','datetime',False))
+        constraints = dbsnp_utils.post_load_statements('constraint',self.definitions)
+        self.assertIn('ALTER TABLE `Allele` ADD PRIMARY KEY (`allele_id`)',constraints['Allele'])
+        indexes = dbsnp_utils.post_load_statements('index',self.definitions)
+        self.assertIn('CREATE INDEX `i_u_var_str` ON `UniVariation` (`var_str_left`(255))',indexes['UniVariation'])
+
+        # Foreign keys come last & only between loaded tables
+        keys, foreign_keys = dbsnp_utils.split_foreign_keys(constraints)
+        self.assertIn('Batch_tax_id',foreign_keys)
+        self.assertFalse(any('FOREIGN KEY' in s for statements in keys.values() for s in statements))
+        partial = dbsnp_utils.post_load_statements('constraint',self.definitions,tables=['Batch_tax_id','Allele'])
+        self.assertNotIn('Batch_tax_id',partial)
+        self.assertIn('Allele',partial)
+
+    def test_dump_partitioned_by_chromosome(self):
+        file_path = os.path.join(self.tmp_dir,'SNPChrPosOnRef.bcp.gz')
+        rows = [f'{i}\t{["1","2","X","MT",""][i%5]}\t{i*10}' for i in range(500)]
+        with gzip.open(file_path,'wt') as f:
+            f.write('\n'.join(rows) + '\n')
+
+        partitions, n_rows = dbsnp_utils.partition_dump('SNPChrPosOnRef',file_path,['snp_id','chr','pos'],
+                                                        self.tmp_dir,chunk_rows=64)
+        self.assertEqual(n_rows,500)
+        self.assertEqual(sorted(partitions),['1','2','MT','X','unknown'])
+        with open(partitions['X']) as f:
+            self.assertEqual(f.read().split('\n')[:2],['2\tX\t20','7\tX\t70'])
+
+        loaded = []
+        for path in partitions.values():
+            with open(path) as f:
+                loaded += f.read().splitlines()
+        self.assertEqual(sorted(loaded),sorted(rows))
+
+    def test_dump_partitioned_by_id_hash(self):
+        file_path = os.path.join(self.tmp_dir,'SNP_tax_id.bcp.gz')
+        with gzip.open(file_path,'wt') as f:
+            f.write(''.join(f'{i}\t9606\t2017-01-01 00:00:00.0\t\n' for i in range(300)))
+
+        columns = [column for column,_,_ in self.definitions['SNP_tax_id']]
+        partitions, n_rows = dbsnp_utils.partition_dump('SNP_tax_id',file_path,columns,self.tmp_dir,
+                                                        n_buckets=4,chunk_rows=50)
+        self.assertEqual((len(partitions),n_rows),(4,300))
+
+        statement = dbsnp_utils.load_data_statement('SNP_tax_id',partitions['0'],columns)
+        self.assertIn("INTO TABLE `SNP_tax_id`",statement)
+        self.assertIn("`status`=NULLIF(@v3,'')",statement)
+
+
+################################################################################################################
+# Reactome mapping files (source_pipes/reactome_pipe)
+################################################################################################################
+
+class reactomeIngestTests(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree,tmp_dir)
+        self.file_path = os.path.join(tmp_dir,'NCBI2Reactome_PE_All_Levels.txt')
+
+        lines = []
+        for i in range(200):
+            species = ['Homo sapiens','Mus musculus','Bos taurus','Homo sapiens'][i%4]
+            code = 'HSA' if species == 'Homo sapiens' else 'MMU'
+            lines.append(f'{i%30}\tR-{code}-{i%50}\tGENE{i%50} [{["cytosol","nucleoplasm"][i%50%2]}]\t'
+                         f'R-{code}-{1000+i%7}\thttps://reactome.org/PathwayBrowser/#/R-{code}-{1000+i%7}\t'
+                         f'Pathway {i%7}\t{["IEA","TAS"][i%2]}\t{species}')
+        # Complexes keep their name as published ("NA" is not missing); the last line has no trailing newline
+        lines.append('7\tR-HSA-99\tNA:NA complex\tR-HSA-1000\thttps://reactome.org\tPathway 0\tTAS\tHomo sapiens')
+        with open(self.file_path,'w') as f:
+            f.write('\n'.join(lines))
+
+        self.addCleanup(setattr,reactome_utils.cfg,'REACTOME_CHUNK_BYTES',reactome_utils.cfg.REACTOME_CHUNK_BYTES)
+        reactome_utils.cfg.REACTOME_CHUNK_BYTES = 100
+
+    def test_human_rows_streamed(self):
+        df = reactome_utils.read_mapping_file('pathway',self.file_path)
+
+        columns = [c.upper() for c in reactome_utils.db_table_dict['pathway']['columns']]
+        full_df = pd.read_csv(self.file_path,sep='\t',header=None,names=columns,dtype={c:str for c in columns[1:]},
+                              keep_default_na=False)
+        expected = full_df[full_df['SPECIES']=='Homo sapiens'].drop(columns=['URL','SPECIES']).reset_index(drop=True)
+        pd.testing.assert_frame_equal(df,expected,check_dtype=False,check_categorical=False)
+        self.assertEqual(df['PE_NAME'].tolist()[-1],'NA:NA complex')
+        self.assertEqual(df['GENE_ID'].dtype,'int64')
+
+    def test_pathway_tables_normalized(self):
+        proc_data = reactome_utils.process_pathway(reactome_utils.read_mapping_file('pathway',self.file_path))
+
+        pathways = proc_data['pathway']
+        self.assertTrue(pathways['PATHWAY_ID'].is_unique)
+        self.assertTrue(pathways['PATHWAY_ID'].str.startswith('R-HSA-').all())
+
+        entities = proc_data['physical_entity'].set_index('PE_ID')
+        self.assertEqual(entities.loc['R-HSA-3',['PE_NAME','COMPARTMENT']].tolist(),['GENE3','nucleoplasm'])
+        self.assertEqual(entities.loc['R-HSA-99','PE_NAME'],'NA:NA complex')
+        self.assertTrue(pd.isnull(entities.loc['R-HSA-99','COMPARTMENT']))
+
+        lookup = proc_data['gene_pathway_lookup']
+        self.assertEqual(lookup.columns.tolist(),['GENE_ID','PE_ID','PATHWAY_ID','EVIDENCE'])
+        self.assertFalse(lookup.duplicated().any())
+        self.assertTrue(lookup['PATHWAY_ID'].isin(pathways['PATHWAY_ID']).all())
+
+    def test_omim_ids_typed_like_database(self):
+        omim_path = os.path.join(os.path.dirname(self.file_path),'Reactome2OMIM.txt')
+        with open(omim_path,'w') as f:
+            f.write('100050\tR-HSA-1000\thttps://reactome.org\tPathway 0\tTAS\tHomo sapiens\n'
+                    '100070\tR-MMU-1000\thttps://reactome.org\tPathway 0\tTAS\tMus musculus\n')
+
+        omim_df = reactome_utils.process_omim(reactome_utils.read_mapping_file('omim',omim_path))['pathway_omim_lookup']
+        self.assertEqual(omim_df['OMIM_ID'].tolist(),[100050])
+        self.assertEqual(omim_df['OMIM_ID'].dtype,'int64')
+        schema = reactome_utils.table_schemas['processed']['pathway_omim_lookup']
+        pd.testing.assert_frame_equal(hgdschema.apply_schema(omim_df,schema),omim_df)
+
+
+
+################################################################################################################
+# Table-parallel execution (utils/hgd_parallel.py)
+################################################################################################################
+
+def parallel_table_task(db_table,failing_table):
+    # Module-level, so spawned worker processes can import it
+    if db_table == failing_table:
+        raise ValueError(f'{db_table} is broken')
+    return {db_table:pd.DataFrame({'ROW':range(len(db_table))})}, os.getpid()
+
+
+def split_in_worker_task(db_table):
+    hgdsplit.cfg.NCPU_MAX = 4
+    return hgdsplit.use_split({'row_local':True})
+
+
+def crashing_table_task(db_table,crashing_table):
+    if db_table == crashing_table:
+        # Worker dies without raising
+        os._exit(1)
+    return db_table
+
+
+class parallelRefreshTests(unittest.TestCase):
+    def test_tables_run_in_workers_with_errors_isolated(self):
+        db_tables = ['gene','pathway','disease','module']
+        results, errors = hgdpar.run_tables(parallel_table_task,db_tables,'disease',workers=2)
+
+        self.assertEqual(sorted(results),['gene','module','pathway'])
+        self.assertEqual(errors,{'disease':'ValueError: disease is broken'})
+        self.assertEqual(len(results['pathway'][0]['pathway']),len('pathway'))
+        self.assertNotIn(os.getpid(),{pid for _,pid in results.values()})
+
+    def test_dying_worker_only_fails_its_table(self):
+        db_tables = ['a','b','c','d']
+        results, errors = hgdpar.run_tables(crashing_table_task,db_tables,'a',workers=2)
+
+        self.assertEqual(results,{'b':'b','c':'c','d':'d'})
+        self.assertEqual(errors,{'a':'BrokenProcessPool: worker process died'})
+
+    def test_table_workers_do_not_split(self):
+        self.addCleanup(setattr,hgdsplit.cfg,'NCPU_MAX',hgdsplit.cfg.NCPU_MAX)
+        hgdsplit.cfg.NCPU_MAX = 4
+        self.assertTrue(hgdsplit.use_split({'row_local':True}))
+
+        # A pool per table worker would start NCPU_MAX^2 processes
+        results, errors = hgdpar.run_tables(split_in_worker_task,['snp_summary','gene2go'],workers=2)
+        self.assertEqual(results,{'snp_summary':False,'gene2go':False})
+
+    def test_worker_spans_merged_into_report(self):
+        worker_metrics = hgdmet.metricsRecorder('worker')
+        with worker_metrics.span('refresh','gene'):
+            with worker_metrics.span('transform','gene') as span:
+                span.record(rows_out=10)
+
+        metrics = hgdmet.metricsRecorder('parent')
+        metrics.add_spans(worker_metrics.spans)
+        metrics.record_error('refresh','disease','ValueError: disease is broken')
+
+        summary = metrics.table_summary()
+        self.assertEqual(summary['gene']['transform']['rows_out'],10)
+        self.assertEqual(summary['disease']['refresh']['errors'],1)
+        self.assertEqual(metrics.report()['spans'][1]['error'],'ValueError: disease is broken')
+
+    def test_source_reports_combined(self):
+        recorders = {}
+        for source,seconds in [('kegg',0.02),('ncbi',0.06)]:
+            recorders[source] = hgdmet.metricsRecorder(f'{source}_refresh')
+            with recorders[source].span('extract','gene'):
+                time.sleep(seconds)
+            with recorders[source].span('transform','gene'):
+                pass
+
+        report = hgdmet.combined_report(recorders,errors={'kegg':{},'ncbi':{'gene2go':'ValueError: broken'}})
+        self.assertEqual(report['sources_by_wall_s'],['ncbi','kegg'])
+        self.assertGreaterEqual(report['source_wall_s']['ncbi'],0.06)
+        self.assertEqual(report['errors'],{'ncbi':{'gene2go':'ValueError: broken'}})
+        self.assertEqual(report['sources']['kegg']['tables']['gene']['extract']['count'],1)
+
+
+################################################################################################################
+# Row-sharded transforms (utils/hgd_split.py)
+################################################################################################################
+
+class splitTransformTests(unittest.TestCase):
+    def setUp(self):
+        self.shard_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree,self.shard_dir,True)
+
+    def assert_same_tables(self,result,expected,source='ncbi'):
+        # Compared as transform_table returns them - cast to the processed schemas
+        self.assertEqual(list(result),list(expected))
+        for db_table in expected:
+            schema = hgdschema.get_schema(source,db_table,'processed')
+            pd.testing.assert_frame_equal(hgdschema.apply_schema(result[db_table],schema),
+                                          hgdschema.apply_schema(expected[db_table],schema))
+
+    def test_gene_info_shards_match_whole_table(self):
+        schema = ncbi_utils.table_schemas['raw']['gene_info']
+        one = hgdschema.read_csv(io.BytesIO(GENE_INFO_TSV.encode()),schema,sep='\t')
+        raw = pd.concat([one.assign(GeneID=one['GeneID'] + 100*i) for i in range(10)],ignore_index=True)
+
+        result = hgdsplit.split_transform(ncbi_utils.process_gene_info,raw.copy(),shard_rows=7,workers=2)
+        self.assert_same_tables(result,ncbi_utils.process_gene_info(raw.copy()))
+        # Lookups keep the raw row order across shards
+        self.assertEqual(result['gene_info_symbol_lookup']['GENE_ID'].tolist()[:4],[1,1,10,101])
+
+    def test_gene2go_read_a_shard_at_a_time(self):
+        lines = ['#tax_id\tGeneID\tGO_ID\tEvidence\tQualifier\tGO_term\tCategory']
+        lines += [f'9606\t{i}\tGO:{i:07d}\tIEA\tenables\tterm {i}\tFunction' for i in range(50)]
+        file_path = os.path.join(self.shard_dir,'gene2go.csv')
+        with open(file_path,'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+        schema = ncbi_utils.table_schemas['raw']['gene2go']
+        reader = hgdschema.read_csv(file_path,schema,sep='\t',chunksize=12)
+        result = hgdsplit.split_transform(ncbi_utils.process_gene2go,reader,workers=2)
+        expected = ncbi_utils.process_gene2go(hgdschema.read_csv(file_path,schema,sep='\t'))
+        self.assert_same_tables(result,expected)
+        self.assertEqual(result['gene2go'].index.tolist(),list(range(50)))
+
+    def test_snp_summary_checkpoint_shards_read_by_workers(self):
+        raw = parsed_summary(ncbi_utils.parse_esummary_xml(io.BytesIO(SNP_ESUMMARY_XML)))
+        raw = pd.concat([raw.assign(SNP_ID=[str(int(s) + 10*i) for s in raw['SNP_ID']]) for i in range(6)],
+                        ignore_index=True)
+        raw.loc[::3,'GENES_GENE_ID'] = np.NaN
+
+        shards = hgdshards.shardStore('snp_summary',shard_dir=self.shard_dir)
+        shards.start(len(raw),4)
+        for offset in range(0,len(raw),4):
+            shards.write_shard(offset,raw.iloc[offset:offset + 4].rename(columns=str.lower))
+
+        result = hgdsplit.split_transform(ncbi_utils.process_snp_summary,str(shards.manifest_path),
+                                          shard_rows=5,workers=2)
+        self.assert_same_tables(result,ncbi_utils.process_snp_summary(raw.copy()))
+
+    def test_summary_pulls_processed_a_shard_at_a_time(self):
+        raw = parsed_summary(ncbi_utils.parse_esummary_xml(io.BytesIO(GENE_ESUMMARY_XML)))
+        raw = pd.concat([raw.assign(UID=[str(int(u) + 10*i) for u in raw['UID']]) for i in range(4)][::-1],
+                        ignore_index=True)
+        shards = hgdshards.shardStore('gene_summary',shard_dir=self.shard_dir)
+        shards.start(len(raw),2)
+        for offset in range(0,len(raw),2):
+            shards.write_shard(offset,raw.iloc[offset:offset + 2].rename(columns=str.lower))
+
+        # Never more than a shard of raw rows at once
+        rows_read = []
+        def process(df):
+            rows_read.append(len(df))
+            return {'rows':df}
+        hgdsplit.serial_transform(process,str(shards.manifest_path),shard_rows=3)
+        self.assertEqual(sum(rows_read),len(raw))
+        self.assertLessEqual(max(rows_read),4)
+
+        expected = ncbi_utils.process_gene_summary(raw.copy())
+        result = ncbi_utils.process_gene_summary(str(shards.manifest_path))
+        pd.testing.assert_frame_equal(result['gene_summary'],expected['gene_summary'])
+        # Lookup rows are grouped by shard
+        for db_table in ['gene_summary_symbol_lookup','gene_summary_omim_lookup']:
+            sort = lambda df: df.sort_values(list(df.columns)).reset_index(drop=True)
+            pd.testing.assert_frame_equal(sort(result[db_table]),sort(expected[db_table]))
+
+    def test_only_row_local_tables_split(self):
+        self.addCleanup(setattr,hgdsplit.cfg,'NCPU_MAX',hgdsplit.cfg.NCPU_MAX)
+        hgdsplit.cfg.NCPU_MAX = 4
+        split_tables = [t for t,params in ncbi_utils.db_table_dict.items() if hgdsplit.use_split(params)]
+        self.assertEqual(split_tables,['gene_info','gene2go','snp_summary'])
+
+        hgdsplit.cfg.NCPU_MAX = 1
+        self.assertFalse(hgdsplit.use_split(ncbi_utils.db_table_dict['gene_info']))
+
+
+################################################################################################################
+# Pipelined stage scheduler (utils/hgd_scheduler.py)
+################################################################################################################
+
+class stageSchedulerTests(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        self.lock = threading.Lock()
+        self.active = {}
+        self.peak = {}
+
+    def stage(self,name,resource,seconds=0.05,fail=False):
+        with self.lock:
+            self.events.append(('start',name))
+            self.active[resource] = self.active.get(resource,0) + 1
+            self.peak[resource] = max(self.peak.get(resource,0),self.active[resource])
+        time.sleep(seconds)
+        with self.lock:
+            self.active[resource] -= 1
+            self.events.append(('end',name))
+        if fail:
+            raise ValueError(f'{name} is broken')
+        return name
+
+    def add(self,scheduler,name,resource,deps=(),fail=False):
+        scheduler.add(name,self.stage,name,resource,0.05,fail,resource=resource,deps=deps)
+
+    def position(self,event,name):
+        return self.events.index((event,name))
+
+    def test_foreign_keys_from_schema(self):
+        references = hgdsched.foreign_keys()
+        self.assertEqual(references['kegg_human_gene_symbol_lookup'],['kegg_human_gene'])
+        self.assertNotIn('kegg_human_gene',references)
+        self.assertEqual(hgdsched.load_dependencies('kegg','gene_symbol_lookup',references),['gene'])
+        self.assertEqual(hgdsched.load_dependencies('reactome','gene_pathway_lookup',references),
+                         ['pathway','physical_entity'])
+
+    def test_tables_created_from_schema(self):
+        statements = hgdsched.create_statements()
+        # Every table the load order follows is created with its foreign keys
+        for table,parents in hgdsched.foreign_keys().items():
+            for parent in parents:
+                self.assertIn(f'REFERENCES `{parent}`',statements[table])
+        statement = statements[hgdsched.schema_table('kegg','gene_symbol_lookup')]
+        self.assertTrue(statement.startswith('CREATE TABLE `kegg_human_gene_symbol_lookup` ('))
+        self.assertTrue(statement.endswith('COLLATE=utf8mb4_0900_ai_ci'))
+
+    def test_stages_overlap_within_resource_limits(self):
+        scheduler = hgdsched.stageScheduler({'network':2,'cpu':1,'db':1})
+        for table in ['a','b','c','d']:
+            self.add(scheduler,f'extract:{table}','network')
+            self.add(scheduler,f'transform:{table}','cpu',deps=[f'extract:{table}'])
+            self.add(scheduler,f'load:{table}','db',deps=[f'transform:{table}'])
+        results, errors = scheduler.run()
+
+        self.assertEqual(errors,{})
+        self.assertEqual(len(results),12)
+        self.assertEqual(self.peak,{'network':2,'cpu':1,'db':1})
+        # The next tables are extracted while the first is processed
+        self.assertLess(self.position('start','extract:c'),self.position('end','transform:a'))
+        self.assertLess(self.position('start','transform:b'),self.position('end','load:a'))
+
+    def test_loads_follow_foreign_keys_added_while_running(self):
+        scheduler = hgdsched.stageScheduler({'network':1,'cpu':1,'db':2})
+        references = {'kegg_human_gene_symbol_lookup':['kegg_human_gene'],'kegg_human_variant':['kegg_human_absent']}
+
+        def transform(outputs):
+            for table,seconds in outputs.items():
+                deps = [f'load:{t}' for t in hgdsched.load_dependencies('kegg',table,references)]
+                scheduler.add(f'load:{table}',self.stage,f'load:{table}','db',seconds,resource='db',deps=deps)
+
+        # The referenced table comes from a later (slower) transform
+        scheduler.add('transform:lookup',transform,{'gene_symbol_lookup':0.01,'variant':0.01},expands=True)
+        self.add(scheduler,'transform:gene','cpu')
+        scheduler.add('expand:gene',transform,{'gene':0.1},deps=['transform:gene'],expands=True)
+        results, errors = scheduler.run()
+
+        self.assertEqual(errors,{})
+        self.assertLess(self.position('end','load:gene'),self.position('start','load:gene_symbol_lookup'))
+        # Referenced table not in the run - loaded once no transform can add it
+        self.assertEqual(results['load:variant'],'load:variant')
+        self.assertLess(self.position('end','transform:gene'),self.position('start','load:variant'))
+
+    def test_failed_stage_skips_dependents_only(self):
+        scheduler = hgdsched.stageScheduler({'network':2,'cpu':1,'db':1})
+        self.add(scheduler,'extract:a','network',fail=True)
+        self.add(scheduler,'transform:a','cpu',deps=['extract:a'])
+        self.add(scheduler,'load:a','db',deps=['transform:a'])
+        self.add(scheduler,'extract:b','network')
+        results, errors = scheduler.run()
+
+        self.assertEqual(errors,{'extract:a':'ValueError: extract:a is broken',
+                                 'transform:a':'Skipped: extract:a failed',
+                                 'load:a':'Skipped: transform:a failed'})
+        self.assertEqual(results,{'extract:b':'extract:b'})
+        with self.assertRaises(ValueError):
+            self.add(scheduler,'extract:b','network')
+
+
+################################################################################################################
+# Incremental loads (utils/hgd_delta.py)
+################################################################################################################
+
+class deltaLoadTests(unittest.TestCase):
+    def setUp(self):
+        snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree,snapshot_dir,True)
+        self.addCleanup(setattr,hgddelta.cfg,'DELTA_SNAPSHOT_DIR',hgddelta.cfg.DELTA_SNAPSHOT_DIR)
+        hgddelta.cfg.DELTA_SNAPSHOT_DIR = snapshot_dir
+
+        self.gene_df = pd.DataFrame({'GENE_ID':[1,2,3,4],
+                                     'GENE_TYPE':pd.Categorical(['CDS','CDS','ncRNA','CDS']),
+                                     'GENE_NAME':['a','b',np.NaN,'d']})
+
+    def test_keys_from_schema(self):
+        keys = hgddelta.primary_keys()
+        self.assertEqual(keys['kegg_human_gene'],['GENE_ID'])
+        self.assertEqual(keys['ncbi_human_snp_summary'],['SNP_ID'])
+        self.assertEqual(hgddelta.key_columns('kegg','gene',self.gene_df,keys),['GENE_ID'])
+        self.assertEqual(hgddelta.key_columns('reactome','pathway',pd.DataFrame(columns=['PATHWAY_ID','PATHWAY_NAME']),keys),
+                         ['PATHWAY_ID'])
+        # Lookup tables have no primary key - keyed by all of their columns
+        lookup = pd.DataFrame(columns=['GENE_ID','GENE_SYMBOL','LOOKUP_SOURCE'])
+        self.assertEqual(hgddelta.key_columns('kegg','gene_symbol_lookup',lookup,keys),list(lookup.columns))
+
+    def test_changed_rows_only(self):
+        self.assertIsNone(hgddelta.table_delta('kegg','gene',self.gene_df))
+        hgddelta.write_snapshot('kegg','gene',hgddelta.snapshot_of('kegg','gene',self.gene_df))
+
+        unchanged = hgddelta.table_delta('kegg','gene',self.gene_df.copy())
+        self.assertEqual(unchanged.counts(),{'inserts':0,'updates':0,'deletes':0})
+
+        new_df = pd.concat([self.gene_df,pd.DataFrame({'GENE_ID':[5],'GENE_TYPE':['CDS'],'GENE_NAME':['e']})],
+                           ignore_index=True)
+        new_df = new_df[new_df['GENE_ID'] != 2]
+        new_df.loc[new_df['GENE_ID']==3,'GENE_NAME'] = 'c'
+        delta = hgddelta.table_delta('kegg','gene',new_df)
+
+        self.assertEqual(delta.inserts['GENE_ID'].tolist(),[5])
+        self.assertEqual(delta.updates.to_dict('records'),[{'GENE_ID':3,'GENE_TYPE':'ncRNA','GENE_NAME':'c'}])
+        self.assertEqual(delta.deletes.to_dict('records'),[{'GENE_ID':2}])
+        self.assertEqual(delta.rows['GENE_ID'].tolist(),[5,3])
+        # Updated rows are deleted & inserted again
+        self.assertEqual(delta.removed_keys['GENE_ID'].tolist(),[2,3])
+        self.assertEqual(len(delta.snapshot),4)
+
+        # A full load drops the snapshot - the next load is a full one
+        hgddelta.remove_snapshot('kegg','gene')
+        self.assertIsNone(hgddelta.table_delta('kegg','gene',new_df))
+        hgddelta.remove_snapshot('kegg','gene')
+
+    def test_lookup_rows_inserted_or_deleted(self):
+        lookup = pd.DataFrame({'GENE_ID':[1,1,2],'GENE_SYMBOL':['A1B','ABG',None],'LOOKUP_SOURCE':'gene_info'})
+        hgddelta.write_snapshot('ncbi','gene_info_symbol_lookup',
+                                hgddelta.snapshot_of('ncbi','gene_info_symbol_lookup',lookup))
+
+        changed = lookup.assign(GENE_SYMBOL=['A1B','A1BG',None])
+        delta = hgddelta.table_delta('ncbi','gene_info_symbol_lookup',changed)
+        self.assertEqual(delta.counts(),{'inserts':1,'updates':0,'deletes':1})
+        self.assertEqual(delta.deletes['GENE_SYMBOL'].tolist(),['ABG'])
+
+    def test_statements(self):
+        self.assertEqual(hgddelta.insert_statement('gene',['GENE_ID','GENE_NAME']),
+                         "INSERT INTO `gene` (`GENE_ID`,`GENE_NAME`) VALUES (:p0,:p1)")
+        # Removed keys go to a temporary table & are deleted with one join, not a statement per key
+        self.assertEqual(hgddelta.create_keys_statement('gene_symbol_lookup',['GENE_ID','GENE_SYMBOL']),
+                         "CREATE TEMPORARY TABLE `gene_symbol_lookup_delta_keys` SELECT `GENE_ID`,`GENE_SYMBOL` "
+                         "FROM `gene_symbol_lookup` LIMIT 0")
+        self.assertEqual(hgddelta.delete_statement('gene_symbol_lookup',['GENE_ID','GENE_SYMBOL']),
+                         "DELETE d FROM `gene_symbol_lookup` d JOIN `gene_symbol_lookup_delta_keys` k "
+                         "ON d.`GENE_ID` <=> k.`GENE_ID` AND d.`GENE_SYMBOL` <=> k.`GENE_SYMBOL`")
+        self.assertEqual(hgddelta.records(self.gene_df.iloc[2:3]),[{'p0':3,'p1':'ncRNA','p2':None}])
+
+
+
+################################################################################################################
+# Database loads (hgd_pipe.load_table)
+################################################################################################################
+
+@unittest.skipIf(hgdp is None,"hgd_pipe needs pyspark & sqlalchemy")
+class loadTableTests(unittest.TestCase):
+    def setUp(self):
+        snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree,snapshot_dir,True)
+        self.addCleanup(setattr,hgddelta.cfg,'DELTA_SNAPSHOT_DIR',hgddelta.cfg.DELTA_SNAPSHOT_DIR)
+        hgddelta.cfg.DELTA_SNAPSHOT_DIR = snapshot_dir
+
+        self.pipe = hgdp.humanGenomeDataPipe('kegg')
+        # Only the methods mysqlDataPipe really has - anything else raises AttributeError
+        self.mysqlpipe = mock.create_autospec(hgdm.mysqlDataPipe,instance=True)
+        self.gene_df = pd.DataFrame({'GENE_ID':[1,2],'GENE_NAME':['a','b']})
+
+    def test_overwrite_load(self):
+        self.mysqlpipe.table_exists.return_value = True
+        self.pipe.load_table('gene',self.mysqlpipe,self.gene_df,overwrite=True,incremental=False)
+        # Rows are replaced, keeping the table & its keys
+        self.mysqlpipe.delete_rows.assert_called_once_with('kegg_human_gene')
+        db_table,df,overwrite = self.mysqlpipe.write_data.call_args.args
+        self.assertEqual((db_table,overwrite),('kegg_human_gene',False))
+        self.assertEqual(df['GENE_NAME'].tolist(),['a','b'])
+
+    def test_missing_table_created_from_schema(self):
+        self.mysqlpipe.table_exists.return_value = False
+        self.pipe.load_table('gene',self.mysqlpipe,self.gene_df,overwrite=True,incremental=False)
+        self.mysqlpipe.create_table.assert_called_once_with('kegg_human_gene')
+        self.mysqlpipe.delete_rows.assert_not_called()
+
+    def test_incremental_loads(self):
+        self.mysqlpipe.table_exists.return_value = False
+        self.pipe.load_table('gene',self.mysqlpipe,self.gene_df,incremental=True)
+        # Missing table - created from the schema, nothing to delete
+        self.mysqlpipe.create_table.assert_called_once_with('kegg_human_gene')
+        self.mysqlpipe.delete_rows.assert_not_called()
+        self.assertFalse(self.mysqlpipe.write_data.call_args.args[2])
+
+        self.pipe.load_table('gene',self.mysqlpipe,self.gene_df.assign(GENE_NAME=['a','c']),incremental=True)
+        db_table,rows,removed_keys,key_cols = self.mysqlpipe.apply_delta.call_args.args
+        self.assertEqual((db_table,key_cols),('kegg_human_gene',['GENE_ID']))
+        self.assertEqual(rows['GENE_NAME'].tolist(),['c'])
+        self.assertEqual(len(removed_keys),1)
+
+    def test_tables_selected_by_source(self):
+        source_tables = {'kegg':['pathway','gene'],'reactome':['pathway','reaction']}
+        self.assertEqual(hgdp.select_tables(source_tables),source_tables)
+        self.assertEqual(hgdp.select_tables(source_tables,['gene','reactome:pathway','reaction']),
+                         {'kegg':['gene'],'reactome':['pathway','reaction']})
+        # A table of both sources must name its source
+        with self.assertRaisesRegex(Exception,'several sources'):
+            hgdp.select_tables(source_tables,['pathway'])
+        with self.assertRaisesRegex(Exception,'Invalid'):
+            hgdp.select_tables(source_tables,['ncbi:gene'])
+
+    def test_full_load_drops_snapshot(self):
+        self.pipe.load_table('gene',self.mysqlpipe,self.gene_df,incremental=True)
+        self.assertIsNotNone(hgddelta.read_snapshot('kegg','gene'))
+
+        self.pipe.load_table('gene',self.mysqlpipe,self.gene_df.assign(GENE_NAME=['a','c']),overwrite=True,incremental=False)
+        self.assertIsNone(hgddelta.read_snapshot('kegg','gene'))
+        # Next incremental load is a full one, not a diff against the rows the full load replaced
+        self.pipe.load_table('gene',self.mysqlpipe,self.gene_df,incremental=True)
+        self.mysqlpipe.apply_delta.assert_not_called()
+
+    def test_failed_write_fails_load_stage(self):
+        self.mysqlpipe.write_data.side_effect = ValueError("Lost connection")
+        scheduler = hgdsched.stageScheduler()
+        scheduler.add('load:kegg:gene',self.pipe.load_table,'gene',self.mysqlpipe,self.gene_df,True,resource='db')
+        _, errors = scheduler.run()
+        self.assertEqual(errors,{'load:kegg:gene':'ValueError: Lost connection'})
+
+################################################################################################################
+# Run manifest (utils/hgd_manifest.py)
+################################################################################################################
+
+class runManifestTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree,self.tmp_dir,True)
+        self.addCleanup(setattr,hgdmanifest.cfg,'MANIFEST_DIR',hgdmanifest.cfg.MANIFEST_DIR)
+        hgdmanifest.cfg.MANIFEST_DIR = os.path.join(self.tmp_dir,'manifest')
+
+        self.raw_path = os.path.join(self.tmp_dir,'ncbi_human_gene2go.csv')
+        self.proc_path = os.path.join(self.tmp_dir,'ncbi_human_gene2go_processed.csv')
+        for path in [self.raw_path,self.proc_path]:
+            with open(path,'w') as f:
+                f.write('GENE_ID,GO_ID\n1,GO0000001\n')
+
+    def test_raw_files_looked_up(self):
+        self.assertIsNone(hgdmanifest.raw_files('ncbi','gene2go'))
+        hgdmanifest.record_raw('ncbi','gene2go',{'gene2go':self.raw_path})
+        self.assertEqual(hgdmanifest.raw_files('ncbi','gene2go'),{'gene2go':self.raw_path})
+
+        # In-memory extracts leave no raw files - & a removed file means extracting again
+        hgdmanifest.record_raw('kegg','gene',{'gene':pd.DataFrame({'A':[1]})})
+        self.assertIsNone(hgdmanifest.raw_files('kegg','gene'))
+        os.remove(self.raw_path)
+        self.assertIsNone(hgdmanifest.raw_files('ncbi','gene2go'))
+
+    def test_transform_reused_for_same_content_and_code(self):
+        raw_digest = hgdmanifest.raw_hash(self.raw_path)
+        version = hgdmanifest.code_version(ncbi_utils.process_gene2go)
+        self.assertIsNone(hgdmanifest.cached_outputs('ncbi','gene2go',raw_digest,version))
+
+        hgdmanifest.record_transform('ncbi','gene2go',raw_digest,version,{'gene2go':self.proc_path})
+        self.assertEqual(hgdmanifest.cached_outputs('ncbi','gene2go',raw_digest,version),{'gene2go':self.proc_path})
+
+        # Same content, new file
+        copy_path = os.path.join(self.tmp_dir,'copy.csv')
+        shutil.copy(self.raw_path,copy_path)
+        self.assertEqual(hgdmanifest.raw_hash(copy_path),raw_digest)
+
+        with open(self.raw_path,'a') as f:
+            f.write('2,GO0000002\n')
+        self.assertIsNone(hgdmanifest.cached_outputs('ncbi','gene2go',hgdmanifest.raw_hash(self.raw_path),version))
+        self.assertIsNone(hgdmanifest.cached_outputs('ncbi','gene2go',raw_digest,
+                                                     hgdmanifest.code_version(ncbi_utils.process_gene_info)))
+        # Outputs not saved
+        hgdmanifest.record_transform('ncbi','gene2go',raw_digest,version,{})
+        self.assertIsNone(hgdmanifest.cached_outputs('ncbi','gene2go',raw_digest,version))
+
+    def test_code_version_covers_helper_modules(self):
+        modules = hgdmanifest.package_modules(kegg_utils,hgdschema)
+        for name in ['humangenomedatabase.utils.hgd_normalize','humangenomedatabase.utils.hgd_ids',
+                     'humangenomedatabase.utils.hgd_schema']:
+            self.assertIn(name,modules)
+
+        # A helper module's edit is a new version
+        version = hgdmanifest.code_version(kegg_utils.process_disease)
+        edited = os.path.join(self.tmp_dir,'hgd_normalize.py')
+        with open(hgdnorm.__file__) as src, open(edited,'w') as f:
+            f.write(src.read() + '\n# edited\n')
+        with mock.patch.object(hgdnorm,'__file__',edited):
+            self.assertNotEqual(hgdmanifest.code_version(kegg_utils.process_disease),version)
+
+        # Profiled (wrapped) processing functions keep their version
+        wrapped = functools.wraps(kegg_utils.process_disease)(lambda df: df)
+        self.assertEqual(hgdmanifest.code_version(wrapped),version)
+
+    def test_raw_hash_of_frames_and_shards(self):
+        df = pd.DataFrame({'GENE_ID':[1,2],'GO_ID':['GO1','GO2']})
+        self.assertEqual(hgdmanifest.raw_hash(df),hgdmanifest.raw_hash(df.copy()))
+        self.assertNotEqual(hgdmanifest.raw_hash(df),hgdmanifest.raw_hash(df.assign(GO_ID=['GO1','GO3'])))
+
+        shards = hgdshards.shardStore('snp_summary',shard_dir=self.tmp_dir)
+        shards.start(4,2)
+        for offset in [2,0]:
+            shards.write_shard(offset,df)
+        digest = hgdmanifest.raw_hash(str(shards.manifest_path))
+        self.assertEqual(len(digest),64)
+        shards.write_shard(2,df.iloc[:1])
+        self.assertNotEqual(hgdmanifest.raw_hash(str(shards.manifest_path)),digest)
+        self.assertIsNone(hgdmanifest.raw_hash('s3://bucket/missing.csv'))
+
+
+if __name__ == '__main__':
+    unittest.main()